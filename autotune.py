@@ -0,0 +1,191 @@
+"""
+Parameter sweep / auto-tune for process_with_ai_model.
+
+Scores a grid of threshold, edge sensitivity and line thickness settings
+on one enhanced image and returns the best full parameter dict:
+
+    enhanced = apply_enhancements(image, params)
+    params = auto_tune(enhanced, params)
+
+The sweep shares work between candidates instead of calling
+process_with_ai_model once per grid point:
+
+- the grayscale conversion happens once (enhancement and blur are done by
+  the caller, once);
+- every threshold is evaluated at the same time: one pass over the 2x2
+  pixel neighbourhoods of the gray image yields, for all 255 levels, the
+  ink area, boundary length and Euler number, via histograms and a
+  cumulative sum;
+- the Sobel gradients are computed once and handed to cv2.Canny for each
+  sensitivity (bit-identical to detect_edges), and each edge map is only
+  dilated, not re-thresholded, per line thickness.
+
+Each candidate is scored on three things: how close its ink density is to
+a target, how fragmented it is (|Euler number|, i.e. specks and pinholes,
+per 100 px of line), and its estimated vector node count, which grows
+with the boundary length.
+"""
+import math
+
+import cv2
+import numpy as np
+
+from processing import to_grayscale
+from instrumentation import timed
+
+METHODS = ('Threshold', 'Edge Detection')
+DEFAULT_THRESHOLDS = tuple(range(5, 255, 5))        # 50 points
+DEFAULT_SENSITIVITIES = tuple(range(10, 101, 10))   # x 5 thicknesses = 50 points
+DEFAULT_THICKNESSES = (1, 2, 3, 4, 5)
+TARGET_DENSITY = 0.08    # Fraction of the image covered by ink in a typical line drawing
+DENSITY_SPREAD = 0.75    # Tolerance around the target, in natural-log units
+NODE_SPACING = 3.0       # Boundary pixels per anchor node of the traced outline (measured at tolerance 0.5)
+NODE_BUDGET = 0.02       # Estimated nodes per image pixel at which the complexity term halves
+BAND_ROWS = 512          # Rows per band in threshold_metrics; bounds temporaries and keeps
+                         # the float32 histogram counts exact for widths up to 32768
+
+# 2x2 neighbourhood codes: bit 0 top-left, 1 top-right, 2 bottom-left, 3 bottom-right
+_CODES = np.arange(16)
+_BITS = [(_CODES >> bit) & 1 for bit in range(4)]
+_POPCOUNT = sum(_BITS)
+_CODE_BOUNDARY = (_BITS[0] != _BITS[1]).astype(int) + (_BITS[0] != _BITS[2])
+_CODE_EULER4 = (_POPCOUNT == 1).astype(int) - (_POPCOUNT == 3) - 2 * np.isin(_CODES, (6, 9))
+_CODE_KERNEL = np.array([[1, 2], [4, 8]], np.float32)
+
+
+def _histogram(values):
+    # cv2.calcHist is several times faster than np.bincount on uint8 data
+    return cv2.calcHist([values], [0], None, [256], [0, 256]).ravel().astype(np.int64)
+
+
+def _interval_hist(lo, hi):
+    """Histogram increments counting, for each level t, the entries with lo <= t < hi."""
+    return _histogram(lo) - _histogram(hi)
+
+
+@timed()
+def threshold_metrics(gray):
+    """
+    Metrics of threshold_image(gray, t) for every t in 0..254 at once.
+
+    Returns (ink, boundary, euler) arrays of length 255: the number of
+    black (ink) pixels, the number of pixel edges between ink and paper
+    (counting the image border as paper) and the 8-connected Euler number
+    (ink components minus holes). A 2x2 neighbourhood changes pattern only
+    at its sorted pixel values, so each pattern count is a sum of
+    [lo, hi) intervals, accumulated as histograms and integrated with one
+    cumulative sum.
+    """
+    # Paper (255) border, so every pixel edge and neighbourhood is seen by a quad
+    padded = cv2.copyMakeBorder(gray, 1, 1, 1, 1, cv2.BORDER_CONSTANT, value=255)
+    boundary = np.zeros(256, np.int64)
+    euler4 = np.zeros(256, np.int64)
+    rows = padded.shape[0] - 1
+    for start in range(0, rows, BAND_ROWS):
+        band = padded[start:min(start + BAND_ROWS, rows) + 1]
+        a, b = band[:-1, :-1], band[:-1, 1:]
+        c, d = band[1:, :-1], band[1:, 1:]
+        low_ab, high_ab = np.minimum(a, b), np.maximum(a, b)
+        low_cd, high_cd = np.minimum(c, d), np.maximum(c, d)
+        # Ink/paper pixel edges along the top and left side of each quad
+        boundary += _interval_hist(low_ab, high_ab)
+        boundary += _interval_hist(np.minimum(a, c), np.maximum(a, c))
+
+        smallest, largest = np.minimum(low_ab, low_cd), np.maximum(high_ab, high_cd)
+        inner_low, inner_high = np.maximum(low_ab, low_cd), np.minimum(high_ab, high_cd)
+        second = np.minimum(inner_low, inner_high)
+        third = np.maximum(inner_low, inner_high)
+        euler4 += _interval_hist(smallest, second)   # Exactly one ink pixel
+        euler4 -= _interval_hist(third, largest)     # Exactly three
+        # Two diagonal ink pixels: both of one diagonal darker than both of the other
+        for first, other in (((a, d), (b, c)), ((b, c), (a, d))):
+            lo = np.maximum(*first)
+            euler4 -= 2 * _interval_hist(lo, np.maximum(lo, np.minimum(*other)))
+
+    levels = slice(0, 255)
+    ink = np.cumsum(_histogram(gray))[levels]
+    return ink, np.cumsum(boundary)[levels], np.cumsum(euler4)[levels] // 4
+
+
+def mask_metrics(mask):
+    """
+    (ink, boundary, euler) of a single binary image, ink being its nonzero
+    pixels; same definitions as threshold_metrics.
+    """
+    padded = cv2.min(cv2.copyMakeBorder(mask, 1, 1, 1, 1, cv2.BORDER_CONSTANT, value=0), 1)
+    # Each pixel's 2x2 neighbourhood code; the extra last row and column are all paper (code 0)
+    codes = cv2.filter2D(padded, -1, _CODE_KERNEL, anchor=(0, 0), borderType=cv2.BORDER_CONSTANT)
+    counts = _histogram(codes)[:16]
+    # Only codes 0 and 15 can exceed float32's exact range; neither adds to boundary or Euler
+    return cv2.countNonZero(mask), int(counts @ _CODE_BOUNDARY), int(counts @ _CODE_EULER4) // 4
+
+
+def score_candidate(ink, boundary, euler, pixels, target_density=TARGET_DENSITY):
+    """
+    Scores one candidate from its metrics; higher is better, 0 for a blank
+    or all-black result. Returns (score, details dict).
+    """
+    density = ink / pixels
+    line_length = boundary / 2.0  # A thin stroke has two sides
+    fragments = abs(euler)
+    nodes = boundary / NODE_SPACING
+    details = {'density': density, 'fragments': fragments, 'nodes': int(round(nodes))}
+    if ink == 0 or ink == pixels:
+        return 0.0, details
+
+    density_fit = math.exp(-0.5 * (math.log(density / target_density) / DENSITY_SPREAD) ** 2)
+    continuity = 1.0 / (1.0 + 100.0 * fragments / max(line_length, 1.0))
+    simplicity = 1.0 / (1.0 + nodes / (NODE_BUDGET * pixels))
+    return density_fit * continuity * simplicity, details
+
+
+@timed()
+def sweep(enhanced, params, methods=METHODS, thresholds=DEFAULT_THRESHOLDS,
+          sensitivities=DEFAULT_SENSITIVITIES, thicknesses=DEFAULT_THICKNESSES,
+          target_density=TARGET_DENSITY):
+    """
+    Evaluates the parameter grid on an enhanced image (the output of
+    apply_enhancements). Returns a list of candidates, best first; each is a
+    dict with the full 'params', its 'score', 'density', 'fragments' and
+    estimated 'nodes'.
+    """
+    gray = to_grayscale(enhanced)
+    pixels = gray.size
+    candidates = []
+
+    def add(overrides, metrics):
+        score, details = score_candidate(*metrics, pixels, target_density)
+        candidates.append(dict(details, params=dict(params, **overrides), score=score))
+
+    if 'Threshold' in methods:
+        ink, boundary, euler = threshold_metrics(gray)
+        for threshold in thresholds:
+            if threshold >= 255:
+                continue  # Everything turns black
+            add({'method': 'Threshold', 'threshold': threshold},
+                (int(ink[threshold]), int(boundary[threshold]), int(euler[threshold])))
+
+    if 'Edge Detection' in methods:
+        # Same gradients cv2.Canny computes internally, so the edge maps are identical
+        dx = cv2.Sobel(gray, cv2.CV_16S, 1, 0, ksize=3, borderType=cv2.BORDER_REPLICATE)
+        dy = cv2.Sobel(gray, cv2.CV_16S, 0, 1, ksize=3, borderType=cv2.BORDER_REPLICATE)
+        # The edge threshold only matters at 255, where it would blank the output
+        threshold = min(params['threshold'], 254)
+        for sensitivity in sensitivities:
+            edges = cv2.Canny(dx, dy, sensitivity, sensitivity * 2)
+            for thickness in thicknesses:
+                thick_edges = cv2.dilate(edges, np.ones((thickness, thickness), np.uint8))
+                add({'method': 'Edge Detection', 'edge_sensitivity': sensitivity,
+                     'line_thickness': thickness, 'threshold': threshold},
+                    mask_metrics(thick_edges))
+
+    candidates.sort(key=lambda candidate: candidate['score'], reverse=True)
+    return candidates
+
+
+def auto_tune(enhanced, params, **kwargs):
+    """Returns params with the best-scoring method, threshold, sensitivity and thickness."""
+    candidates = sweep(enhanced, params, **kwargs)
+    if not candidates:
+        raise ValueError("No candidates to evaluate")
+    return candidates[0]['params']
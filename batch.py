@@ -0,0 +1,630 @@
+"""
+Headless batch conversion.
+
+Runs the apply_enhancements -> process_with_ai_model -> vectorize pipeline
+over a directory or glob of images, fanned out over a process pool, without
+touching Qt. Outputs that already exist are skipped, so an interrupted run
+can simply be restarted. Workers send the outputs back (encoded PNGs, or
+the traced paths of SVGs, which are streamed to disk) and the parent writes
+them on a background thread (fileio.AsyncWriter), so disk I/O overlaps the
+processing of the next images.
+
+    python batch.py scans/ -o out/ --preset edges --format svg --workers 8
+"""
+import argparse
+import concurrent.futures
+import contextlib
+import functools
+import glob
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from processing import apply_enhancements, process_with_ai_model, trace_with_potrace
+from tiling import process_tiled, supports_tiling
+from autotune import auto_tune
+from svgwriter import SIMPLIFY_METHODS, trace_polygons, write_svg, merge_svg_paths, format_report
+from resultcache import ResultCache, DEFAULT_MAX_BYTES, default_cache_dir, file_digest
+from masks import MaskLibrary, PAPER
+from engines import ENGINES, check_params
+from fileio import AsyncWriter, open_image, encode_image, write_atomic
+import parallel
+import instrumentation
+
+# Same defaults as the sliders in LineDrawingApp
+DEFAULT_PARAMS = {
+    'brightness': 50,
+    'contrast': 50,
+    'sharpness': 50,
+    'blur': 0,
+    'method': 'Threshold',
+    'edge_sensitivity': 50,
+    'threshold': 128,
+    'line_thickness': 1,
+    # Settings of the other extraction engines, see engines.PARAMETERS
+    'block_size': 31,
+    'adaptive_offset': 10,
+    'xdog_sigma': 1.0,
+    'xdog_strength': 20,
+    'canny_scales': 3,
+    # Vectorization (SVG output only)
+    'tracer': 'builtin',
+    'tolerance': 0.5,
+    'bezier': True,
+    'simplify': 'rdp',      # Outline simplification, see svgwriter.SIMPLIFY_METHODS
+    'precision': 1,         # Decimals kept in SVG coordinates
+}
+# Parameters that only affect vector output, not the binary raster
+VECTOR_PARAMS = ('tracer', 'tolerance', 'bezier', 'simplify', 'precision')
+
+PRESETS = {
+    'default': {},
+    'edges': {'method': 'Edge Detection', 'line_thickness': 2},
+    'scan': {'contrast': 65, 'blur': 1, 'threshold': 150},
+    'uneven': {'method': 'Adaptive Threshold'},         # Scans and photos with shading or uneven lighting
+    'centerline': {'method': 'Skeleton', 'blur': 1},    # One-pixel strokes, e.g. for plotters
+}
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff', '.npy')
+RAW_EXTENSION = '.raw'     # Headerless; only collected when the run is given their shape
+WRITE_QUEUE_SIZE = 16      # Outputs waiting for the writer before results stop being collected
+OUTPUT_FORMATS = ('png', 'svg', 'svgz')
+TRACERS = ('builtin', 'potrace')
+STAGES = ('cache', 'read', 'enhance', 'tune', 'process', 'mask', 'vectorize', 'write')
+
+logger = logging.getLogger(__name__)
+
+
+def load_preset(preset):
+    """
+    Returns the full parameter dict for a built-in preset name or a JSON file.
+    Keys missing from the preset fall back to DEFAULT_PARAMS.
+    """
+    if preset in PRESETS:
+        overrides = PRESETS[preset]
+    elif os.path.isfile(preset):
+        with open(preset, 'r', encoding='utf-8') as f:
+            overrides = json.load(f)
+    else:
+        raise ValueError(f"Unknown preset '{preset}' (built-in: {', '.join(PRESETS)})")
+
+    unknown = set(overrides) - set(DEFAULT_PARAMS)
+    if unknown:
+        raise ValueError(f"Unknown parameter(s) in preset: {', '.join(sorted(unknown))}")
+
+    params = dict(DEFAULT_PARAMS)
+    params.update(overrides)
+    if params['tracer'] not in TRACERS:
+        raise ValueError(f"Unknown tracer '{params['tracer']}' (choose from: {', '.join(TRACERS)})")
+    if params['simplify'] not in SIMPLIFY_METHODS:
+        raise ValueError(f"Unknown simplification '{params['simplify']}' (choose from: {', '.join(SIMPLIFY_METHODS)})")
+    check_params(params)
+    return params
+
+
+def collect_inputs(source, recursive=False, extensions=IMAGE_EXTENSIONS):
+    """
+    Expands a directory or glob pattern into a sorted list of image paths
+    (files ending in one of extensions).
+    Returns (root, paths); root is used to mirror the layout in the output.
+    """
+    if os.path.isdir(source):
+        root = source
+        pattern = os.path.join(source, '**', '*') if recursive else os.path.join(source, '*')
+    else:
+        pattern = source
+        root = os.path.dirname(source.split('*', 1)[0]) or '.'
+    paths = [p for p in glob.glob(pattern, recursive=recursive)
+             if os.path.isfile(p) and p.lower().endswith(tuple(extensions))]
+    return root, sorted(paths)
+
+
+def output_path_for(input_path, root, output_dir, output_format):
+    """Maps an input path to its output path, keeping the relative layout."""
+    relative = os.path.relpath(input_path, root)
+    return os.path.join(output_dir, os.path.splitext(relative)[0] + '.' + output_format)
+
+
+# Per-process scratch buffer for the enhancement stage, reused while
+# consecutive images share a shape
+_enhance_buffer = None
+
+
+def _buffer_like(image):
+    global _enhance_buffer
+    if _enhance_buffer is None or _enhance_buffer.shape != image.shape:
+        # Not empty_like: inputs may be memory maps or broadcast views
+        _enhance_buffer = np.empty(image.shape, image.dtype)
+    return _enhance_buffer
+
+
+def masked_output_path(output_path, mask_name):
+    """Output path for one mask: the mask name goes before the extension."""
+    base, ext = os.path.splitext(output_path)
+    return f"{base}.{mask_name}{ext}"
+
+
+def convert_file(input_path, output_path, params, output_format, tile_size=None, auto=False, cache=None,
+                 masks=None, mask_crop=False, write=None, png_compression=None, raw_shape=None):
+    """
+    Runs the full pipeline on one file and writes the result atomically.
+    .npy, uncompressed TIFF and .raw inputs are memory-mapped (see
+    fileio.open_image); raw_shape gives the (height, width[, channels]) of
+    .raw files.
+    With tile_size the raster stages run tile by tile (see tiling.py), which
+    bounds their intermediates; they are then timed together as 'process'.
+    The binary result is stitched into a temporary memory-mapped file, so
+    it is paged from disk rather than held in memory; PNG encoding reads it
+    row by row, but tracing an SVG and applying a mask still need the whole
+    result in memory.
+    With auto the processing method and its settings are picked per image
+    by autotune.auto_tune; this needs the whole enhanced image, so it cannot
+    be combined with tile_size.
+    With cache (a resultcache.ResultCache), the finished output, or failing
+    that the binary raster, is looked up by the file's content and the
+    parameters first, and both are stored after a conversion.
+    With masks (a masks.MaskLibrary), the image is processed once and one
+    output per template is written to masked_output_path(output_path, name),
+    with paper outside the mask; with mask_crop, cut to the mask's bounding box.
+    Outputs are passed to write(path, data, cache_key), e.g. to queue them
+    on a fileio.AsyncWriter; that callable then also stores them in the
+    cache once written (cache_key is None without a cache). data is either
+    the encoded file (PNGs at png_compression, 0-9, if given) or, for SVGs,
+    a picklable writer(path) that streams the traced paths to disk (see
+    _encode_output). By default they are written and stored before
+    returning.
+    Returns a dict with the per-stage wall times in seconds.
+    """
+    if auto and tile_size:
+        raise ValueError("Auto-tuning cannot be combined with tiled processing.")
+    timings = dict.fromkeys(STAGES, 0.0)
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    extension = '.' + output_format
+    if masks is None:
+        outputs = [(output_path, None)]
+    else:
+        outputs = [(masked_output_path(output_path, name), name) for name in masks.names()]
+
+    binary_image = None
+    pending = [(path, name, None) for path, name in outputs]
+    if cache is not None:
+        start = time.perf_counter()
+        digest = file_digest(input_path)
+        read_params = {'auto': auto}
+        if input_path.lower().endswith(RAW_EXTENSION):
+            read_params['raw_shape'] = list(raw_shape or ())  # The bytes alone don't say how to read them
+        pending = []
+        for path, name in outputs:
+            key_params = dict(params, **read_params)
+            if name is not None:
+                key_params.update(mask=masks.identity(name), mask_crop=mask_crop)
+            output_key = cache.key(digest, key_params, output_format)
+            if not cache.fetch(output_key, extension, path):
+                pending.append((path, name, output_key))
+        if not pending:
+            timings['cache'] = time.perf_counter() - start
+            logger.info("%s: output taken from the cache", input_path)
+            return timings
+        raster_params = {k: v for k, v in params.items() if k not in VECTOR_PARAMS}
+        binary_key = cache.key(digest, dict(raster_params, **read_params), 'binary')
+        binary_image = cache.get_array(binary_key)
+        timings['cache'] = time.perf_counter() - start
+
+    # Tiled results are stitched into a memory-mapped file in scratch rather than held in memory
+    with tempfile.TemporaryDirectory(prefix='batch') if tile_size else contextlib.nullcontext() as scratch:
+        if binary_image is None:
+            binary_image = _render(input_path, params, tile_size, auto, timings, raw_shape, scratch)
+            if cache is not None:
+                start = time.perf_counter()
+                cache.put_array(binary_key, binary_image)
+                timings['cache'] += time.perf_counter() - start
+
+        for path, name, output_key in pending:
+            image = binary_image
+            if name is not None:
+                start = time.perf_counter()
+                image = masks.apply(binary_image, name, crop=mask_crop, background=PAPER)
+                timings['mask'] += time.perf_counter() - start
+            data = _encode_output(image, params, output_format, timings, png_compression)
+            if write is not None:
+                write(path, data, output_key)
+                continue
+            start = time.perf_counter()
+            # Only complete files ever appear under the final name
+            if callable(data):
+                data(path)
+            else:
+                write_atomic(path, data)
+            timings['write'] += time.perf_counter() - start
+            if output_key is not None:
+                start = time.perf_counter()
+                cache.store(output_key, extension, path)
+                timings['cache'] += time.perf_counter() - start
+        binary_image = image = None  # Release the memory map before its directory is removed
+    return timings
+
+
+def _encode_output(binary_image, params, output_format, timings, png_compression=None):
+    """
+    Vectorizes (for SVG) or encodes one output, adding to timings. Returns
+    the file's bytes, or for SVGs a picklable writer(path) that writes the
+    document atomically, streaming it rather than building it in memory.
+    """
+    vector = output_format in ('svg', 'svgz')
+    compress = output_format == 'svgz'
+    start = time.perf_counter()
+    if vector and params['tracer'] == 'builtin':
+        polygons, traced = trace_polygons(binary_image, params['tolerance'], params['simplify'])
+        height, width = binary_image.shape[:2]
+        data = functools.partial(_write_svg, polygons=polygons, width=width, height=height,
+                                 precision=params['precision'], bezier=params['bezier'], compress=compress,
+                                 nodes_before=traced)
+    elif vector:
+        # Potrace writes its own file; merging its paths into the output is left to the writer
+        fd, svg_path = tempfile.mkstemp(suffix='.svg')
+        os.close(fd)
+        try:
+            trace_with_potrace(binary_image, svg_path)
+        except Exception:
+            os.remove(svg_path)
+            raise
+        data = functools.partial(_merge_potrace, svg_path=svg_path, compress=compress)
+    timings['vectorize'] += time.perf_counter() - start
+    if not vector:
+        start = time.perf_counter()
+        data = encode_image(binary_image, '.' + output_format, png_compression)
+        timings['write'] += time.perf_counter() - start
+    return data
+
+
+def _write_svg(output_path, polygons, width, height, precision, bezier, compress, nodes_before):
+    report = write_svg(output_path, polygons, width, height, precision, bezier, compress=compress,
+                       nodes_before=nodes_before)
+    logger.debug("%s: %s", output_path, format_report(report))
+
+
+def _merge_potrace(output_path, svg_path, compress):
+    try:
+        report = merge_svg_paths(svg_path, output_name=output_path, compress=compress)
+        logger.debug("%s: %s", output_path, format_report(report))
+    finally:
+        os.remove(svg_path)
+
+
+def _render(input_path, params, tile_size, auto, timings, raw_shape=None, scratch=None):
+    """
+    Reads one file and runs the raster stages; returns the binary image.
+    With tile_size it is a memory-mapped .npy file in the directory scratch.
+    """
+    start = time.perf_counter()
+    image = open_image(input_path, raw_shape)
+    timings['read'] = time.perf_counter() - start
+
+    threads = parallel.get_threads()
+    if tile_size:
+        start = time.perf_counter()
+        binary_image = process_tiled(image, params, os.path.join(scratch, 'binary.npy'), tile_size=tile_size,
+                                     workers=threads, temp_dir=scratch)
+        timings['process'] = time.perf_counter() - start
+    else:
+        start = time.perf_counter()
+        if threads > 1:
+            enhanced_image = parallel.enhance_banded(image, params)
+        else:
+            enhanced_image = apply_enhancements(image, params, out=_buffer_like(image))
+        timings['enhance'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        if auto:
+            params = auto_tune(enhanced_image, params)
+            logger.info("%s: auto-tuned to %s", input_path,
+                        {k: params[k] for k in ('method', 'threshold', 'edge_sensitivity', 'line_thickness')})
+        timings['tune'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        if threads > 1:
+            binary_image = parallel.process_banded(enhanced_image, params)
+        else:
+            binary_image = process_with_ai_model(enhanced_image, params)
+        timings['process'] = time.perf_counter() - start
+    return binary_image
+
+
+def _convert_job(job):
+    """
+    Process-pool entry point; never raises so one bad file doesn't stop the run.
+    Returns (input_path, timings, error, stage records, outputs); outputs
+    are (path, data, cache key) for the parent to write, data being bytes
+    or a writer(path) (see convert_file).
+    """
+    input_path, output_path, params, output_format, tile_size, auto = job
+    outputs = []
+    with instrumentation.capture() as records:
+        try:
+            timings = convert_file(input_path, output_path, params, output_format, tile_size, auto, _cache,
+                                   _masks, _mask_crop, lambda *output: outputs.append(output), _png_compression,
+                                   _raw_shape)
+        except Exception as e:
+            return input_path, None, f"{type(e).__name__}: {e}", records, []
+    return input_path, timings, None, records, outputs
+
+
+def load_masks(paths):
+    """A MaskLibrary with the SVG templates at paths, in order."""
+    library = MaskLibrary()
+    for path in paths:
+        library.add(path)
+    return library
+
+
+# Per-process settings, result cache and mask library, set up by _init_worker
+_cache = None
+_masks = None
+_mask_crop = False
+_png_compression = None
+_raw_shape = None
+
+
+def _init_worker(profile=False, cache_dir=None, cache_bytes=DEFAULT_MAX_BYTES, mask_paths=None, mask_crop=False,
+                 threads=1, bands=None, png_compression=None, raw_shape=None):
+    global _cache, _masks, _mask_crop, _png_compression, _raw_shape
+    _png_compression, _raw_shape = png_compression, raw_shape
+    # Threads inside each image (bands and OpenCV's own); run_batch splits the cores between workers
+    parallel.configure(threads, bands)
+    if profile:
+        instrumentation.enable()
+    if cache_dir:
+        _cache = ResultCache(cache_dir, cache_bytes)
+    if mask_paths:
+        # Each worker rasterizes a template once per image size it meets
+        _masks = load_masks(mask_paths)
+        _mask_crop = mask_crop
+
+
+def run_batch(inputs, root, output_dir, params, output_format='png', workers=None,
+              overwrite=False, progress=print, tile_size=None, profile=False, auto=False,
+              cache_dir=None, cache_bytes=DEFAULT_MAX_BYTES, masks=None, mask_crop=False, threads=None, bands=None,
+              png_compression=None, raw_shape=None):
+    """
+    Converts every path in inputs and returns a summary dict.
+    progress is called with one line of text per finished file. With
+    profile, the summary also carries per-file stage records from the
+    instrumentation layer under 'profile'. With auto, each image gets its
+    own auto-tuned processing settings (see convert_file). With cache_dir,
+    results are shared through a resultcache.ResultCache in that directory
+    of at most cache_bytes. With masks, a list of SVG template paths, every
+    image gets one output per template (see convert_file). PNG outputs are
+    compressed at png_compression (0-9) if given; raw_shape is the shape of
+    .raw inputs.
+
+    threads is the number of threads each worker uses inside one image
+    (see parallel.py), bands the number of row bands an image is split
+    into. By default the CPUs are divided between the workers, and there
+    are never more workers than files, so a few large images still get
+    every core.
+
+    Workers return the outputs (encoded PNGs, or the traced paths of SVGs),
+    which the parent writes (and adds to the cache) on a fileio.AsyncWriter
+    while the workers go on; a file that fails to write counts as failed.
+    """
+    # Loaded here as well, so a broken template fails before any work starts
+    mask_names = load_masks(masks).names() if masks else None
+    jobs = []
+    skipped = 0
+    for input_path in inputs:
+        output_path = output_path_for(input_path, root, output_dir, output_format)
+        if mask_names:
+            outputs = [masked_output_path(output_path, name) for name in mask_names]
+        else:
+            outputs = [output_path]
+        if not overwrite and all(os.path.exists(path) for path in outputs):
+            skipped += 1
+            continue
+        jobs.append((input_path, output_path, params, output_format, tile_size, auto))
+
+    stage_totals = dict.fromkeys(STAGES, 0.0)
+    done = 0
+    failed = []
+    profiles = [] if profile else None
+    start = time.perf_counter()
+
+    workers = min(workers or os.cpu_count() or 1, max(1, len(jobs)))
+    threads = threads or parallel.threads_per_worker(workers)
+    if workers * threads > (os.cpu_count() or 1):
+        logger.warning("%d workers x %d threads oversubscribe %d CPUs", workers, threads, os.cpu_count() or 1)
+    cache = ResultCache(cache_dir, cache_bytes) if cache_dir else None
+    write_failures = {}
+    if jobs:
+        # Leaving the block shuts the pool down first, then waits for the last writes
+        with AsyncWriter(WRITE_QUEUE_SIZE) as writer, \
+                concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                                       initargs=(profile, cache_dir, cache_bytes, masks, mask_crop,
+                                                                 threads, bands, png_compression,
+                                                                 raw_shape)) as pool:
+
+            def collect(result):
+                _queue_outputs(writer, result, cache, '.' + output_format, write_failures, progress)
+                return _report(result, done + len(failed) + 1, len(jobs), stage_totals, failed, progress, profiles)
+
+            # Keep only a few jobs in flight per worker so huge drops don't pile up in memory
+            pending = set()
+            for job in jobs:
+                pending.add(pool.submit(_convert_job, job))
+                if len(pending) < workers * 4:
+                    continue
+                finished, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in finished:
+                    done += collect(future.result())
+            for future in concurrent.futures.as_completed(pending):
+                done += collect(future.result())
+        stage_totals['write'] += writer.seconds
+    for input_path, error in write_failures.items():
+        failed.append((input_path, error))
+        done -= 1
+
+    elapsed = time.perf_counter() - start
+    summary = {
+        'total': len(inputs),
+        'converted': done,
+        'skipped': skipped,
+        'failed': failed,
+        'elapsed': elapsed,
+        'images_per_sec': done / elapsed if elapsed > 0 else 0.0,
+        'workers': workers,
+        'threads': threads,
+        # Summed over all workers, i.e. CPU-side cost rather than wall time
+        'stage_seconds': stage_totals,
+    }
+    if profiles is not None:
+        summary['profile'] = {
+            'stages': instrumentation.summarize(r for entry in profiles for r in entry['records']),
+            'files': profiles,
+        }
+    return summary
+
+
+def _queue_outputs(writer, result, cache, extension, write_failures, progress):
+    """Hands a job's outputs to the writer; write errors go into write_failures by input path."""
+    input_path, outputs = result[0], result[4]
+
+    def on_done(path, error, key):
+        if error:
+            if input_path not in write_failures:
+                write_failures[input_path] = error
+                progress(f"FAILED {input_path}: writing {path}: {error}")
+        elif key is not None:
+            cache.store(key, extension, path)
+
+    for path, data, key in outputs:
+        written = {'write': data} if callable(data) else {'data': data}
+        writer.submit(path, on_done=lambda path, error, key=key: on_done(path, error, key), **written)
+
+
+def _report(result, index, count, stage_totals, failed, progress, profiles=None):
+    input_path, timings, error, records, _ = result
+    if profiles is not None:
+        profiles.append({'input': input_path, 'timings': timings, 'error': error, 'records': records})
+    if error:
+        failed.append((input_path, error))
+        progress(f"[{index}/{count}] FAILED {input_path}: {error}")
+        return 0
+    for stage, seconds in timings.items():
+        stage_totals[stage] += seconds
+    progress(f"[{index}/{count}] {input_path} ({sum(timings.values()):.2f} s)")
+    return 1
+
+
+def format_summary(summary):
+    """Human-readable throughput summary."""
+    lines = [
+        f"Converted {summary['converted']} of {summary['total']} images "
+        f"({summary['skipped']} skipped, {len(summary['failed'])} failed) "
+        f"in {summary['elapsed']:.2f} s, {summary['images_per_sec']:.2f} images/sec "
+        f"({summary['workers']} workers x {summary['threads']} threads)",
+    ]
+    if summary['converted']:
+        for stage, seconds in summary['stage_seconds'].items():
+            lines.append(f"  {stage:<9} {seconds:9.2f} s total  {1000 * seconds / summary['converted']:9.1f} ms/image")
+    for input_path, error in summary['failed']:
+        lines.append(f"  failed: {input_path}: {error}")
+    return '\n'.join(lines)
+
+
+def parse_shape(text):
+    """'2000x3000' or '2000x3000x3' -> (height, width[, channels])."""
+    try:
+        shape = tuple(int(n) for n in text.lower().split('x'))
+    except ValueError:
+        shape = ()
+    if len(shape) not in (2, 3) or min(shape) < 1 or shape[2:] not in ((), (1,), (3,)):
+        raise argparse.ArgumentTypeError(f"expected HEIGHTxWIDTH or HEIGHTxWIDTHx(1|3), not '{text}'")
+    return shape
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert a directory of images to line drawings without the GUI.")
+    parser.add_argument('input', help="input directory or glob pattern (quote it)")
+    parser.add_argument('-o', '--output', required=True, help="output directory")
+    parser.add_argument('-p', '--preset', default='default',
+                        help=f"built-in preset ({', '.join(PRESETS)}) or path to a JSON parameter file")
+    parser.add_argument('-m', '--method', choices=list(ENGINES), default=None,
+                        help="extraction engine, overriding the preset's")
+    parser.add_argument('-f', '--format', choices=OUTPUT_FORMATS, default='png', help="output format")
+    parser.add_argument('-j', '--workers', type=int, default=None,
+                        help="worker processes (default: CPU count, at most one per file)")
+    parser.add_argument('-t', '--threads', type=int, default=None,
+                        help="threads per worker inside each image (default: CPU count / workers)")
+    parser.add_argument('--bands', type=int, default=None,
+                        help=f"row bands per image (default: {parallel.BANDS_PER_THREAD} per thread)")
+    parser.add_argument('--png-level', type=int, choices=range(10), default=None, metavar='0-9',
+                        help="PNG compression level; lower writes faster, larger files (default: OpenCV's)")
+    parser.add_argument('--raw-shape', type=parse_shape, default=None, metavar='HxW[xC]',
+                        help="also convert headerless .raw files of 8-bit samples with this shape (BGR order)")
+    parser.add_argument('-r', '--recursive', action='store_true', help="descend into subdirectories")
+    parser.add_argument('--overwrite', action='store_true', help="reconvert files whose output already exists")
+    parser.add_argument('--tile-size', type=int, default=None,
+                        help="process in tiles of this many pixels to bound memory on very large scans; "
+                             "the result goes to a temporary memory-mapped file, but SVG tracing and "
+                             "masks still load it whole")
+    parser.add_argument('--profile', metavar='JSON', default=None,
+                        help="record per-stage wall/CPU time for every file and write it to this JSON file")
+    parser.add_argument('--auto', action='store_true',
+                        help="pick the processing method and its settings per image with a parameter sweep")
+    parser.add_argument('--cache', metavar='DIR', nargs='?', const=default_cache_dir(), default=None,
+                        help=f"reuse results of earlier runs on identical images and parameters "
+                             f"(default directory: {default_cache_dir()})")
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_MAX_BYTES // 2 ** 20, metavar='MB',
+                        help="evict least recently used cache entries beyond this size")
+    parser.add_argument('--mask', metavar='SVG', action='append', default=None,
+                        help="SVG stencil; repeat for several. Writes one output per mask, "
+                             "named <image>.<mask>.<format>, with paper outside the mask")
+    parser.add_argument('--mask-crop', action='store_true', help="cut masked outputs to the mask's bounding box")
+    parser.add_argument('-v', '--verbose', action='store_true', help="debug logging")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.WARNING,
+                        format='%(levelname)s %(name)s: %(message)s')
+    if args.auto and args.tile_size:
+        parser.error("--auto cannot be combined with --tile-size")
+
+    if args.mask_crop and not args.mask:
+        parser.error("--mask-crop needs at least one --mask")
+
+    if args.auto and args.method:
+        parser.error("--auto picks the method itself; drop --method")
+
+    try:
+        params = load_preset(args.preset)
+        if args.method:
+            params['method'] = args.method
+        if args.tile_size and not supports_tiling(params['method']):
+            raise ValueError(f"{params['method']} depends on the whole image and cannot be used with --tile-size")
+        if args.mask:
+            load_masks(args.mask)
+    except (ValueError, OSError, SyntaxError) as e:  # SyntaxError covers malformed SVG XML
+        parser.error(str(e))
+
+    extensions = IMAGE_EXTENSIONS + ((RAW_EXTENSION,) if args.raw_shape else ())
+    root, inputs = collect_inputs(args.input, args.recursive, extensions)
+    if not inputs:
+        print(f"No images found in {args.input}")
+        return 1
+
+    summary = run_batch(inputs, root, args.output, params, args.format, args.workers, args.overwrite,
+                        tile_size=args.tile_size, profile=bool(args.profile), auto=args.auto,
+                        cache_dir=args.cache, cache_bytes=args.cache_size * 2 ** 20,
+                        masks=args.mask, mask_crop=args.mask_crop, threads=args.threads, bands=args.bands,
+                        png_compression=args.png_level, raw_shape=args.raw_shape)
+    print(format_summary(summary))
+    if args.profile:
+        with open(args.profile, 'w', encoding='utf-8') as f:
+            json.dump(dict(summary, params=params), f, indent=2)
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,72 @@
+"""
+Times the auto-tune sweep against calling process_with_ai_model per grid point.
+
+    python benchmarks/bench_autotune.py [--sizes 1MP,4K] [--repeat 3]
+
+For each size, a 50-point threshold sweep and a 50-point edge detection
+sweep (10 sensitivities x 5 line thicknesses), including scoring, are
+compared with 50 sequential process_with_ai_model calls that do no
+scoring at all. The script also checks the sweep's metrics against ones
+computed from those sequential outputs. It exits with status 1 if a sweep
+is slower or a metric differs.
+"""
+import argparse
+import sys
+
+from common import RESOLUTIONS, best_of, synthetic_photo
+
+from autotune import DEFAULT_SENSITIVITIES, DEFAULT_THICKNESSES, DEFAULT_THRESHOLDS, mask_metrics, sweep
+from processing import apply_enhancements, process_with_ai_model
+
+PARAMS = {'brightness': 50, 'contrast': 60, 'sharpness': 60, 'blur': 1, 'method': 'Threshold',
+          'edge_sensitivity': 50, 'threshold': 128, 'line_thickness': 1}
+
+GRIDS = {
+    'Threshold': [{'method': 'Threshold', 'threshold': t} for t in DEFAULT_THRESHOLDS],
+    'Edge Detection': [{'method': 'Edge Detection', 'edge_sensitivity': s, 'line_thickness': k}
+                       for s in DEFAULT_SENSITIVITIES for k in DEFAULT_THICKNESSES],
+}
+
+
+def sequential(enhanced, grid):
+    return [process_with_ai_model(enhanced, dict(PARAMS, **overrides)) for overrides in grid]
+
+
+def check(enhanced, method, candidates):
+    """Compares the sweep's metrics with ones measured on the sequential outputs."""
+    keys = list(GRIDS[method][0])
+    by_key = {tuple(c['params'][k] for k in keys): c for c in candidates}
+    mismatches = 0
+    for overrides, binary_image in zip(GRIDS[method], sequential(enhanced, GRIDS[method])):
+        candidate = by_key[tuple(overrides[k] for k in keys)]
+        ink, _, euler = mask_metrics(255 - binary_image)  # Ink is black in the output
+        mismatches += (ink / binary_image.size != candidate['density']) or (abs(euler) != candidate['fragments'])
+    return mismatches
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='1MP,4K', help=f"comma-separated, from {', '.join(RESOLUTIONS)}")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    ok = True
+    print(f"{'size':<6}{'method':<16}{'points':>7}{'sequential':>12}{'sweep':>10}{'speedup':>9}{'mismatches':>12}")
+    for size in args.sizes.split(','):
+        enhanced = apply_enhancements(synthetic_photo(*RESOLUTIONS[size]), PARAMS)
+        for method, grid in GRIDS.items():
+            seq_seconds, _ = best_of(lambda: sequential(enhanced, grid), args.repeat)
+            sweep_seconds, candidates = best_of(lambda: sweep(enhanced, PARAMS, methods=(method,)), args.repeat)
+            mismatches = check(enhanced, method, candidates)
+            ok &= sweep_seconds < seq_seconds and not mismatches
+            print(f"{size:<6}{method:<16}{len(grid):>7}{seq_seconds * 1000:>10.1f}ms{sweep_seconds * 1000:>8.1f}ms"
+                  f"{seq_seconds / sweep_seconds:>8.1f}x{mismatches:>12}")
+
+    if not ok:
+        print("FAILED: a sweep was slower than sequential calls or its metrics differ")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
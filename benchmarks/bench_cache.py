@@ -0,0 +1,84 @@
+"""
+Times batch conversion with a cold and a warm result cache.
+
+    python benchmarks/bench_cache.py [--images 8] [--size 4K] [--format svg]
+
+Writes synthetic drawings to a temporary directory and converts them three
+times with batch.run_batch: with an empty cache, again with every output
+cached, and with different vector settings, so only the binary rasters are
+reused. Each run's outputs are compared with an uncached run. Exits with
+status 1 if a cached run is slower than the cold one or an output differs.
+"""
+import argparse
+import filecmp
+import os
+import shutil
+import sys
+import tempfile
+
+import cv2
+
+from common import RESOLUTIONS, synthetic_drawing
+
+from batch import DEFAULT_PARAMS, run_batch, output_path_for
+
+
+def convert(inputs, root, output_dir, params, output_format, cache_dir):
+    summary = run_batch(inputs, root, output_dir, params, output_format, workers=1, overwrite=True,
+                        progress=lambda line: None, cache_dir=cache_dir)
+    return summary['elapsed']
+
+
+def same_outputs(inputs, root, output_dir, reference_dir, output_format):
+    return all(filecmp.cmp(output_path_for(p, root, output_dir, output_format),
+                           output_path_for(p, root, reference_dir, output_format), shallow=False)
+               for p in inputs)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--images', type=int, default=8)
+    parser.add_argument('--size', default='4K', help=f"from {', '.join(RESOLUTIONS)}")
+    parser.add_argument('--format', default='svg', choices=('png', 'svg', 'svgz'))
+    args = parser.parse_args(argv)
+
+    directory = tempfile.mkdtemp(prefix='bench_cache')
+    try:
+        root = os.path.join(directory, 'in')
+        os.makedirs(root)
+        inputs = []
+        for seed in range(args.images):
+            path = os.path.join(root, f'{seed}.png')
+            cv2.imwrite(path, synthetic_drawing(*RESOLUTIONS[args.size], seed=seed))
+            inputs.append(path)
+        cache_dir = os.path.join(directory, 'cache')
+        other_params = dict(DEFAULT_PARAMS, tolerance=1.0)
+
+        ok = True
+        print(f"{args.images} x {args.size} images to {args.format}")
+        for label, params, use_cache in (('uncached', DEFAULT_PARAMS, False),
+                                         ('cold cache', DEFAULT_PARAMS, True),
+                                         ('warm cache', DEFAULT_PARAMS, True),
+                                         ('uncached, tolerance 1.0', other_params, False),
+                                         ('rasters cached, tolerance 1.0', other_params, True)):
+            reference = os.path.join(directory, 'reference' + ('-other' if params is other_params else ''))
+            output_dir = reference if not use_cache else os.path.join(directory, 'out')
+            seconds = convert(inputs, root, output_dir, params, args.format, cache_dir if use_cache else None)
+            same = same_outputs(inputs, root, output_dir, reference, args.format)
+            if label == 'cold cache':
+                cold = seconds
+            elif use_cache:
+                ok &= seconds < cold
+            ok &= same
+            print(f"  {label:<31}{seconds:>8.2f} s{'' if same else '  OUTPUT DIFFERS'}")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    if not ok:
+        print("FAILED: a cached run was slower than the cold run or its output differs")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
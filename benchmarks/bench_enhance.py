@@ -0,0 +1,72 @@
+"""
+Checks the OpenCV enhancement stage against PIL's ImageEnhance and times both.
+
+    python benchmarks/bench_enhance.py [--tolerance 2]
+
+Runs on synthetic 4K and 24 MP images for a few slider settings and exits
+with status 1 if any pixel differs from the PIL reference by more than the
+tolerance.
+"""
+import argparse
+import sys
+
+import cv2
+import numpy as np
+from PIL import Image, ImageEnhance
+
+from common import RESOLUTIONS, best_of, synthetic_photo
+
+from processing import apply_enhancements
+
+SIZES = ['4K', '24MP']
+
+SETTINGS = [
+    {'brightness': 50, 'contrast': 50, 'sharpness': 50, 'blur': 0},
+    {'brightness': 60, 'contrast': 70, 'sharpness': 50, 'blur': 0},
+    {'brightness': 40, 'contrast': 65, 'sharpness': 90, 'blur': 0},
+    {'brightness': 55, 'contrast': 45, 'sharpness': 20, 'blur': 2},
+]
+
+
+def reference_enhancements(image, params):
+    """The original PIL implementation of apply_enhancements."""
+    pil_image = Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+    pil_image = ImageEnhance.Brightness(pil_image).enhance(params['brightness'] / 50.0)
+    pil_image = ImageEnhance.Contrast(pil_image).enhance(params['contrast'] / 50.0)
+    pil_image = ImageEnhance.Sharpness(pil_image).enhance(params['sharpness'] / 50.0)
+    enhanced_image = cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR)
+    blur_value = params['blur']
+    if blur_value > 0:
+        enhanced_image = cv2.GaussianBlur(enhanced_image, (blur_value * 2 + 1, blur_value * 2 + 1), 0)
+    return enhanced_image
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--tolerance', type=int, default=2, help="maximum allowed per-pixel difference")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    ok = True
+    print(f"{'size':<6}{'settings (b/c/s/blur)':<24}{'PIL':>10}{'OpenCV':>10}{'buffer':>10}{'speedup':>9}{'max diff':>10}")
+    for label in SIZES:
+        image = synthetic_photo(*RESOLUTIONS[label])
+        buffer = np.empty_like(image)
+        for params in SETTINGS:
+            pil_seconds, expected = best_of(lambda: reference_enhancements(image, params), args.repeat)
+            cv_seconds, actual = best_of(lambda: apply_enhancements(image, params), args.repeat)
+            buf_seconds, _ = best_of(lambda: apply_enhancements(image, params, out=buffer), args.repeat)
+            diff = int(np.abs(actual.astype(np.int16) - expected).max())
+            ok &= diff <= args.tolerance
+            settings = '/'.join(str(params[k]) for k in ('brightness', 'contrast', 'sharpness', 'blur'))
+            print(f"{label:<6}{settings:<24}{pil_seconds * 1000:>8.1f}ms{cv_seconds * 1000:>8.1f}ms"
+                  f"{buf_seconds * 1000:>8.1f}ms{pil_seconds / cv_seconds:>8.1f}x{diff:>10}")
+
+    if not ok:
+        print(f"FAILED: output differs from PIL by more than {args.tolerance}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
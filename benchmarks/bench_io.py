@@ -0,0 +1,137 @@
+"""
+Times image input and output: reduced decoding, memory-mapped reads, background writes.
+
+    python benchmarks/bench_io.py [--size 24MP] [--images 8] [--png-level 1] [--repeat 3]
+
+decode: a JPEG decoded in full and at 1/2, 1/4 and 1/8 of its size
+(cv2.IMREAD_REDUCED_COLOR_*), as the GUI does for the first preview.
+
+read: tiled processing of a .npy file and an uncompressed TIFF, read with
+cv2.imread versus memory-mapped by fileio.open_image.
+
+write: processing a series of images and writing each result as a PNG,
+synchronously after each image versus through a fileio.AsyncWriter that
+writes while the next image is processed; also for PNG compression
+levels 1 and 9. Overlap needs a spare core: on one CPU the writer only
+takes turns with the processing.
+
+Exits with status 1 if a memory-mapped read or a written file differs from
+the reference.
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+from common import RESOLUTIONS, best_of, synthetic_drawing, synthetic_photo
+
+from processing import apply_enhancements, process_with_ai_model
+from tiling import process_tiled
+import fileio
+
+PARAMS = {'brightness': 50, 'contrast': 60, 'sharpness': 50, 'blur': 1, 'method': 'Threshold', 'threshold': 128,
+          'edge_sensitivity': 50, 'line_thickness': 1}
+
+
+def bench_decode(image, repeat):
+    data = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes()
+    print(f"decode ({len(data) / 2 ** 20:.1f} MB JPEG)")
+    base = None
+    for reduce in sorted(fileio.REDUCED_FLAGS):
+        seconds, decoded = best_of(lambda: fileio.decode_image(data, reduce), repeat)
+        base = base or seconds
+        print(f"  1/{reduce:<3}{decoded.shape[1]:>6}x{decoded.shape[0]:<6}{seconds * 1000:>9.1f} ms "
+              f"({base / seconds:.1f}x)")
+
+
+def bench_read(image, directory, tile_size, repeat):
+    expected = process_tiled(image, PARAMS, tile_size=tile_size)
+    paths = {'.npy': os.path.join(directory, 'input.npy'), '.tif': os.path.join(directory, 'input.tif')}
+    np.save(paths['.npy'], image)
+    cv2.imwrite(paths['.tif'], image, [cv2.IMWRITE_TIFF_COMPRESSION, 1])
+
+    def imread(path):
+        return np.load(path) if path.endswith('.npy') else cv2.imread(path)
+
+    ok = True
+    print(f"read + process_tiled (tiles of {tile_size} px)")
+    for extension, path in paths.items():
+        for label, read in (('read into memory', imread), ('memory-mapped', fileio.open_image)):
+            seconds, result = best_of(lambda: process_tiled(read(path), PARAMS, tile_size=tile_size), repeat)
+            same = np.array_equal(result, expected)
+            ok &= same
+            print(f"  {extension:<6}{label:<18}{seconds * 1000:>9.1f} ms{'' if same else '  OUTPUT DIFFERS'}")
+    return ok
+
+
+def write_sync(images, directory, level):
+    for i, image in enumerate(images):
+        binary_image = process_with_ai_model(apply_enhancements(image, PARAMS), PARAMS)
+        fileio.write_atomic(os.path.join(directory, f'{i}.png'), fileio.encode_image(binary_image, '.png', level))
+
+
+def write_async(images, directory, level):
+    with fileio.AsyncWriter(png_compression=level) as writer:
+        for i, image in enumerate(images):
+            binary_image = process_with_ai_model(apply_enhancements(image, PARAMS), PARAMS)
+            writer.write_image(os.path.join(directory, f'{i}.png'), binary_image)
+    if writer.errors:
+        raise IOError(writer.errors[0][1])
+
+
+def bench_write(images, directory, levels):
+    expected = [process_with_ai_model(apply_enhancements(image, PARAMS), PARAMS) for image in images]
+    ok = True
+    print(f"process + write {len(images)} PNGs")
+    for level in levels:
+        for label, write in (('synchronous', write_sync), ('AsyncWriter', write_async)):
+            output_dir = os.path.join(directory, f'{label}-{level}')
+            os.makedirs(output_dir)
+            start = time.perf_counter()
+            write(images, output_dir, level)
+            seconds = time.perf_counter() - start
+            paths = [os.path.join(output_dir, f'{i}.png') for i in range(len(images))]
+            same = all(np.array_equal(cv2.imread(path, cv2.IMREAD_GRAYSCALE), binary_image)
+                       for path, binary_image in zip(paths, expected))
+            ok &= same
+            size = sum(os.path.getsize(path) for path in paths)
+            print(f"  level {level}  {label:<14}{seconds * 1000:>9.1f} ms  {size / 2 ** 20:>7.2f} MB"
+                  f"{'' if same else '  OUTPUT DIFFERS'}")
+    return ok
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size', default='24MP', help=f"from {', '.join(RESOLUTIONS)}")
+    parser.add_argument('--images', type=int, default=8, help="images in the write series")
+    parser.add_argument('--png-level', type=int, default=1, help="PNG compression level compared with 9")
+    parser.add_argument('--tile-size', type=int, default=1024)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    width, height = RESOLUTIONS[args.size]
+    photo = synthetic_photo(width, height)
+    drawings = [synthetic_drawing(width, height, seed=seed) for seed in range(args.images)]
+    print(f"{args.size} ({width}x{height}), {os.cpu_count()} CPUs")
+
+    directory = tempfile.mkdtemp(prefix='bench_io')
+    try:
+        bench_decode(photo, args.repeat)
+        ok = bench_read(photo, directory, args.tile_size, args.repeat)
+        ok &= bench_write(drawings, directory, sorted({args.png_level, 9}))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    if not ok:
+        print("FAILED: a memory-mapped read or a written file differs from the reference")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,100 @@
+"""
+Times applying several SVG masks to a collection of same-size images.
+
+    python benchmarks/bench_masks.py [--masks 4] [--images 8] [--size 4K]
+
+The per-call path renders each template with create_mask_from_svg and
+applies it with crop_with_mask for every (image, mask) pair. The library
+path adds the templates to a masks.MaskLibrary once and calls apply_all
+per image, so each template is rasterized once and only its bounding box
+is processed. Results are compared pixel by pixel (background 0, as
+crop_with_mask gives). Exits with status 1 if they differ or the library
+is slower.
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from common import RESOLUTIONS, synthetic_drawing
+
+from masks import MaskLibrary
+from processing import create_mask_from_svg, crop_with_mask
+
+# Stencils of different extent: a small badge, a face-sized curve with a hole, a band
+TEMPLATES = [
+    '<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 100 100"><circle cx="{x}" cy="{y}" r="12"/></svg>',
+    '<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 100 100"><path fill-rule="evenodd" '
+    'd="M{x} 50 c0 -30 30 -45 40 -45 s40 15 40 45 a40 45 0 0 1 -80 0 z m25 -10 h30 v20 h-30 z"/></svg>',
+    '<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 100 100"><rect x="0" y="{y}" width="100" height="15"/></svg>',
+]
+
+
+def write_templates(directory, count):
+    paths = []
+    for i in range(count):
+        path = os.path.join(directory, f'mask{i}.svg')
+        with open(path, 'w') as f:
+            f.write(TEMPLATES[i % len(TEMPLATES)].format(x=10 + 7 * i % 60, y=15 + 11 * i % 70))
+        paths.append(path)
+    return paths
+
+
+def per_call(images, paths):
+    results = []
+    for image in images:
+        height, width = image.shape[:2]
+        results.append([crop_with_mask(image, create_mask_from_svg(path, width, height)) for path in paths])
+    return results
+
+
+def with_library(images, paths):
+    library = MaskLibrary()
+    names = [library.add(path) for path in paths]
+    results = []
+    for image in images:
+        masked = library.apply_all(image, names)
+        results.append([masked[name] for name in names])
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--masks', type=int, default=4)
+    parser.add_argument('--images', type=int, default=8)
+    parser.add_argument('--size', default='4K', help=f"from {', '.join(RESOLUTIONS)}")
+    args = parser.parse_args(argv)
+
+    directory = tempfile.mkdtemp(prefix='bench_masks')
+    try:
+        paths = write_templates(directory, args.masks)
+        images = [synthetic_drawing(*RESOLUTIONS[args.size], seed=seed)[:, :, 0] for seed in range(args.images)]
+
+        timings, outputs = {}, {}
+        for label, run in (('create_mask_from_svg + crop_with_mask', per_call), ('MaskLibrary.apply_all', with_library)):
+            start = time.perf_counter()
+            outputs[label] = run(images, paths)
+            timings[label] = time.perf_counter() - start
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    reference, library = outputs.values()
+    same = all(np.array_equal(a, b) for row_a, row_b in zip(reference, library) for a, b in zip(row_a, row_b))
+    before, after = timings.values()
+    print(f"{args.masks} masks x {args.images} {args.size} images")
+    for label, seconds in timings.items():
+        print(f"  {label:<40}{seconds:>8.2f} s")
+    print(f"  speed-up {before / after:.1f}x{'' if same else '  OUTPUT DIFFERS'}")
+
+    if not same or after > before:
+        print("FAILED: the mask library was slower or its output differs")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
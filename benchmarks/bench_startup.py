@@ -0,0 +1,127 @@
+"""
+Measures cold start-up: module import cost and time until the splash and
+the main window are shown.
+
+    python benchmarks/bench_startup.py [--repeat 5] [--platform offscreen]
+
+Every measurement runs in a fresh interpreter. Import cost is the
+cumulative time that `python -X importtime -c "import <module>"` reports
+for the module. The start-up timeline runs main.main() with show() hooks
+that note when the splash and the window appear, and when the event loop
+first runs; it is taken once as main.py does it and once with OpenCV,
+NumPy and the processing modules imported before the splash, as the old
+start-up path did (which then also waited a fixed 1 s before showing the
+window). Medians are reported.
+
+The script exits with status 1 if a headless `import processing` loads
+Qt, or if importing gui loads OpenCV, NumPy or the processing modules.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from common import REPO_ROOT
+
+MODULES = ('processing', 'gui', 'main')
+HEAVY = ('cv2', 'numpy', 'processing', 'pipeline', 'xml.etree.ElementTree')
+# Modules each import must not pull in
+FORBIDDEN = {'processing': ('PyQt5',), 'gui': ('cv2', 'numpy', 'processing', 'pipeline'),
+             'main': ('cv2', 'numpy', 'processing', 'gui')}
+
+TIMELINE = r'''
+import json, os, sys, time
+spawned = float(os.environ['BENCH_SPAWN_TIME'])
+marks = {}
+
+def mark(name):
+    marks.setdefault(name, time.time() - spawned)
+
+if os.environ.get('BENCH_EAGER'):
+    import cv2, numpy, processing, pipeline, autotune, svgwriter, resultcache
+from PyQt5.QtCore import QTimer
+from PyQt5.QtWidgets import QApplication, QMainWindow, QSplashScreen
+show_splash, show_window, run_loop = QSplashScreen.show, QMainWindow.show, QApplication.exec_
+
+def on_splash(self):
+    show_splash(self)
+    mark('splash')
+
+def on_window(self):
+    show_window(self)
+    mark('window')
+
+def on_exec(self):
+    # Scheduled here: a timer set earlier could fire in a nested event loop and quit too soon.
+    # Closing the windows ends the loop the way a user would, stopping the render thread
+    QTimer.singleShot(0, lambda: (mark('event loop'), self.closeAllWindows()))
+    return run_loop()
+
+QSplashScreen.show, QMainWindow.show, QApplication.exec_ = on_splash, on_window, on_exec
+import main
+sys.argv = ['main.py']
+main.main()
+print(json.dumps(marks))
+'''
+
+
+def import_time(module, env):
+    """(cumulative import time in seconds, names of all modules imported)."""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'], cwd=REPO_ROOT,
+                            env=env, capture_output=True, text=True, check=True)
+    seconds, loaded = None, set()
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line or 'self [us]' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        loaded.add(name.strip())
+        if name.strip() == module and not name[1:].startswith(' '):
+            seconds = int(cumulative) / 1e6
+    return seconds, loaded
+
+
+def timeline(env, eager):
+    env = dict(env, BENCH_SPAWN_TIME=repr(time.time()))
+    if eager:
+        env['BENCH_EAGER'] = '1'
+    result = subprocess.run([sys.executable, '-c', TIMELINE], cwd=REPO_ROOT, env=env,
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--platform', default='offscreen', help="QT_QPA_PLATFORM for the start-up runs")
+    args = parser.parse_args(argv)
+    env = dict(os.environ, QT_QPA_PLATFORM=args.platform)
+
+    ok = True
+    print(f"{'import':<12}{'median':>10}  heavy modules loaded")
+    for module in MODULES:
+        runs = [import_time(module, env) for _ in range(args.repeat)]
+        loaded = runs[0][1]
+        heavy = [name for name in HEAVY if name in loaded]
+        bad = [name for name in FORBIDDEN[module] if any(m == name or m.startswith(name + '.') for m in loaded)]
+        ok &= not bad
+        print(f"{module:<12}{statistics.median(s for s, _ in runs) * 1000:>8.1f}ms  "
+              f"{', '.join(heavy) or '-'}{'  UNEXPECTED: ' + ', '.join(bad) if bad else ''}")
+
+    print(f"\n{'start-up':<26}{'splash':>10}{'window':>10}{'event loop':>12}")
+    for label, eager in (('main.py', False), ('eager imports (old path)', True)):
+        runs = [timeline(env, eager) for _ in range(args.repeat)]
+        medians = {name: statistics.median(run[name] for run in runs) for name in runs[0]}
+        print(f"{label:<26}" + ''.join(f"{medians[name] * 1000:>{w - 2}.0f}ms" for name, w in
+                                       (('splash', 10), ('window', 10), ('event loop', 12))))
+
+    if not ok:
+        print("FAILED: an import loaded modules it should defer")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
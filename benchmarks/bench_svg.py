@@ -0,0 +1,101 @@
+"""
+Compares the compact SVG writer (svgwriter.py) with vectorize() + save_svg.
+
+    python benchmarks/bench_svg.py [image ...] [--method "Edge Detection"]
+
+Without arguments a synthetic line drawing is used. For every writer
+setting the table shows the time to trace and write, the anchor nodes, the
+file size relative to vectorize() and the fidelity of the result: the
+intersection-over-union of the ink in the SVG rendered back to pixels
+(with create_mask_from_svg) and the binary image it was traced from. The
+script exits with status 1 if the default settings do not produce a
+smaller file than vectorize().
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+
+import cv2
+import numpy as np
+
+from common import best_of, synthetic_drawing
+
+from processing import apply_enhancements, process_with_ai_model, vectorize, save_svg, create_mask_from_svg
+from svgwriter import save_compact_svg
+
+PARAMS = {
+    'brightness': 50, 'contrast': 50, 'sharpness': 50, 'blur': 0,
+    'method': 'Threshold', 'edge_sensitivity': 50, 'threshold': 128, 'line_thickness': 1,
+}
+
+# (label, file extension, save_compact_svg keyword arguments); the first row is the default
+WRITER_VARIANTS = [
+    ('rdp 0.5, 0.1 px, bezier', '.svg', {}),
+    ('rdp 0.5, 0.1 px, lines', '.svg', {'bezier': False}),
+    ('rdp 0.5, 1 px, lines', '.svg', {'bezier': False, 'precision': 0}),
+    ('visvalingam 0.5, 0.1 px', '.svg', {'method': 'visvalingam'}),
+    ('rdp 1.0, 0.1 px, bezier', '.svg', {'tolerance': 1.0}),
+    ('rdp 0.5, 0.1 px, svgz', '.svgz', {}),
+]
+
+
+def ink_iou(svg_path, binary_image):
+    if svg_path.endswith('.svgz'):
+        return None  # create_mask_from_svg reads plain XML only
+    height, width = binary_image.shape[:2]
+    rendered = create_mask_from_svg(svg_path, width, height) > 0
+    ink = binary_image == 0
+    return np.count_nonzero(rendered & ink) / max(np.count_nonzero(rendered | ink), 1)
+
+
+def run(binary_image, repeat, directory):
+    rows = []
+    legacy_path = os.path.join(directory, 'legacy.svg')
+    seconds, _ = best_of(lambda: save_svg(vectorize(binary_image), legacy_path), repeat)
+    legacy_bytes = os.path.getsize(legacy_path)
+    rows.append(('vectorize + save_svg', seconds, None, legacy_bytes, ink_iou(legacy_path, binary_image)))
+
+    for index, (label, extension, options) in enumerate(WRITER_VARIANTS):
+        path = os.path.join(directory, f'compact{index}{extension}')
+        seconds, report = best_of(lambda: save_compact_svg(binary_image, path, **options), repeat)
+        rows.append((label, seconds, report['nodes_after'], report['bytes_after'], ink_iou(path, binary_image)))
+    return legacy_bytes, rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('images', nargs='*')
+    parser.add_argument('--method', default='Threshold', choices=('Threshold', 'Edge Detection'))
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    params = dict(PARAMS, method=args.method)
+    sources = [(path, cv2.imread(path)) for path in args.images] or [('synthetic', synthetic_drawing())]
+    directory = tempfile.mkdtemp(prefix='bench_svg')
+    ok = True
+    try:
+        for label, image in sources:
+            if image is None:
+                print(f"{label}: could not read image")
+                continue
+            binary_image = process_with_ai_model(apply_enhancements(image, params), params)
+            legacy_bytes, rows = run(binary_image, args.repeat, directory)
+            print(f"{label} ({binary_image.shape[1]}x{binary_image.shape[0]}, {args.method})")
+            print(f"  {'writer':<26}{'time':>10}{'nodes':>9}{'bytes':>11}{'size':>7}{'IoU':>8}")
+            for name, seconds, nodes, size, iou in rows:
+                print(f"  {name:<26}{seconds * 1000:>8.1f}ms{nodes if nodes is not None else '-':>9}{size:>11}"
+                      f"{100 * size / legacy_bytes:>6.0f}%{f'{iou:.4f}' if iou is not None else '-':>8}")
+            ok &= rows[1][3] < legacy_bytes
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    if not ok:
+        print("FAILED: the compact writer's default output was not smaller than vectorize()")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,86 @@
+"""
+Scaling curves for multi-core execution inside one image.
+
+    python benchmarks/bench_threads.py [--size 24MP] [--threads 1,2,4,8] [--repeat 3]
+
+For each thread count, times the enhancement stage and process_with_ai_model
+for a few extraction engines on one synthetic photo, two ways: OpenCV's
+own threading alone (cv2.setNumThreads, one-piece calls) and row bands on
+a thread pool (parallel.py, with the same OpenCV thread count). Speed-ups
+are relative to one thread. The default thread counts double up to the
+CPU count. Exits with status 1 if a banded result differs from the
+one-piece one.
+"""
+import argparse
+import os
+import sys
+
+import cv2
+import numpy as np
+
+from common import RESOLUTIONS, best_of, synthetic_photo
+
+from processing import apply_enhancements, process_with_ai_model
+import parallel
+
+ENHANCE_PARAMS = {'brightness': 55, 'contrast': 60, 'sharpness': 70, 'blur': 1}
+STAGES = [
+    ('enhance', None),
+    ('Threshold', dict(ENHANCE_PARAMS, method='Threshold', threshold=128)),
+    ('Edge Detection', dict(ENHANCE_PARAMS, method='Edge Detection', edge_sensitivity=50, threshold=128,
+                            line_thickness=2)),
+    ('XDoG', dict(ENHANCE_PARAMS, method='XDoG', threshold=128)),
+    ('Adaptive Threshold', dict(ENHANCE_PARAMS, method='Adaptive Threshold')),
+]
+
+
+def default_thread_counts():
+    counts, n = [], 1
+    while n < (os.cpu_count() or 1):
+        counts.append(n)
+        n *= 2
+    return counts + [os.cpu_count() or 1]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size', default='24MP', help=f"from {', '.join(RESOLUTIONS)}")
+    parser.add_argument('--threads', default=None, help="comma-separated thread counts (default: 1, 2, 4, ... CPUs)")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+    counts = [int(n) for n in args.threads.split(',')] if args.threads else default_thread_counts()
+
+    image = synthetic_photo(*RESOLUTIONS[args.size])
+    enhanced = apply_enhancements(image, ENHANCE_PARAMS)
+    one_piece = {'enhance': (lambda: apply_enhancements(image, ENHANCE_PARAMS))}
+    banded = {'enhance': (lambda threads: parallel.enhance_banded(image, ENHANCE_PARAMS, threads))}
+    for name, params in STAGES[1:]:
+        one_piece[name] = lambda params=params: process_with_ai_model(enhanced, params)
+        banded[name] = lambda threads, params=params: parallel.process_banded(enhanced, params, threads)
+
+    ok = True
+    print(f"{args.size} photo, {os.cpu_count()} CPUs; ms (speed-up vs 1 thread)")
+    print(f"{'stage':<20}{'threads':>8}{'OpenCV only':>20}{'row bands':>20}")
+    for name, _ in STAGES:
+        base = {}
+        for threads in counts:
+            cv2.setNumThreads(threads)
+            opencv_seconds, expected = best_of(one_piece[name], args.repeat)
+            band_seconds, actual = best_of(lambda: banded[name](threads), args.repeat)
+            base.setdefault('opencv', opencv_seconds)
+            base.setdefault('bands', band_seconds)
+            same = np.array_equal(expected, actual)
+            ok &= same
+            print(f"{name:<20}{threads:>8}"
+                  f"{opencv_seconds * 1000:>11.1f} ({base['opencv'] / opencv_seconds:>4.1f}x)"
+                  f"{band_seconds * 1000:>11.1f} ({base['bands'] / band_seconds:>4.1f}x)"
+                  f"{'' if same else '  OUTPUT DIFFERS'}")
+
+    if not ok:
+        print("FAILED: a banded result differs from the one-piece result")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
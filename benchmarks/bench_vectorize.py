@@ -0,0 +1,86 @@
+"""
+Compares the built-in tracer against Potrace for speed and output size.
+
+    python benchmarks/bench_vectorize.py [image ...] [--method "Edge Detection"]
+
+Without arguments a synthetic line drawing is used. Potrace is skipped when
+it cannot be found. "Points" counts coordinate pairs in the path data, which
+is comparable across both tracers (Potrace uses relative c/l commands).
+"""
+import argparse
+import os
+import re
+import tempfile
+
+import cv2
+
+from common import best_of, synthetic_drawing
+
+from processing import apply_enhancements, process_with_ai_model, vectorize, trace_with_potrace
+
+PARAMS = {
+    'brightness': 50, 'contrast': 50, 'sharpness': 50, 'blur': 0,
+    'method': 'Threshold', 'edge_sensitivity': 50, 'threshold': 128, 'line_thickness': 1,
+}
+
+BUILTIN_VARIANTS = [
+    ('builtin tol=0 polygon', {'tolerance': 0, 'bezier': False}),
+    ('builtin tol=0.5 polygon', {'tolerance': 0.5, 'bezier': False}),
+    ('builtin tol=0.5 bezier', {'tolerance': 0.5, 'bezier': True}),
+    ('builtin tol=1.5 bezier', {'tolerance': 1.5, 'bezier': True}),
+]
+
+
+def count_points(svg):
+    """Number of coordinate pairs over all path data in an SVG document."""
+    total = 0
+    for d in re.findall(r'\sd="([^"]*)"', svg):
+        total += len(re.findall(r'[-+]?[0-9]*\.?[0-9]+(?:[eE][-+]?[0-9]+)?', d)) // 2
+    return total
+
+
+def run(binary_image, repeat):
+    rows = []
+    for name, knobs in BUILTIN_VARIANTS:
+        seconds, svg = best_of(lambda: vectorize(binary_image, **knobs), repeat)
+        rows.append((name, seconds, count_points(svg), len(svg.encode('utf-8'))))
+
+    fd, out_path = tempfile.mkstemp(suffix='.svg')
+    os.close(fd)
+    try:
+        seconds, _ = best_of(lambda: trace_with_potrace(binary_image, out_path), repeat)
+        with open(out_path, 'r', encoding='utf-8') as f:
+            svg = f.read()
+        rows.append(('potrace -s', seconds, count_points(svg), len(svg.encode('utf-8'))))
+    except Exception as e:
+        rows.append(('potrace -s', None, None, f"skipped ({type(e).__name__})"))
+    finally:
+        os.remove(out_path)
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('images', nargs='*')
+    parser.add_argument('--method', default='Threshold', choices=('Threshold', 'Edge Detection'))
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    params = dict(PARAMS, method=args.method)
+    sources = [(path, cv2.imread(path)) for path in args.images] or [('synthetic', synthetic_drawing())]
+    for label, image in sources:
+        if image is None:
+            print(f"{label}: could not read image")
+            continue
+        binary_image = process_with_ai_model(apply_enhancements(image, params), params)
+        print(f"{label} ({binary_image.shape[1]}x{binary_image.shape[0]}, {args.method})")
+        print(f"  {'tracer':<26}{'time':>10}{'points':>10}{'bytes':>12}")
+        for name, seconds, points, size in run(binary_image, args.repeat):
+            if seconds is None:
+                print(f"  {name:<26}{size:>32}")
+            else:
+                print(f"  {name:<26}{seconds * 1000:>8.1f}ms{points:>10}{size:>12}")
+
+
+if __name__ == '__main__':
+    main()
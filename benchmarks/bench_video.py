@@ -0,0 +1,62 @@
+"""
+Measures sustained fps of the streaming video pipeline (video.py).
+
+    python benchmarks/bench_video.py [--size 1MP] [--frames 40]
+
+Streams synthetic frames (a static drawing with one moving shape) through
+vectorize_stream to SVG, with whole-frame tracing and with tiled change
+detection, and compares both with a plain sequential loop over the same
+stages.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import cv2
+
+from common import RESOLUTIONS, synthetic_drawing
+
+from batch import DEFAULT_PARAMS
+from processing import apply_enhancements, process_with_ai_model, vectorize, save_svg
+from video import vectorize_stream
+
+
+def frames(size, count):
+    width, height = RESOLUTIONS[size]
+    base = synthetic_drawing(width, height)
+    for index in range(count):
+        frame = base.copy()
+        cv2.circle(frame, (width // 10 + index * width // (2 * count), height // 2), height // 12, (0, 0, 0), -1)
+        yield index, frame
+
+
+def sequential(size, count, output_dir):
+    start = time.perf_counter()
+    for index, frame in frames(size, count):
+        binary_image = process_with_ai_model(apply_enhancements(frame, DEFAULT_PARAMS), DEFAULT_PARAMS)
+        save_svg(vectorize(binary_image), os.path.join(output_dir, f'frame_{index:06d}.svg'))
+    return count / (time.perf_counter() - start)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size', default='1MP', choices=list(RESOLUTIONS))
+    parser.add_argument('--frames', type=int, default=40)
+    args = parser.parse_args(argv)
+
+    print(f"{args.frames} frames at {args.size}")
+    print(f"{'mode':<28}{'fps':>8}{'tiles reused':>14}")
+    with tempfile.TemporaryDirectory() as scratch:
+        print(f"{'sequential, whole frame':<28}{sequential(args.size, args.frames, scratch):>8.2f}{'-':>14}")
+        for label, tile_size in (('streamed, whole frame', 0), ('streamed, 256 px tiles', 256)):
+            summary = vectorize_stream(frames(args.size, args.frames), DEFAULT_PARAMS, scratch, 'svg',
+                                       tile_size=tile_size)
+            tiles = summary['tiles_traced'] + summary['tiles_reused']
+            print(f"{label:<28}{summary['fps']:>8.2f}{100.0 * summary['tiles_reused'] / tiles:>13.0f}%")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,63 @@
+"""
+Shared helpers for the benchmark scripts: synthetic inputs and timing.
+
+Importing this module puts the repository root on sys.path so the scripts
+can import processing and friends when run as `python benchmarks/<script>.py`.
+"""
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+# Named resolutions used across the benchmarks
+RESOLUTIONS = {
+    '1MP': (1280, 800),
+    '4K': (3840, 2160),
+    '24MP': (6000, 4000),
+}
+
+
+def synthetic_drawing(width=2000, height=1500, seed=0):
+    """White canvas with random strokes, circles and text."""
+    rng = np.random.default_rng(seed)
+    image = np.full((height, width, 3), 255, np.uint8)
+    scale = max(width, height) / 2000
+    for _ in range(int(150 * scale)):
+        p1 = tuple(int(v) for v in rng.integers(0, (width, height)))
+        p2 = tuple(int(v) for v in rng.integers(0, (width, height)))
+        cv2.line(image, p1, p2, (0, 0, 0), int(rng.integers(1, 6)), cv2.LINE_AA)
+    for _ in range(int(60 * scale)):
+        center = tuple(int(v) for v in rng.integers(0, (width, height)))
+        cv2.circle(image, center, int(rng.integers(5, 200)), (0, 0, 0), int(rng.integers(1, 4)), cv2.LINE_AA)
+    for i in range(int(height / 130) - 1):
+        cv2.putText(image, "Line Drawing", (50, 100 + i * 130), cv2.FONT_HERSHEY_SIMPLEX, 3, (0, 0, 0), 3)
+    return image
+
+
+def synthetic_photo(width, height, seed=0):
+    """Smooth gradients plus noise and a few hard edges, like a scanned photo."""
+    rng = np.random.default_rng(seed)
+    small = rng.integers(0, 256, (height // 64 + 1, width // 64 + 1, 3), dtype=np.uint8)
+    image = cv2.resize(small, (width, height), interpolation=cv2.INTER_CUBIC)
+    image = cv2.add(image, rng.integers(0, 24, image.shape, dtype=np.uint8))
+    for _ in range(40):
+        p1 = tuple(int(v) for v in rng.integers(0, (width, height)))
+        p2 = tuple(int(v) for v in rng.integers(0, (width, height)))
+        cv2.line(image, p1, p2, (20, 20, 20), int(rng.integers(1, 8)))
+    return image
+
+
+def best_of(func, repeat):
+    """Runs func repeat times; returns (fastest wall time in seconds, last result)."""
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
@@ -0,0 +1,101 @@
+"""
+Load test for the HTTP service in server.py.
+
+    python server.py --port 8080 --workers 4 &
+    python benchmarks/load_test.py --url http://127.0.0.1:8080 --clients 16 --requests 200
+
+Each client thread keeps one HTTP/1.1 connection open and posts a
+synthetic drawing as fast as it is answered. Reports throughput, latency
+percentiles of successful requests and how many were refused with 429,
+followed by the server's own /metrics.
+"""
+import argparse
+import http.client
+import json
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+import cv2
+import numpy as np
+
+from common import RESOLUTIONS, synthetic_drawing
+
+
+def client(url, body, path, count, results, lock):
+    parts = urlsplit(url)
+    connection = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=300)
+    try:
+        for _ in range(count):
+            start = time.perf_counter()
+            try:
+                connection.request('POST', path, body, {'Content-Type': 'application/octet-stream'})
+                response = connection.getresponse()
+                response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                status = 'error'
+            with lock:
+                results.append((status, time.perf_counter() - start))
+    finally:
+        connection.close()
+
+
+def run_load(url, body, path, clients, total):
+    results, lock = [], threading.Lock()
+    per_client = [total // clients + (i < total % clients) for i in range(clients)]
+    threads = [threading.Thread(target=client, args=(url, body, path, n, results, lock)) for n in per_client]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, time.perf_counter() - start
+
+
+def report(results, elapsed):
+    statuses = {}
+    for status, _ in results:
+        statuses[status] = statuses.get(status, 0) + 1
+    ok = np.array([latency for status, latency in results if status == 200]) * 1000
+    print(f"{len(results)} requests in {elapsed:.2f} s: {len(ok) / elapsed:.1f} successful req/s")
+    print("status counts: " + ', '.join(f"{k}={v}" for k, v in sorted(statuses.items(), key=str)))
+    if len(ok):
+        print(f"latency ms: p50 {np.percentile(ok, 50):.1f}  p95 {np.percentile(ok, 95):.1f}  "
+              f"p99 {np.percentile(ok, 99):.1f}  max {ok.max():.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--url', default='http://127.0.0.1:8080')
+    parser.add_argument('--clients', type=int, default=8, help="concurrent connections")
+    parser.add_argument('--requests', type=int, default=100, help="total requests")
+    parser.add_argument('--size', default='1MP', help=f"input size, from {', '.join(RESOLUTIONS)}")
+    parser.add_argument('--format', default='svg', choices=('svg', 'png'))
+    parser.add_argument('--query', default='', help="extra query arguments, e.g. 'preset=edges'")
+    args = parser.parse_args(argv)
+
+    ok, encoded = cv2.imencode('.png', synthetic_drawing(*RESOLUTIONS[args.size]))
+    body = encoded.tobytes()
+    path = f"/vectorize?format={args.format}" + (f"&{args.query}" if args.query else '')
+    print(f"Posting {len(body) / 1024:.0f} KiB {args.size} PNG to {args.url}{path} with {args.clients} clients")
+
+    results, elapsed = run_load(args.url, body, path, args.clients, args.requests)
+    report(results, elapsed)
+
+    parts = urlsplit(args.url)
+    connection = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=10)
+    try:
+        connection.request('GET', '/metrics')
+        print("server metrics:", json.dumps(json.loads(connection.getresponse().read()), indent=2))
+    except (OSError, http.client.HTTPException, ValueError) as e:
+        print(f"Could not fetch /metrics: {e}")
+    finally:
+        connection.close()
+    return 0 if any(status == 200 for status, _ in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
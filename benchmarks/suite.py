@@ -0,0 +1,250 @@
+"""
+Benchmark suite and regression harness for the processing pipeline.
+
+Times each stage (apply_enhancements, process_with_ai_model for every
+extraction engine, create_mask_from_svg, crop_with_mask, vectorize) and the
+whole chain on synthetic images at several resolutions, recording the best
+and median wall time, the peak traced memory and a digest of the output.
+The engines' times are also summarised relative to Threshold, next to the
+cost each one declares.
+
+    python benchmarks/suite.py --save baseline.json
+    python benchmarks/suite.py --compare baseline.json --threshold 0.15
+
+With --compare the run fails (exit status 1) if a stage got slower than the
+baseline by more than the threshold, or if any output digest differs, so a
+speed-up cannot silently change results. Digests are only comparable
+between runs with the same OpenCV/NumPy versions; mismatching versions
+are reported and output checks are then skipped.
+"""
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import platform
+import re
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from common import RESOLUTIONS, synthetic_drawing
+
+from processing import (
+    apply_enhancements, process_with_ai_model, create_mask_from_svg, crop_with_mask, vectorize
+)
+from engines import ENGINES
+
+ENHANCE_PARAMS = {'brightness': 55, 'contrast': 60, 'sharpness': 70, 'blur': 1}
+THRESHOLD_PARAMS = dict(ENHANCE_PARAMS, method='Threshold', edge_sensitivity=50, threshold=128, line_thickness=1)
+EDGE_PARAMS = dict(THRESHOLD_PARAMS, method='Edge Detection', line_thickness=2)
+# Stage names of the extraction engines; the first two predate the registry
+ENGINE_STAGES = {'Threshold': 'process_threshold', 'Edge Detection': 'process_edges'}
+for _name in ENGINES:
+    ENGINE_STAGES.setdefault(_name, 'engine_' + re.sub(r'\W+', '_', _name.lower()))
+
+# Stencil with a curve, an arc and a hole to exercise the path parser
+MASK_TEMPLATE = """<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 100 100">
+  <path fill-rule="evenodd" d="M10 50 C10 20 40 5 50 5 S90 20 90 50 A40 45 0 0 1 10 50 Z
+                               M35 40 h30 v20 h-30 z"/>
+</svg>
+"""
+
+
+def digest(result):
+    """Stable fingerprint of a stage output (array or SVG string)."""
+    h = hashlib.sha256()
+    if isinstance(result, np.ndarray):
+        h.update(str((result.shape, result.dtype.str)).encode())
+        h.update(np.ascontiguousarray(result).tobytes())
+    else:
+        h.update(str(result).encode('utf-8'))
+    return h.hexdigest()[:16]
+
+
+def build_stages(image, mask_path):
+    """Returns [(name, callable)] for one input image; inputs are precomputed."""
+    height, width = image.shape[:2]
+    enhanced = apply_enhancements(image, ENHANCE_PARAMS)
+    binary = process_with_ai_model(enhanced, THRESHOLD_PARAMS)
+    mask = create_mask_from_svg(mask_path, width, height)
+
+    def end_to_end():
+        stage_mask = create_mask_from_svg(mask_path, width, height)
+        result = crop_with_mask(process_with_ai_model(apply_enhancements(image, THRESHOLD_PARAMS), THRESHOLD_PARAMS),
+                                stage_mask)
+        return vectorize(result)
+
+    stages = [
+        ('enhance', lambda: apply_enhancements(image, ENHANCE_PARAMS)),
+        ('process_threshold', lambda: process_with_ai_model(enhanced, THRESHOLD_PARAMS)),
+        ('process_edges', lambda: process_with_ai_model(enhanced, EDGE_PARAMS)),
+    ]
+    for name, stage_name in ENGINE_STAGES.items():
+        if name not in ('Threshold', 'Edge Detection'):
+            params = dict(EDGE_PARAMS, method=name)
+            stages.append((stage_name, lambda params=params: process_with_ai_model(enhanced, params)))
+    return stages + [
+        ('svg_mask', lambda: create_mask_from_svg(mask_path, width, height)),
+        ('crop', lambda: crop_with_mask(binary, mask)),
+        ('vectorize', lambda: vectorize(binary)),
+        ('end_to_end', end_to_end),
+    ]
+
+
+def measure(func, repeat):
+    """Times func; a separate traced run gives peak memory and the output digest."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        result = func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'best_s': min(times),
+        'median_s': statistics.median(times),
+        'peak_bytes': peak,
+        'digest': digest(result),
+    }
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'opencv_threads': cv2.getNumThreads(),
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+    }
+
+
+def run_suite(sizes, repeat, stage_filter=None, progress=print):
+    results = {}
+    with tempfile.TemporaryDirectory() as scratch:
+        mask_path = os.path.join(scratch, 'mask.svg')
+        with open(mask_path, 'w', encoding='utf-8') as f:
+            f.write(MASK_TEMPLATE)
+
+        for size in sizes:
+            image = synthetic_drawing(*RESOLUTIONS[size])
+            for name, func in build_stages(image, mask_path):
+                if stage_filter and name not in stage_filter:
+                    continue
+                key = f"{size}/{name}"
+                results[key] = measure(func, repeat)
+                progress(format_row(key, results[key]))
+    return results
+
+
+def engine_costs(results, sizes):
+    """Rows of each engine's median time relative to Threshold, per size, with its declared cost."""
+    rows = []
+    for name, stage_name in ENGINE_STAGES.items():
+        ratios = []
+        for size in sizes:
+            entry, reference = results.get(f"{size}/{stage_name}"), results.get(f"{size}/process_threshold")
+            ratios.append(entry['median_s'] / reference['median_s'] if entry and reference else None)
+        if any(ratio is not None for ratio in ratios):
+            rows.append(f"{name:<24}{ENGINES[name].cost:>10g}" +
+                        ''.join(f"{ratio:>10.1f}" if ratio is not None else f"{'-':>10}" for ratio in ratios))
+    return rows
+
+
+def format_row(key, entry, baseline=None):
+    row = (f"{key:<32}{entry['best_s'] * 1000:>10.1f}{entry['median_s'] * 1000:>10.1f}"
+           f"{entry['peak_bytes'] / 2 ** 20:>10.1f}  {entry['digest']}")
+    if baseline is not None:
+        change = entry['median_s'] / baseline['median_s'] - 1 if baseline['median_s'] else 0.0
+        row += f"{change * 100:>+9.1f}%"
+    return row
+
+
+def compare(results, baseline, threshold, check_outputs=True, min_delta=0.001):
+    """
+    Returns a list of failure messages against a baseline results dict.
+    Slowdowns smaller than min_delta seconds are ignored as timer noise.
+    """
+    failures = []
+    for key, entry in results.items():
+        reference = baseline.get(key)
+        if reference is None:
+            continue
+        slowdown = entry['median_s'] - reference['median_s']
+        if slowdown > reference['median_s'] * threshold and slowdown > min_delta:
+            failures.append(f"{key}: median {entry['median_s'] * 1000:.1f} ms vs "
+                            f"{reference['median_s'] * 1000:.1f} ms baseline (> {threshold:.0%} slower)")
+        if check_outputs and entry['digest'] != reference['digest']:
+            failures.append(f"{key}: output changed ({reference['digest']} -> {entry['digest']})")
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='1MP,4K', help=f"comma-separated, from {', '.join(RESOLUTIONS)}")
+    parser.add_argument('--stages', default=None, help="comma-separated subset of stages to run")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--save', metavar='JSON', help="write results to this file")
+    parser.add_argument('--compare', metavar='JSON', help="baseline results to check against")
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help="allowed slowdown of the median before failing (default 0.10 = 10%%)")
+    parser.add_argument('--min-delta-ms', type=float, default=1.0,
+                        help="ignore slowdowns smaller than this many milliseconds")
+    args = parser.parse_args(argv)
+
+    sizes = args.sizes.split(',')
+    unknown = [s for s in sizes if s not in RESOLUTIONS]
+    if unknown:
+        parser.error(f"unknown size(s): {', '.join(unknown)}")
+    stage_filter = set(args.stages.split(',')) if args.stages else None
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    env = environment()
+    print(f"OpenCV {env['opencv']}, NumPy {env['numpy']}, {env['cpu_count']} CPUs")
+    print(f"{'stage':<32}{'best ms':>10}{'median ms':>10}{'peak MiB':>10}  {'digest':<16}")
+    results = run_suite(sizes, args.repeat, stage_filter, progress=lambda row: None if baseline else print(row))
+
+    status = 0
+    if baseline is not None:
+        base_results = baseline['results']
+        for key, entry in results.items():
+            print(format_row(key, entry, base_results.get(key)))
+        same_versions = all(baseline['environment'].get(k) == env[k] for k in ('numpy', 'opencv'))
+        if not same_versions:
+            print("Baseline was recorded with different NumPy/OpenCV versions; skipping output checks.")
+        failures = compare(results, base_results, args.threshold, same_versions, args.min_delta_ms / 1000)
+        for failure in failures:
+            print(f"REGRESSION {failure}")
+        status = 1 if failures else 0
+
+    costs = engine_costs(results, sizes)
+    if costs:
+        print(f"\n{'engine (x Threshold)':<24}{'declared':>10}" + ''.join(f"{size:>10}" for size in sizes))
+        print('\n'.join(costs))
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({'environment': env, 'results': results}, f, indent=2)
+        print(f"Results written to {args.save}")
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,288 @@
+"""
+Line extraction engines: the ways process_with_ai_model can turn a
+grayscale image into a binary line drawing (0 = ink, 255 = paper).
+
+Each engine declares the parameter keys it reads, a rough cost and, if its
+output only depends on a bounded neighbourhood, how far that reaches (its
+halo), which lets tiling.py run it tile by tile. The registry is what the
+GUI method selector, batch presets and the benchmarks enumerate:
+
+    engine = get_engine(params['method'])
+    binary = engine.extract(gray, params)
+
+Intermediate arrays are kept per thread and reused between calls of the
+same size, so a batch or a slider drag does not reallocate them; returned
+images are always new arrays, since callers cache them.
+
+The module only needs OpenCV and NumPy once an engine runs, so the GUI can
+list the engines at start-up without loading them.
+"""
+import math
+import threading
+
+from lazyimport import lazy_import
+
+cv2 = lazy_import('cv2')
+np = lazy_import('numpy')
+processing = lazy_import('processing')
+
+# Controls for every parameter an engine can read. Parameters marked spatial
+# are in pixels and are scaled with the image for preview proxies.
+PARAMETERS = {
+    'threshold': {'label': 'Threshold', 'default': 128, 'min': 0, 'max': 255},
+    'edge_sensitivity': {'label': 'Edge Sensitivity', 'default': 50, 'min': 0, 'max': 100},
+    'line_thickness': {'label': 'Line Thickness', 'default': 1, 'min': 1, 'max': 10, 'spatial': True},
+    'block_size': {'label': 'Block Size', 'default': 31, 'min': 3, 'max': 201, 'step': 2, 'spatial': True},
+    'adaptive_offset': {'label': 'Offset', 'default': 10, 'min': -50, 'max': 50},
+    'xdog_sigma': {'label': 'Line Scale', 'default': 1.0, 'min': 0.3, 'max': 5.0, 'step': 0.1, 'spatial': True},
+    'xdog_strength': {'label': 'Edge Emphasis', 'default': 20, 'min': 0, 'max': 100},
+    'canny_scales': {'label': 'Scales', 'default': 3, 'min': 1, 'max': 4},
+}
+
+# Ranges of the settings around the engines (enhancement and vectorization),
+# which check_params checks as well; the enhancement ranges are the GUI's.
+SETTINGS = {
+    'brightness': {'min': 0, 'max': 100},
+    'contrast': {'min': 0, 'max': 100},
+    'sharpness': {'min': 0, 'max': 100},
+    'blur': {'min': 0, 'max': 50},              # Gaussian kernel of 2 * blur + 1 pixels
+    'tolerance': {'min': 0.0, 'max': 100.0},    # Outline simplification, in pixels
+    'precision': {'min': 0, 'max': 6},          # SVG decimals; more overflows the quantized coordinates
+}
+
+XDOG_K = 1.6  # Ratio of the two Gaussians, as in the XDoG paper
+
+ENGINES = {}
+_local = threading.local()
+
+
+class Engine:
+    """
+    One extraction method.
+
+    extract(gray, params) returns a new uint8 binary image. params lists the
+    keys it reads (see PARAMETERS). cost is the approximate run time of
+    process_with_ai_model relative to 'Threshold' on the same image, as
+    measured by benchmarks/suite.py on 2-8 MP inputs; it depends on the
+    content (thinning takes longer the thicker the strokes). halo(params) is the number of pixels of
+    context each output pixel depends on, or None when the result depends
+    on the whole image and cannot be computed in independent tiles.
+    """
+
+    def __init__(self, name, extract, params=(), cost=1.0, description='', halo=None):
+        self.name = name
+        self.extract = extract
+        self.params = tuple(params)
+        self.cost = cost
+        self.description = description
+        self.halo = halo
+
+    def key(self, params):
+        """The values of the engine's parameters, e.g. for memoizing its output."""
+        return tuple(param(params, key) for key in self.params)
+
+    def __repr__(self):
+        return f"<Engine '{self.name}'>"
+
+
+def register_engine(engine):
+    """Adds an engine to the registry (replacing one with the same name) and returns it."""
+    ENGINES[engine.name] = engine
+    return engine
+
+
+def get_engine(name):
+    try:
+        return ENGINES[name]
+    except KeyError:
+        raise ValueError(f"Unknown processing method '{name}' (choose from: {', '.join(ENGINES)})") from None
+
+
+def check_params(params):
+    """
+    Raises ValueError for an unknown method, or an engine parameter or one
+    of the SETTINGS out of its range.
+    """
+    get_engine(params['method'])
+    for key, spec in list(PARAMETERS.items()) + list(SETTINGS.items()):
+        if key not in params:
+            continue
+        value = params[key]
+        if not spec['min'] <= value <= spec['max']:
+            raise ValueError(f"{key} must be between {spec['min']} and {spec['max']}, not {value}")
+        if isinstance(spec.get('default', spec['min']), int) and (value - spec['min']) % spec.get('step', 1):
+            if 'step' not in spec:
+                raise ValueError(f"{key} must be a whole number, not {value}")
+            raise ValueError(f"{key} must be {spec['min']} plus a multiple of {spec['step']}, not {value}")
+
+
+def param(params, key):
+    """params[key], or its default for parameter dicts that predate the key."""
+    return params[key] if key in params else PARAMETERS[key]['default']
+
+
+def scale_param(key, value, scale):
+    """A spatial parameter adapted to an image resized by scale, kept on its step grid."""
+    spec = PARAMETERS[key]
+    value = value * scale
+    if isinstance(spec['default'], int):
+        step = spec.get('step', 1)
+        value = spec['min'] + step * int(round((value - spec['min']) / step)) if step != 1 else int(round(value))
+    return max(spec['min'], value)
+
+
+def _buffer(name, shape, dtype):
+    """Scratch array reused between calls on the same thread; its contents are undefined."""
+    buffers = _local.__dict__.setdefault('buffers', {})
+    array = buffers.get(name)
+    if array is None or array.shape != shape or array.dtype != dtype:
+        array = buffers[name] = np.empty(shape, dtype)
+    return array
+
+
+# --- Engines -----------------------------------------------------------------
+
+def threshold(gray, params):
+    return processing.threshold_image(gray, params['threshold'])
+
+
+def edge_detection(gray, params):
+    edges = processing.detect_edges(gray, params['edge_sensitivity'])
+    thick_edges = processing.thicken_lines(edges, params['line_thickness'])
+    return processing.threshold_image(thick_edges, params['threshold'], invert=True)
+
+
+def otsu_threshold(gray, params):
+    _, binary_image = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    return binary_image
+
+
+def adaptive_threshold(gray, params):
+    # Ink where a pixel is darker than the mean of its block by more than the offset
+    return cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY,
+                                 param(params, 'block_size'), param(params, 'adaptive_offset'))
+
+
+def _xdog_kernel(sigma):
+    return cv2.getGaussianKernel(2 * math.ceil(3 * sigma) + 1, sigma, cv2.CV_32F)
+
+
+def xdog(gray, params):
+    """
+    Extended difference of Gaussians with a hard threshold: the image is
+    sharpened by strength times the difference of two blurs (sigma and
+    XDOG_K * sigma) and pixels below the threshold become ink. Strokes come
+    out with an even width set by sigma, dark areas stay filled.
+    """
+    sigma, strength = param(params, 'xdog_sigma'), param(params, 'xdog_strength')
+    fine = _buffer('xdog_fine', gray.shape, np.float32)
+    coarse = _buffer('xdog_coarse', gray.shape, np.float32)
+    kernel = _xdog_kernel(sigma)
+    cv2.sepFilter2D(gray, cv2.CV_32F, kernel, kernel, dst=fine)
+    kernel = _xdog_kernel(XDOG_K * sigma)
+    cv2.sepFilter2D(gray, cv2.CV_32F, kernel, kernel, dst=coarse)
+    cv2.addWeighted(fine, 1 + strength, coarse, -strength, 0, dst=fine)
+    return cv2.compare(fine, params['threshold'], cv2.CMP_GT)
+
+
+def _xdog_halo(params):
+    return math.ceil(3 * XDOG_K * param(params, 'xdog_sigma'))
+
+
+def multiscale_canny(gray, params):
+    """
+    Canny on the image and on Gaussian blurs of it (sigma 1, 2, 4, ...),
+    combined, so both fine detail and soft, large-scale contours are found.
+    One scale gives the same result as Edge Detection.
+    """
+    sensitivity = params['edge_sensitivity']
+    edges = processing.detect_edges(gray, sensitivity)
+    blurred = _buffer('canny_blurred', gray.shape, np.uint8)
+    scale_edges = _buffer('canny_edges', gray.shape, np.uint8)
+    for level in range(1, param(params, 'canny_scales')):
+        cv2.GaussianBlur(gray, (0, 0), 2 ** (level - 1), dst=blurred)
+        cv2.Canny(blurred, sensitivity, sensitivity * 2, edges=scale_edges)
+        cv2.bitwise_or(edges, scale_edges, dst=edges)
+    thick_edges = processing.thicken_lines(edges, params['line_thickness'])
+    return processing.threshold_image(thick_edges, params['threshold'], invert=True)
+
+
+# Neighbour weights for the 8-neighbourhood code: bit 0 north, then clockwise
+_NEIGHBOUR_KERNEL = [[128, 1, 2], [64, 0, 4], [32, 16, 8]]
+_thinning_tables = None
+
+
+def _thinning_luts():
+    """Zhang-Suen deletion tables for both sub-iterations, indexed by neighbourhood code."""
+    global _thinning_tables
+    if _thinning_tables is None:
+        tables = np.zeros((2, 256), np.uint8)
+        for code in range(256):
+            p = [(code >> bit) & 1 for bit in range(8)]  # P2 .. P9
+            transitions = sum(p[i] == 0 and p[(i + 1) % 8] == 1 for i in range(8))
+            if transitions != 1 or not 2 <= sum(p) <= 6:
+                continue
+            north, east, south, west = p[0], p[2], p[4], p[6]
+            tables[0, code] = not (north and east and south) and not (east and south and west)
+            tables[1, code] = not (north and east and west) and not (north and south and west)
+        _thinning_tables = tables
+    return _thinning_tables
+
+
+def thin(ink):
+    """
+    Zhang-Suen thinning of a 0/1 uint8 image, in place: strokes are eroded
+    from both sides until they are one pixel wide, keeping their topology.
+    Only the bounding box of the ink is processed.
+    """
+    x, y, w, h = cv2.boundingRect(ink)
+    if not w:
+        return ink
+    # One pixel of margin, so neighbourhood codes at the box edge see the paper around it
+    x0, y0 = max(x - 1, 0), max(y - 1, 0)
+    region = ink[y0:y + h + 1, x0:x + w + 1]
+    kernel = np.array(_NEIGHBOUR_KERNEL, np.float32)
+    codes = _buffer('thin_codes', region.shape, np.uint8)
+    deleted = _buffer('thin_deleted', region.shape, np.uint8)
+    tables = _thinning_luts()
+    changed = True
+    while changed:
+        changed = False
+        for table in tables:
+            cv2.filter2D(region, -1, kernel, dst=codes, borderType=cv2.BORDER_CONSTANT)
+            cv2.LUT(codes, table, dst=deleted)
+            cv2.bitwise_and(deleted, region, dst=deleted)
+            if cv2.countNonZero(deleted):
+                cv2.subtract(region, deleted, dst=region)
+                changed = True
+    return ink
+
+
+def skeleton(gray, params):
+    """Global threshold, then thinning to one-pixel centerlines."""
+    ink = cv2.compare(gray, params['threshold'], cv2.CMP_LE)
+    cv2.min(ink, 1, dst=ink)
+    thin(ink)
+    return cv2.compare(ink, 0, cv2.CMP_EQ)
+
+
+register_engine(Engine('Threshold', threshold, ('threshold',), cost=1.0,
+                       description="Global threshold on the gray level", halo=lambda params: 0))
+# tiling.py has its own tiled form of Edge Detection (global hysteresis over tiles)
+register_engine(Engine('Edge Detection', edge_detection, ('edge_sensitivity', 'threshold', 'line_thickness'),
+                       cost=10.0, description="Canny edges, thickened"))
+register_engine(Engine('Otsu Threshold', otsu_threshold, cost=2.5,
+                       description="Global threshold chosen from the histogram"))
+register_engine(Engine('Adaptive Threshold', adaptive_threshold, ('block_size', 'adaptive_offset'), cost=5.0,
+                       description="Threshold against the local mean; copes with uneven lighting",
+                       halo=lambda params: param(params, 'block_size') // 2))
+register_engine(Engine('XDoG', xdog, ('xdog_sigma', 'xdog_strength', 'threshold'), cost=7.0,
+                       description="Extended difference of Gaussians; even, stylised strokes",
+                       halo=_xdog_halo))
+register_engine(Engine('Multi-scale Canny', multiscale_canny,
+                       ('edge_sensitivity', 'canny_scales', 'threshold', 'line_thickness'), cost=30.0,
+                       description="Canny over several blur levels, combined"))
+# Thinning peels one pixel layer per pass: about 50-80x on thin line art, but
+# 450-900x on photos and scans whose dark areas become wide ink regions
+register_engine(Engine('Skeleton', skeleton, ('threshold',), cost=600.0,
+                       description="Threshold thinned to one-pixel centerlines; slow on large dark areas"))
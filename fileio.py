@@ -0,0 +1,289 @@
+"""
+Image file input and output beyond one-shot cv2.imread / cv2.imwrite.
+
+Reading:
+
+- decode_image / read_image decode at 1/2, 1/4 or 1/8 of the full size
+  with cv2.IMREAD_REDUCED_COLOR_*; JPEG decoding then skips most of its
+  work (it scales in the DCT), so previews of large photos come quickly.
+- open_image memory-maps .npy files, uncompressed 8-bit TIFFs and
+  headerless .raw files instead of reading them into a new array; pages
+  are only loaded when touched, so tiling.py reads just the tiles it
+  processes. Everything else is decoded with cv2.imread.
+
+Writing:
+
+- AsyncWriter encodes and writes files on a background thread from a
+  bounded queue, so the caller keeps computing while earlier results go
+  to disk, and blocks only when it is max_pending files ahead. Formats
+  that are written incrementally (svgwriter.write_svg) are queued as a
+  write(path) callable, so the document never exists in memory in full.
+
+    with AsyncWriter(png_compression=1) as writer:
+        for path, image in results:
+            writer.write_image(path, image)
+    # Leaving the block waits for the queue; failures are in writer.errors
+
+Every file is written under a temporary name next to its destination and
+renamed, so only complete files ever appear.
+"""
+import logging
+import os
+import queue
+import struct
+import threading
+import time
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+REDUCED_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+JPEG_MAGIC = b'\xff\xd8'
+DEFAULT_MAX_PENDING = 8
+
+
+def decode_image(data, reduce=1):
+    """Decodes encoded image bytes as BGR at 1/reduce of their size; None if undecodable."""
+    return cv2.imdecode(np.frombuffer(data, np.uint8), REDUCED_FLAGS[reduce])
+
+
+def read_image(path, reduce=1):
+    """Reads an image file as BGR at 1/reduce (1, 2, 4 or 8) of its size; None if unreadable."""
+    with open(path, 'rb') as f:
+        return decode_image(f.read(), reduce)
+
+
+def decode_preview(data, width, height):
+    """
+    Decodes a JPEG at the strongest reduction that still covers width x
+    height: the 1/8 decode comes first, as the cheapest, and a larger one
+    follows only if it is too small. Returns (image, reduce factor), or
+    (None, 1) for other formats, which decode in full before reducing and
+    gain nothing from a preview.
+    """
+    if not data.startswith(JPEG_MAGIC):
+        return None, 1
+    image = decode_image(data, 8)
+    if image is None:
+        return None, 1
+    for reduce in (8, 4, 2):
+        # The reduced size rounds up, so this slightly overestimates the full size
+        full_height, full_width = image.shape[0] * 8, image.shape[1] * 8
+        if full_width // reduce >= width or full_height // reduce >= height:
+            return (image if reduce == 8 else decode_image(data, reduce)), reduce
+    return decode_image(data, 1), 1
+
+
+def open_image(path, raw_shape=None):
+    """
+    Returns the image at path as a BGR (or BGR-ordered view) array, memory-
+    mapped read-only where the format allows. raw_shape (height, width[,
+    channels]) is required for .raw files: interleaved 8-bit samples in BGR
+    order, or gray with one channel. Grayscale inputs come back as a
+    three-channel view without copying. Raises ValueError if the file
+    cannot be read.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    image = None
+    if extension == '.npy':
+        image = np.load(path, mmap_mode='r')
+        if image.dtype != np.uint8 or image.ndim not in (2, 3):
+            raise ValueError(f"{path}: expected a 2-D or 3-D uint8 array, got {image.dtype} {image.shape}")
+    elif extension == '.raw':
+        if raw_shape is None:
+            raise ValueError(f"{path}: the shape of raw files must be given")
+        image = np.memmap(path, np.uint8, 'r', shape=tuple(raw_shape))
+    elif extension in ('.tif', '.tiff'):
+        layout = tiff_layout(path)
+        if layout is not None:
+            offset, shape = layout
+            image = np.memmap(path, np.uint8, 'r', offset=offset, shape=shape)
+            if image.ndim == 3:
+                image = image[..., ::-1]  # TIFF stores RGB
+    if image is None:
+        image = cv2.imread(path)
+        if image is None:
+            raise ValueError("Could not read image file.")
+    if image.ndim == 3 and image.shape[2] == 1:
+        image = image[..., 0]
+    if image.ndim == 2:
+        image = np.broadcast_to(image[..., None], image.shape + (3,))
+    return image
+
+
+_TIFF_TYPES = {3: 'H', 4: 'I'}  # SHORT, LONG
+
+
+def tiff_layout(path):
+    """
+    (data offset, shape) of a TIFF whose first image can be memory-mapped:
+    uncompressed, 8 bits per sample, gray or RGB, interleaved, with its
+    strips stored back to back. None for anything else.
+    """
+    with open(path, 'rb') as f:
+        header = f.read(8)
+        order = {b'II': '<', b'MM': '>'}.get(header[:2])
+        if order is None or len(header) < 8 or struct.unpack(order + 'H', header[2:4])[0] != 42:
+            return None
+        f.seek(struct.unpack(order + 'I', header[4:8])[0])
+        count, = struct.unpack(order + 'H', f.read(2))
+        entries = [struct.unpack(order + 'HHI4s', f.read(12)) for _ in range(count)]
+
+        tags = {}
+        for tag, kind, n, value in entries:
+            if kind not in _TIFF_TYPES:
+                continue
+            fmt = order + _TIFF_TYPES[kind] * n
+            size = struct.calcsize(fmt)
+            if size <= 4:
+                data = value[:size]
+            else:
+                f.seek(struct.unpack(order + 'I', value)[0])
+                data = f.read(size)
+            tags[tag] = struct.unpack(fmt, data)
+
+    def tag(number, default=None):
+        return tags.get(number, default)
+
+    width, height = tag(256, (0,))[0], tag(257, (0,))[0]
+    samples = tag(277, (1,))[0]
+    offsets, counts = tag(273), tag(279)
+    if (not width or not height or offsets is None or counts is None or tag(259, (1,))[0] != 1
+            or set(tag(258, (1,))) != {8} or tag(284, (1,))[0] != 1 or tag(338) is not None
+            or (samples, tag(262, (None,))[0]) not in ((1, 1), (3, 2))):
+        return None
+    if any(offsets[i] + counts[i] != offsets[i + 1] for i in range(len(offsets) - 1)):
+        return None
+    shape = (height, width) if samples == 1 else (height, width, samples)
+    if sum(counts) < width * height * samples:
+        return None
+    return offsets[0], shape
+
+
+def encode_image(image, extension, png_compression=None):
+    """Encodes an image for a file extension such as '.png'; png_compression is 0-9."""
+    params = []
+    if png_compression is not None and extension.lower() == '.png':
+        params = [cv2.IMWRITE_PNG_COMPRESSION, png_compression]
+    ok, encoded = cv2.imencode(extension, image, params)
+    if not ok:
+        raise ValueError(f"Could not encode {extension}")
+    return encoded.tobytes()
+
+
+def write_atomic(path, data):
+    """Writes bytes to path via a temporary file in the same directory."""
+    base, ext = os.path.splitext(path)
+    partial_path = f"{base}.part{os.getpid()}-{threading.get_ident()}{ext}"
+    try:
+        with open(partial_path, 'wb') as f:
+            f.write(data)
+        os.replace(partial_path, path)
+    finally:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+
+
+class AsyncWriter:
+    """
+    Writes files on background threads from a queue of at most max_pending
+    entries. submit() takes the bytes, an encode() callable that makes
+    them, or a write(path) callable that writes the file itself (atomically,
+    e.g. by streaming to a partial path); the callables run on the writer
+    thread as well. on_done(path, error) is called on the writer thread
+    after each file, with error None on success or a message; failures are
+    also collected in errors.
+    """
+
+    def __init__(self, max_pending=DEFAULT_MAX_PENDING, png_compression=None, threads=1):
+        self.png_compression = png_compression
+        self.errors = []        # (path, message)
+        self.written = 0
+        self.bytes = 0
+        self.seconds = 0.0      # Spent encoding and writing, summed over the threads
+        self._queue = queue.Queue(max_pending)
+        self._lock = threading.Lock()
+        self._closed = False
+        self._threads = [threading.Thread(target=self._run, name=f'writer-{i}', daemon=True)
+                         for i in range(threads)]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, path, data=None, encode=None, write=None, on_done=None):
+        """Queues one file; blocks while the queue is full."""
+        if self._closed:
+            raise ValueError("AsyncWriter is closed")
+        self._queue.put((path, data, encode, write, on_done))
+
+    def write_image(self, path, image, on_done=None):
+        """Queues an image, encoded on the writer thread for the path's extension."""
+        extension = os.path.splitext(path)[1]
+        self.submit(path, encode=lambda: encode_image(image, extension, self.png_compression), on_done=on_done)
+
+    def pending(self):
+        return self._queue.unfinished_tasks
+
+    def flush(self):
+        """Waits until everything queued so far is written."""
+        self._queue.join()
+
+    def close(self):
+        """Writes what is queued and stops the threads."""
+        if self._closed:
+            return
+        self._closed = True
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                return
+            path, data, encode, write, on_done = item
+            start = time.perf_counter()
+            error = None
+            size = 0
+            try:
+                os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+                if write is not None:
+                    write(path)
+                    size = os.path.getsize(path)
+                else:
+                    if encode is not None:
+                        data = encode()
+                    write_atomic(path, data)
+                    size = len(data)
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+                if on_done is None:
+                    logger.error("Writing %s failed: %s", path, error)
+            with self._lock:
+                self.seconds += time.perf_counter() - start
+                if error is None:
+                    self.written += 1
+                    self.bytes += size
+                else:
+                    self.errors.append((path, error))
+            if on_done is not None:
+                try:
+                    on_done(path, error)
+                except Exception:
+                    logger.exception("on_done for %s failed", path)
+            self._queue.task_done()
@@ -1,7 +1,10 @@
+import collections
+import functools
+import logging
 import os
-import cv2
-import numpy as np
-from PyQt5.QtCore import Qt, QRectF, QSize, QTimer
+import threading
+import weakref
+from PyQt5.QtCore import Qt, QRectF, QSize, QTimer, QObject, QThread, pyqtSignal, pyqtSlot
 from PyQt5.QtGui import QImage, QPixmap, QTransform, QColor, QPainter
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QLabel, QPushButton, QSlider, QFileDialog,
@@ -9,18 +12,235 @@ from PyQt5.QtWidgets import (
     QGraphicsView, QGraphicsScene, QGraphicsPixmapItem, QGraphicsColorizeEffect,
     QMessageBox, QGraphicsItem
 )
-from processing import apply_enhancements, process_with_ai_model
-import subprocess
-import sys  # Import the sys module
+import instrumentation
+import engines  # Light: the engines load OpenCV only when they run
+from instrumentation import stage
+from lazyimport import lazy_import
+
+# Imported on first use, so the window can be shown before OpenCV, NumPy and
+# the processing modules have loaded
+cv2 = lazy_import('cv2')
+np = lazy_import('numpy')
+processing = lazy_import('processing')
+pipeline = lazy_import('pipeline')
+parallel = lazy_import('parallel')
+autotune = lazy_import('autotune')
+svgwriter = lazy_import('svgwriter')
+resultcache = lazy_import('resultcache')
+masks = lazy_import('masks')
+fileio = lazy_import('fileio')
+
+logger = logging.getLogger(__name__)
+
+# Vector settings for saved SVGs; the same as batch.DEFAULT_PARAMS, so saves
+# and batch runs with default settings share result cache entries
+VECTOR_SETTINGS = {'tracer': 'builtin', 'tolerance': 0.5, 'bezier': True, 'simplify': 'rdp', 'precision': 1}
+NO_MASK = 'No mask'
+
+
+def array_to_qimage(image):
+    """Wraps a grayscale or BGR NumPy image in a QImage (no copy; keep the array alive)."""
+    height, width = image.shape[:2]
+    if image.ndim == 2:  # Grayscale image
+        return QImage(image.data, width, height, image.strides[0], QImage.Format_Grayscale8)
+    return QImage(image.data, width, height, image.strides[0], QImage.Format_BGR888)
+
+
+def fit_pixmap(image, width, height):
+    """
+    Returns a QPixmap of image scaled to fit width x height device pixels,
+    keeping the aspect ratio. The downscale runs on the array (INTER_AREA),
+    so Qt only converts a display-sized buffer; the array is wrapped, not
+    copied, and QPixmap.fromImage makes the single upload copy.
+    """
+    image_height, image_width = image.shape[:2]
+    factor = min(width / image_width, height / image_height)
+    if factor < 1:
+        size = (max(1, round(image_width * factor)), max(1, round(image_height * factor)))
+        image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+    return QPixmap.fromImage(array_to_qimage(np.ascontiguousarray(image)))
+
+
+class PixmapCache:
+    """
+    Small LRU of display pixmaps keyed on (source array, target size).
+
+    Arrays are referenced weakly, so the cache never keeps a full-resolution
+    image alive, and an entry whose array has been freed (and whose id may
+    have been reused) is treated as a miss.
+    """
+
+    def __init__(self, max_entries=8):
+        self.max_entries = max_entries
+        self._entries = collections.OrderedDict()
+
+    def get(self, image, width, height):
+        key = (id(image), width, height)
+        entry = self._entries.get(key)
+        if entry is not None and entry[0]() is image:
+            self._entries.move_to_end(key)
+            return entry[1]
+        pixmap = fit_pixmap(image, width, height)
+        self._entries[key] = (weakref.ref(image), pixmap)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return pixmap
+
+    def clear(self):
+        self._entries.clear()
+
+
+class PreviewWorker(QObject):
+    """
+    Runs the processing pipeline off the GUI thread.
+
+    Requests are coalesced: only the most recent parameter set is processed
+    and superseded ones are dropped without being rendered. A request may
+    ask for a proxy no larger than needed for a given view size, rendered
+    from an image pyramid with scaled parameters. Results are posted back
+    through the rendered signal as (generation, params, scale, binary
+    image, stage records); scale is 1.0 for full-resolution renders. The
+    binary image is passed as is, without a QImage copy; cached arrays are
+    read-only, so the GUI can wrap it safely.
+
+    tune() runs the auto-tuning sweep on the same thread and posts the
+    result through tuned as (image, best params or None, error or None).
+    """
+    rendered = pyqtSignal(int, object, float, object, object)
+    failed = pyqtSignal(int, str)
+    tuned = pyqtSignal(object, object, object)
+    _wake = pyqtSignal()
+    _tune = pyqtSignal(object, object)
+
+    def __init__(self):
+        super().__init__()
+        # Only ever touched from the worker thread; created by the first render
+        self.pipeline = None
+        self.proxy_pipeline = None
+        self.pyramid = None
+        self._lock = threading.Lock()
+        self._pending = None
+        self._generation = 0
+        self._wake.connect(self._process)
+        self._tune.connect(self._auto_tune)
+
+    def request(self, image, params, view_size=None):
+        """
+        Schedules a render of image with params; returns its generation number.
+        With view_size (width, height) a downscaled proxy is rendered instead.
+        """
+        with self._lock:
+            self._generation += 1
+            self._pending = (self._generation, image, dict(params), view_size)
+            generation = self._generation
+        self._wake.emit()
+        return generation
+
+    @pyqtSlot()
+    def _process(self):
+        with self._lock:
+            job, self._pending = self._pending, None
+        if job is None:
+            return  # A newer request was already handled by an earlier wake-up
+
+        generation, image, params, view_size = job
+        try:
+            with instrumentation.capture() as records:
+                if self.pipeline is None:
+                    threads = parallel.get_threads()
+                    self.pipeline = pipeline.StagedPipeline(threads=threads)
+                    self.proxy_pipeline = pipeline.StagedPipeline(pipeline.PROXY_CACHE_BYTES, threads)
+                if image is not self.pipeline.image:
+                    self.pipeline.set_image(image)
+                    self.pyramid = pipeline.ImagePyramid(image)
+
+                scale = 1.0
+                staged = self.pipeline
+                if view_size is not None:
+                    level, scale = self.pyramid.level_for(*view_size)
+                    if level is not image:
+                        staged = self.proxy_pipeline
+                        if level is not staged.image:
+                            staged.set_image(level)
+                binary_image = staged.run(processing.scale_params(params, scale))
+        except Exception as e:
+            self.failed.emit(generation, str(e))
+            return
+        self.rendered.emit(generation, params, scale, binary_image, records)
+
+    def tune(self, image, params):
+        """Schedules an auto-tuning sweep of image, starting from params."""
+        self._tune.emit(image, dict(params))
+
+    @pyqtSlot(object, object)
+    def _auto_tune(self, image, params):
+        try:
+            with stage('qt.auto_tune'):
+                best = autotune.auto_tune(processing.apply_enhancements(image, params), params)
+        except Exception as e:
+            self.tuned.emit(image, None, str(e))
+            return
+        self.tuned.emit(image, best, None)
+
+
+def _stop_thread(thread):
+    """Ends a QThread's event loop and waits for it; Qt aborts if a running QThread is destroyed."""
+    thread.quit()
+    thread.wait()
+
 
 class LineDrawingApp(QMainWindow):
+    # Posted from background threads: (load number, image, digest or error) and (file name, error)
+    image_decoded = pyqtSignal(int, object, object)
+    file_saved = pyqtSignal(str, object)
+
     def __init__(self):
         super().__init__()
         self.image = None             # Original image (cv2 BGR)
+        self.image_digest = None      # Hash of the file self.image was decoded from
         self.processed_image = None   # Processed image (cv2; may be grayscale or color)
         self.pixmap_item = None       # QGraphicsPixmapItem for the processed image
         self.is_displaying = False   # Flag to prevent re-entrant calls to display_image
-        self.is_updating_all = False # Flag to prevent re-entrant calls to update_all
+        self.processed_params = None  # Parameters processed_image was rendered with
+        self.shown_generation = 0     # Newest render currently on screen
+        self.shown_array = None       # Array behind the pixmap in the view, and the size it was fitted to
+        self.shown_size = None
+        # Display renditions, so resizes and repeated frames skip the rescale
+        self.loaded_pixmaps = PixmapCache(max_entries=4)
+        self.view_pixmaps = PixmapCache(max_entries=8)
+        self._result_cache = None     # See result_cache
+        self._mask_library = None     # See mask_library
+        self._writer = None           # See writer
+        self.pending_saves = {}       # File name -> result cache key to store it under once written
+        self.load_count = 0           # Number of the newest load_image; older decodes are dropped
+
+        # Stage timings feed the status bar; keep only recent records
+        if not instrumentation.is_enabled():
+            instrumentation.enable(max_records=1000)
+
+        # Preview rendering runs on a worker thread with its own cached pipeline
+        self.render_thread = QThread(self)
+        self.renderer = PreviewWorker()
+        self.renderer.moveToThread(self.render_thread)
+        self.renderer.rendered.connect(self.on_rendered)
+        self.renderer.failed.connect(self.on_render_failed)
+        self.renderer.tuned.connect(self.on_tuned)
+        self.render_thread.start()
+        # Not every exit closes the window (app.quit(), an exception in main), so the
+        # thread is also stopped on quit and, failing both, when the window is deleted
+        QApplication.instance().aboutToQuit.connect(self.shutdown)
+        self.destroyed.connect(functools.partial(_stop_thread, self.render_thread))
+
+        self.image_decoded.connect(self.on_image_decoded)
+        self.file_saved.connect(self.on_file_saved)
+
+        # Previews render a proxy sized to the view; full resolution follows once idle
+        self.refine_timer = QTimer(self)
+        self.refine_timer.setSingleShot(True)
+        self.refine_timer.setInterval(300)
+        self.refine_timer.timeout.connect(self.render_full_resolution)
+
         self.initUI()
 
     def initUI(self):
@@ -43,6 +263,8 @@ class LineDrawingApp(QMainWindow):
 
         self.load_button = QPushButton('Load Image', self)
         self.save_button = QPushButton('Save Image', self)
+        self.auto_button = QPushButton('Auto', self)
+        self.auto_button.setToolTip('Pick the processing method and its settings for this image')
 
         # Enhancement sliders
         self.brightness_label = QLabel('Brightness', self)
@@ -83,24 +305,46 @@ class LineDrawingApp(QMainWindow):
         # Connect buttons and sliders
         self.load_button.clicked.connect(self.load_image)
         self.save_button.clicked.connect(lambda: self.save_image())
-        self.brightness_slider.valueChanged.connect(self.update_display_loaded_image)  # Connect to update_display_loaded_image
-        self.contrast_slider.valueChanged.connect(self.update_display_loaded_image)   # Connect to update_display_loaded_image
-        self.sharpness_slider.valueChanged.connect(self.update_display_loaded_image)  # Connect to update_display_loaded_image
-        self.blur_slider.valueChanged.connect(self.update_display_loaded_image)       # Connect to update_display_loaded_image
-        self.edge_sensitivity_slider.valueChanged.connect(self.update_display_loaded_image) # Connect to update_display_loaded_image
-        self.threshold_slider.valueChanged.connect(self.update_display_loaded_image)    # Connect to update_display_loaded_image
-        self.line_thickness_slider.valueChanged.connect(self.update_display_loaded_image) # Connect to update_display_loaded_image
-
-        # Combo box for processing method
+        self.auto_button.clicked.connect(self.auto_tune_parameters)
+        for slider in (self.brightness_slider, self.contrast_slider, self.sharpness_slider, self.blur_slider,
+                       self.edge_sensitivity_slider, self.threshold_slider, self.line_thickness_slider):
+            slider.valueChanged.connect(self.update_all)  # Rendered in the background
+
+        # Sliders for the settings of the other extraction engines, shown for the selected one
+        self.engine_sliders = {}
+        for key, spec in engines.PARAMETERS.items():
+            if hasattr(self, key + '_slider'):
+                continue
+            label = QLabel(spec['label'], self)
+            slider = QSlider(Qt.Horizontal)
+            slider.setRange(0, round((spec['max'] - spec['min']) / spec.get('step', 1)))
+            self.engine_sliders[key] = (label, slider)
+            self.set_engine_slider(key, spec['default'])
+            slider.valueChanged.connect(self.update_all)
+
+        # Combo box for processing method, one entry per extraction engine
         self.processing_method_label = QLabel('Processing Method', self)
         self.processing_method_combo = QComboBox(self)
-        self.processing_method_combo.addItem('Threshold')
-        self.processing_method_combo.addItem('Edge Detection')
-        self.processing_method_combo.currentIndexChanged.connect(self.update_all)  # Connect to update_all
+        for index, engine in enumerate(engines.ENGINES.values()):
+            self.processing_method_combo.addItem(engine.name)
+            self.processing_method_combo.setItemData(
+                index, f"{engine.description} (about {engine.cost:g}x the time of Threshold)", Qt.ToolTipRole)
+        self.processing_method_combo.currentIndexChanged.connect(self.on_method_changed)
+
+        # SVG stencils; the selected one is applied to the preview and to saved images
+        self.mask_label = QLabel('Mask', self)
+        self.mask_combo = QComboBox(self)
+        self.mask_combo.addItem(NO_MASK)
+        self.mask_combo.currentIndexChanged.connect(self.on_mask_changed)
+        self.masks_button = QPushButton('Load Masks', self)
+        self.masks_button.setToolTip('Add SVG stencil templates to the mask list')
+        self.masks_button.clicked.connect(self.load_masks)
 
         # Set size policies to Fixed
         self.processing_method_label.setSizePolicy(QSizePolicy.Fixed, QSizePolicy.Fixed)
         self.processing_method_combo.setSizePolicy(QSizePolicy.Fixed, QSizePolicy.Fixed)
+        self.mask_label.setSizePolicy(QSizePolicy.Fixed, QSizePolicy.Fixed)
+        self.mask_combo.setSizePolicy(QSizePolicy.Fixed, QSizePolicy.Fixed)
 
         left_layout.addWidget(self.loaded_image_label)
         left_layout.addWidget(self.load_button)
@@ -109,6 +353,9 @@ class LineDrawingApp(QMainWindow):
         left_layout.addWidget(self.save_button)
         self.save_button.setSizePolicy(QSizePolicy.Fixed, QSizePolicy.Fixed)
         self.save_button.setFixedSize(150, 30)
+        left_layout.addWidget(self.auto_button)
+        self.auto_button.setSizePolicy(QSizePolicy.Fixed, QSizePolicy.Fixed)
+        self.auto_button.setFixedSize(150, 30)
 
         slider_layout.addWidget(self.brightness_label, 0, 0)
         slider_layout.addWidget(self.brightness_slider, 0, 1)
@@ -124,12 +371,21 @@ class LineDrawingApp(QMainWindow):
         slider_layout.addWidget(self.threshold_slider, 5, 1)
         slider_layout.addWidget(self.line_thickness_label, 6, 0)
         slider_layout.addWidget(self.line_thickness_slider, 6, 1)
+        for row, (label, slider) in enumerate(self.engine_sliders.values(), 7):
+            slider_layout.addWidget(label, row, 0)
+            slider_layout.addWidget(slider, row, 1)
+        self.show_engine_sliders()
 
         left_layout.addLayout(slider_layout)
 
         # Add additional controls to left layout
         left_layout.addWidget(self.processing_method_label)
         left_layout.addWidget(self.processing_method_combo)
+        left_layout.addWidget(self.mask_label)
+        left_layout.addWidget(self.mask_combo)
+        left_layout.addWidget(self.masks_button)
+        self.masks_button.setSizePolicy(QSizePolicy.Fixed, QSizePolicy.Fixed)
+        self.masks_button.setFixedSize(150, 30)
 
         main_layout.addLayout(left_layout)
 
@@ -154,174 +410,310 @@ class LineDrawingApp(QMainWindow):
         Displays an error message if the image cannot be loaded.
         """
         options = QFileDialog.Options()
-        file_name, _ = QFileDialog.getOpenFileName(self, "Load Image", "", "Image Files (*.png *.jpg *.jpeg *.bmp);;All Files (*)", options=options)
+        file_name, _ = QFileDialog.getOpenFileName(self, "Load Image", "", "Image Files (*.png *.jpg *.jpeg *.bmp *.tif *.tiff);;All Files (*)", options=options)
         if file_name:
             try:
-                self.image = cv2.imread(file_name)
-                if self.image is None:
-                    raise ValueError("Could not read image file.")
-                self.display_image(self.image)
-                self.update_all()  # Apply initial enhancements and processing
+                with open(file_name, 'rb') as f:
+                    data = f.read()
+                # A JPEG is shown at once from a reduced decode; the full one follows in the background
+                ratio = self.loaded_image_label.devicePixelRatioF()
+                size = self.loaded_image_label.size() * ratio
+                preview, _ = fileio.decode_preview(data, size.width(), size.height())
             except Exception as e:
                 QMessageBox.critical(self, "Error", f"Error loading image: {e}")
+                return
+            self.load_count += 1
+            if preview is not None:
+                self.display_image(preview)
+            threading.Thread(target=self._decode_image, args=(self.load_count, data), daemon=True).start()
+
+    def _decode_image(self, load_number, data):
+        """Decodes a loaded file in full; runs on a background thread."""
+        try:
+            # Decode from the bytes that are hashed, so the cache key matches the pixels
+            image = fileio.decode_image(data)
+            if image is None:
+                raise ValueError("Could not read image file.")
+            self.image_decoded.emit(load_number, image, resultcache.bytes_digest(data))
+        except Exception as e:
+            self.image_decoded.emit(load_number, None, str(e))
+
+    def on_image_decoded(self, load_number, image, digest):
+        """Takes over a fully decoded image and starts processing it."""
+        if load_number != self.load_count:
+            return  # Another file was opened meanwhile
+        if image is None:
+            QMessageBox.critical(self, "Error", f"Error loading image: {digest}")
+            return
+        self.image, self.image_digest = image, digest
+        self.display_image(self.image)
+        self.update_all()  # Apply initial enhancements and processing
 
     def display_image(self, image):
         """Displays the image in the loaded_image_label, scaling it to fit."""
         if self.is_displaying:
-            print("display_image: Re-entrant call prevented")
+            logger.debug("display_image: Re-entrant call prevented")
             return  # Prevent re-entrant calls
 
         self.is_displaying = True
-        print("display_image: Starting...")
+        logger.debug("display_image: Starting...")
         try:
-            height, width, channel = image.shape
-            bytesPerLine = 3 * width
-            qImg = QImage(image.data, width, height, bytesPerLine, QImage.Format_BGR888)
-            pixmap = QPixmap(qImg)
-
-            # Scale the pixmap to fit the label while maintaining aspect ratio
-            scaled_pixmap = pixmap.scaled(
-                self.loaded_image_label.size(),
-                Qt.AspectRatioMode.KeepAspectRatio,
-                Qt.TransformationMode.SmoothTransformation
-            )
-            self.loaded_image_label.setPixmap(scaled_pixmap)
-            print("display_image: Image displayed successfully")
+            # Fit in device pixels so the preview stays sharp on high-DPI screens
+            ratio = self.loaded_image_label.devicePixelRatioF()
+            size = self.loaded_image_label.size() * ratio
+            pixmap = self.loaded_pixmaps.get(image, size.width(), size.height())
+            if pixmap.devicePixelRatio() != ratio:
+                pixmap.setDevicePixelRatio(ratio)
+            shown = self.loaded_image_label.pixmap()
+            if shown is not None and shown.cacheKey() == pixmap.cacheKey():
+                return  # Already showing this rendition
+            with stage('qt.display_image'):
+                self.loaded_image_label.setPixmap(pixmap)
+            logger.debug("display_image: Image displayed successfully")
         except Exception as e:
-            print(f"display_image: Error displaying image: {e}")
+            logger.error("display_image: Error displaying image: %s", e)
         finally:
-            self.is_displaying = True
-            print("display_image: Finished")
-
-    def update_display_loaded_image(self):
-         if self.image is not None:
-            self.display_image(self.image)
-            
-            
-    def update_loaded_image(self):
-        if self.image is not None:
-            if not hasattr(self, '_display_timer'):
-                self._display_timer = QTimer()
-                self._display_timer.setSingleShot(True)
-                self._display_timer.timeout.connect(self._delayed_display)
-            self._display_timer.start(50)  # 50 ms delay
-
-    def _delayed_display(self):
-        self.display_image(self.image, self.loaded_image_label, scale=0.7)        
+            self.is_displaying = False
+            logger.debug("display_image: Finished")
 
     def resizeEvent(self, event):
         """Override resizeEvent to scale the image when the window is resized."""
-        print("resizeEvent: Triggered")
+        logger.debug("resizeEvent: Triggered")
+        super().resizeEvent(event)
         if self.image is not None:
             self.display_image(self.image)
-        print("resizeEvent: Finished")
+        if self.shown_array is not None:
+            self.update_display(self.shown_array)
 
 
-    def update_enhancements(self):
-        """Applies brightness, contrast, sharpness, and blur enhancements to the image."""
-        if self.image is None:
-            return
-
+    def current_params(self):
+        """Collects the enhancement and processing parameters from the controls."""
         params = {
             'brightness': self.brightness_slider.value(),
             'contrast': self.contrast_slider.value(),
             'sharpness': self.sharpness_slider.value(),
-            'blur': self.blur_slider.value()
-        }
-
-        self.processed_image = apply_enhancements(self.image, params)
-        self.update_display()
-
-    def update_processing(self):
-        """Applies thresholding or edge detection based on the selected method."""
-        if self.image is None:
-            return
-
-        params = {
+            'blur': self.blur_slider.value(),
             'method': self.processing_method_combo.currentText(),
             'edge_sensitivity': self.edge_sensitivity_slider.value(),
             'threshold': self.threshold_slider.value(),
             'line_thickness': self.line_thickness_slider.value()
         }
+        for key in self.engine_sliders:
+            params[key] = self.engine_slider_value(key)
+        return params
+
+    def engine_slider_value(self, key):
+        """Value of an engine setting; its slider counts steps from the minimum."""
+        spec = engines.PARAMETERS[key]
+        value = spec['min'] + self.engine_sliders[key][1].value() * spec.get('step', 1)
+        return round(value, 6) if isinstance(value, float) else value
+
+    def set_engine_slider(self, key, value):
+        spec = engines.PARAMETERS[key]
+        self.engine_sliders[key][1].setValue(round((value - spec['min']) / spec.get('step', 1)))
+
+    def show_engine_sliders(self):
+        """Shows the engine setting sliders the selected method reads, hides the rest."""
+        used = engines.get_engine(self.processing_method_combo.currentText()).params
+        for key, (label, slider) in self.engine_sliders.items():
+            label.setVisible(key in used)
+            slider.setVisible(key in used)
+
+    def on_method_changed(self):
+        self.show_engine_sliders()
+        self.update_all()
+
+    def set_params(self, params):
+        """Moves the controls to params and renders once, not once per control."""
+        controls = [
+            (self.brightness_slider, 'brightness'), (self.contrast_slider, 'contrast'),
+            (self.sharpness_slider, 'sharpness'), (self.blur_slider, 'blur'),
+            (self.edge_sensitivity_slider, 'edge_sensitivity'), (self.threshold_slider, 'threshold'),
+            (self.line_thickness_slider, 'line_thickness'),
+        ]
+        for slider, key in controls:
+            slider.blockSignals(True)
+            slider.setValue(params[key])
+            slider.blockSignals(False)
+        for key, (_, slider) in self.engine_sliders.items():
+            slider.blockSignals(True)
+            self.set_engine_slider(key, engines.param(params, key))
+            slider.blockSignals(False)
+        self.processing_method_combo.blockSignals(True)
+        self.processing_method_combo.setCurrentText(params['method'])
+        self.processing_method_combo.blockSignals(False)
+        self.show_engine_sliders()
+        self.update_all()
+
+    def auto_tune_parameters(self):
+        """Sweeps the processing settings for the loaded image and applies the best one."""
+        if self.image is None:
+            QMessageBox.warning(self, "Warning", "Load an image first.")
+            return
 
-        self.processed_image = process_with_ai_model(self.image, params)
-        self.update_display()
+        # The sweep runs on the render thread; on_tuned applies its result
+        self.auto_button.setEnabled(False)
+        self.statusBar().showMessage("Auto-tuning...")
+        self.renderer.tune(self.image, self.current_params())
+
+    def on_tuned(self, image, best, error):
+        """Applies an auto-tuning result, unless another image was loaded meanwhile."""
+        self.auto_button.setEnabled(True)
+        if error:
+            QMessageBox.critical(self, "Error", f"Error tuning parameters: {error}")
+            return
+        if image is not self.image:
+            logger.info("on_tuned: Image changed during auto-tuning; result dropped.")
+            return
+        logger.info("auto_tune_parameters: %s", {k: best[k] for k in
+                    ('method', 'threshold', 'edge_sensitivity', 'line_thickness')})
+        self.set_params(best)
 
     def update_all(self):
-        """Applies enhancements and processing, then displays the result."""
-        if self.is_updating_all:
-            print("update_all: Re-entrant call prevented")
-          #  return  # Prevent re-entrant calls
+        """Requests a background render with the current parameters."""
+        if self.image is None:
+            return
 
-        self.is_updating_all = True
-        print("update_all: Starting...")
+        # Stale requests are coalesced by the worker; the result arrives in on_rendered
+        viewport = self.view.viewport().size() * self.view.devicePixelRatioF()
+        self.renderer.request(self.image, self.current_params(), (viewport.width(), viewport.height()))
+        self.refine_timer.start()
+
+    def render_full_resolution(self):
+        """Replaces the proxy preview with a full-resolution render."""
+        if self.image is None or self.processed_params == self.current_params():
+            return  # Nothing loaded, or the proxy already was full resolution
+        self.renderer.request(self.image, self.current_params())
+
+    def on_rendered(self, generation, params, scale, binary_image, records):
+        """Shows a finished background render and its stage timings."""
+        if generation < self.shown_generation:
+            return  # A slow full-resolution render overtaken by a newer proxy
+        self.shown_generation = generation
+        if scale == 1.0:
+            self.processed_image = binary_image
+            self.processed_params = params
+        with instrumentation.capture() as display_records:
+            self.update_display(self.apply_mask(binary_image))
+        self.show_timings(binary_image, scale, records + display_records)
+
+    def show_timings(self, binary_image, scale, records):
+        """Puts the per-stage timings of the last render in the status bar."""
+        label = 'full' if scale == 1.0 else f'preview {scale:.0%}'
+        total = sum(r['wall_s'] for r in records if r.get('depth', 0) == 0)
+        self.statusBar().showMessage(
+            f"{binary_image.shape[1]}x{binary_image.shape[0]} {label} · {total * 1000:.1f} ms | "
+            + instrumentation.format_records(records, top_level_only=True))
+        logger.debug("render: %s", instrumentation.format_records(records))
+
+    def on_render_failed(self, generation, message):
+        logger.error("on_render_failed: Error processing image: %s", message)
+
+    def closeEvent(self, event):
+        """Stops the render thread and finishes pending saves before the window goes away."""
+        self.shutdown()
+        super().closeEvent(event)
+
+    def shutdown(self):
+        """Stops the render thread and finishes pending saves; safe to call more than once."""
+        _stop_thread(self.render_thread)
+        if self._writer is not None:
+            self._writer.close()
+
+
+    def update_display(self, image=None):
+        """
+        Displays the processed image in the right panel.
 
-        try:
-            if self.image is None:
+        The scene keeps image coordinates, but the pixmap item holds a
+        rendition sized to the viewport and is scaled up to cover the
+        image, so painting never touches a full-resolution pixmap.
+        """
+        if image is None:
+            image = self.processed_image
+            if image is None:
                 return
-
-            # Apply Enhancements
-            enhancement_params = {
-                'brightness': self.brightness_slider.value(),
-                'contrast': self.contrast_slider.value(),
-                'sharpness': self.sharpness_slider.value(),
-                'blur': self.blur_slider.value()
-            }
-            enhanced_image = apply_enhancements(self.image, enhancement_params)
-
-            # Apply Processing
-            processing_params = {
-                'method': self.processing_method_combo.currentText(),
-                'edge_sensitivity': self.edge_sensitivity_slider.value(),
-                'threshold': self.threshold_slider.value(),
-                'line_thickness': self.line_thickness_slider.value()
-            }
-            self.processed_image = process_with_ai_model(enhanced_image, processing_params)  # Process enhanced image
-
-            self.update_display()
-
-        finally:
-            self.is_updating_all = False
-            print("update_all: Finished")
-
-
-    def update_display(self):
-        """Displays the processed image in the right panel."""
-        if self.processed_image is None:
+        height, width = image.shape[:2]
+        viewport = self.view.viewport().size() * self.view.devicePixelRatioF()
+        size = (viewport.width(), viewport.height())
+        if image is self.shown_array and size == self.shown_size:
+            return  # Nothing changed since the last redraw
+
+        with stage('qt.update_display'):
+            pixmap = self.view_pixmaps.get(image, *size)
+            if self.pixmap_item is None:
+                self.pixmap_item = QGraphicsPixmapItem(pixmap)
+                self.pixmap_item.setTransformationMode(Qt.SmoothTransformation)
+                self.scene.addItem(self.pixmap_item)
+            else:
+                self.pixmap_item.setPixmap(pixmap)
+            self.pixmap_item.setScale(width / pixmap.width())
+
+            self.scene.setSceneRect(QRectF(0, 0, width, height))
+            self.view.fitInView(QRectF(0, 0, width, height), Qt.KeepAspectRatio)
+        self.shown_array, self.shown_size = image, size
+
+    @property
+    def mask_library(self):
+        if self._mask_library is None:
+            self._mask_library = masks.MaskLibrary()
+        return self._mask_library
+
+    def load_masks(self):
+        """Adds SVG stencil templates to the mask list and selects the last one."""
+        options = QFileDialog.Options()
+        file_names, _ = QFileDialog.getOpenFileNames(self, "Load Masks", "", "SVG Files (*.svg);;All Files (*)",
+                                                     options=options)
+        for file_name in file_names:
+            try:
+                name = self.mask_library.add(file_name)
+            except Exception as e:
+                QMessageBox.critical(self, "Error", f"Error loading mask {file_name}: {e}")
+                logger.error("load_masks: Error loading %s - %s", file_name, e)
+                continue
+            self.mask_combo.addItem(name)
+            self.mask_combo.setCurrentIndex(self.mask_combo.count() - 1)
+
+    def current_mask(self):
+        """Name of the selected mask template, or None."""
+        if self.mask_combo.currentIndex() <= 0:
+            return None
+        return self.mask_combo.currentText()
+
+    def apply_mask(self, binary_image):
+        """binary_image with the selected mask applied (paper outside it), or unchanged."""
+        name = self.current_mask()
+        if name is None:
+            return binary_image
+        with stage('qt.mask'):
+            return self.mask_library.apply(binary_image, name, background=masks.PAPER)
+
+    def on_mask_changed(self):
+        """Re-masks the full-resolution result on screen, or requests a new render."""
+        if self.image is None:
             return
-
-        height, width = self.processed_image.shape[:2]
-        if self.processed_image.ndim == 2:  # Grayscale image
-            bytesPerLine = width
-            qImg = QImage(self.processed_image.data, width, height, bytesPerLine, QImage.Format_Grayscale8)
-        else:  # Color image
-            bytesPerLine = 3 * width
-            qImg = QImage(self.processed_image.data, width, height, bytesPerLine, QImage.Format_BGR888)
-
-        pixmap = QPixmap(qImg)
-        if self.pixmap_item is None:
-            self.pixmap_item = QGraphicsPixmapItem(pixmap)
-            self.scene.addItem(self.pixmap_item)
+        if self.processed_image is not None and self.processed_params == self.current_params():
+            self.update_display(self.apply_mask(self.processed_image))
         else:
-            self.pixmap_item.setPixmap(pixmap)
-
-        self.scene.setSceneRect(QRectF(0, 0, width, height))
-        self.view.fitInView(QRectF(0, 0, width, height), Qt.KeepAspectRatio)
+            self.update_all()
 
     def save_image(self):
         """Saves the processed image to a file with format options and automatic extension."""
-        print("save_image: Save button clicked!")
+        logger.debug("save_image: Save button clicked!")
 
-        if self.processed_image is None:
-            print("save_image: No processed image to save.")
+        if self.image is None:
+            logger.info("save_image: No processed image to save.")
             return
 
+        params = self.current_params()
+        render = self.output_renderer(params)
+
         options = QFileDialog.Options()
         options |= QFileDialog.DontUseNativeDialog
-        file_name, selected_filter = QFileDialog.getSaveFileName(self, "Save Image", "", "PNG Files (*.png);;JPG Files (*.jpg);;BMP Files (*.bmp);;SVG Files (*.svg)", options=options)
+        file_name, selected_filter = QFileDialog.getSaveFileName(self, "Save Image", "", "PNG Files (*.png);;JPG Files (*.jpg);;BMP Files (*.bmp);;SVG Files (*.svg);;SVGZ Files (*.svgz)", options=options)
 
         if file_name:
-            print(f"save_image: Saving to {file_name}")
+            logger.info("save_image: Saving to %s", file_name)
             try:
                 if selected_filter == "PNG Files (*.png)" and not file_name.lower().endswith(".png"):
                     file_name += ".png"
@@ -330,61 +722,97 @@ class LineDrawingApp(QMainWindow):
                 elif selected_filter == "BMP Files (*.bmp)" and not file_name.lower().endswith(".bmp"):
                     file_name += ".bmp"
                 elif selected_filter == "SVG Files (*.svg)" and not file_name.lower().endswith(".svg"):
-                    self.convert_to_vector(file_name, self.processed_image, "svg")
+                    file_name += ".svg"
+                elif selected_filter == "SVGZ Files (*.svgz)" and not file_name.lower().endswith(".svgz"):
+                    file_name += ".svgz"
+
+                extension = os.path.splitext(file_name)[1].lower()
+                if extension in (".svg", ".svgz"):
+                    output_format = extension[1:]
+                    output_params = dict(params, **VECTOR_SETTINGS)
+                    if self.current_mask() is not None:
+                        # Same key layout as a batch.py --mask run
+                        output_params.update(mask=self.mask_library.identity(self.current_mask()), mask_crop=False)
+                    output_key = self.cache_key(output_params, output_format)
+                    if self.result_cache.fetch(output_key, extension, file_name):
+                        logger.info("save_image: %s taken from the cache", output_format.upper())
+                        return
+                    job = {'write': lambda path: self.write_vector(path, render(), output_format)}
                 else:
-                    cv2.imwrite(file_name, self.processed_image)
-                print("save_image: Image saved successfully.")
+                    output_key = None
+                    job = {'encode': lambda: fileio.encode_image(render(), extension)}
+                # Rendering, encoding and writing happen on the writer thread; on_file_saved reports back
+                self.pending_saves[file_name] = output_key
+                self.writer.submit(file_name, on_done=self.file_saved.emit, **job)
+                self.statusBar().showMessage(f"Saving {os.path.basename(file_name)}...")
             except Exception as e:
                 QMessageBox.critical(self, "Error", f"Error saving image: {e}")
-                print(f"save_image: Error - {e}")
-
-    def convert_to_vector(self, file_name, image, output_format="svg"):
-        """Converts the image to SVG using Potrace."""
-        # Save the image to a temporary file
-        temp_image_path = "temp.bmp"
-        cv2.imwrite(temp_image_path, image)
-
-        # Determine the path to potrace.exe
-        if getattr(sys, 'frozen', False):
-            # Running as compiled executable
-            base_path = sys._MEIPASS
-        else:
-            # Running as a script
-            base_path = os.path.dirname(os.path.abspath(__file__))
-
-        # First, try the same directory as the script
-        potrace_path = os.path.join(base_path, "potrace.exe")
-
-        # If not found, try the /potrace subfolder
-        if not os.path.exists(potrace_path):
-            potrace_path = os.path.join(base_path, "potrace", "potrace.exe")
+                logger.error("save_image: Error - %s", e)
 
-        # Construct the Potrace command
-        command = [potrace_path, "-s", temp_image_path, "-o", file_name]
-
-
-        try:
-            # Execute Potrace
-            result = subprocess.run(command, capture_output=True, text=True, check=True, encoding='utf-8', timeout=60)
-
-            # Print the standard output and standard error for debugging
-            print("Potrace Output:", result.stdout)
-            print("Potrace Error:", result.stderr)
-
-            # Remove the temporary image file
-            os.remove(temp_image_path)
-
-            print(f"{output_format.upper()} saved to {file_name}")
-
-        except subprocess.CalledProcessError as e:
-            QMessageBox.critical(self, "Error", f"Potrace error: {e.stderr}")
-            print(f"Potrace error: {e.stderr}")
-        except FileNotFoundError:
-            QMessageBox.critical(self, "Error", "Potrace not found. Please ensure it is bundled with the application.")
-            print("Potrace not found. Please ensure it is bundled with the application.")
-        except subprocess.TimeoutExpired:
-             QMessageBox.critical(self, "Error", "Potrace process timed out.")
-             print("Potrace process timed out.")
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Error converting to {output_format.upper()}: {e}")
-            print(f"Error converting to {output_format.upper()}: {e}")
\ No newline at end of file
+    def output_renderer(self, params):
+        """
+        Returns a callable that makes the image to save for params, masked,
+        without touching the window, so it can run on the writer thread. The
+        background render may still be catching up with the sliders; then
+        the result comes from the cache or is rendered by that callable.
+        """
+        image = self.image
+        processed_image = self.processed_image if self.processed_params == params else None
+        binary_key = self.cache_key(params, 'binary')
+        cache = self.result_cache
+        name = self.current_mask()
+        # The mask library is not thread-safe, so its raster is fetched here
+        raster = self.mask_library.raster(name, image.shape[1], image.shape[0]) if name is not None else None
+
+        def render():
+            binary_image = processed_image
+            if binary_image is None:
+                binary_image = cache.get_array(binary_key)
+            if binary_image is None:
+                binary_image = processing.process_with_ai_model(processing.apply_enhancements(image, params), params)
+                cache.put_array(binary_key, binary_image)
+            if raster is None:
+                return binary_image
+            return masks.apply_raster(binary_image, raster, background=masks.PAPER)
+        return render
+
+    @property
+    def writer(self):
+        """Saves go through a background writer so the window stays responsive."""
+        if self._writer is None:
+            self._writer = fileio.AsyncWriter()
+        return self._writer
+
+    def on_file_saved(self, file_name, error):
+        """Finishes a save once the writer thread is done with it."""
+        output_key = self.pending_saves.pop(file_name, None)
+        if error:
+            QMessageBox.critical(self, "Error", f"Error saving image: {error}")
+            logger.error("save_image: Error - %s", error)
+            return
+        if output_key is not None:
+            self.result_cache.store(output_key, os.path.splitext(file_name)[1].lower(), file_name)
+        self.statusBar().showMessage(f"Saved {os.path.basename(file_name)}")
+        logger.info("save_image: Image saved successfully.")
+
+    @property
+    def result_cache(self):
+        """Saved results persist across sessions and are shared with batch.py --cache."""
+        if self._result_cache is None:
+            self._result_cache = resultcache.ResultCache()
+        return self._result_cache
+
+    def cache_key(self, params, kind):
+        """Result cache key for the loaded file; same layout as batch.convert_file uses."""
+        return self.result_cache.key(self.image_digest, dict(params, auto=False), kind)
+
+    def write_vector(self, file_name, image, output_format="svg"):
+        """
+        Converts the image to a compact SVG (gzipped for .svgz) with the
+        built-in tracer, streaming it to file_name. Runs on the writer thread.
+        """
+        height, width = image.shape[:2]
+        polygons, traced = svgwriter.trace_polygons(image, VECTOR_SETTINGS['tolerance'], VECTOR_SETTINGS['simplify'])
+        report = svgwriter.write_svg(file_name, polygons, width, height, VECTOR_SETTINGS['precision'],
+                                     VECTOR_SETTINGS['bezier'], compress=output_format == 'svgz', nodes_before=traced)
+        logger.info("%s saved: %s", output_format.upper(), svgwriter.format_report(report))
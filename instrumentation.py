@@ -0,0 +1,174 @@
+"""
+Lightweight per-stage instrumentation.
+
+Stages are marked with the stage() context manager or the timed()
+decorator. Nothing is measured until enable() installs a Recorder; while
+disabled a decorated call costs one global lookup.
+
+    recorder = instrumentation.enable(track_memory=True)
+    with instrumentation.capture() as records:
+        process_with_ai_model(image, params)
+    print(instrumentation.format_records(records))
+    recorder.to_json('profile.json')
+
+Each record holds the stage name, wall time, CPU time of the calling
+thread and, with track_memory, the bytes the stage left allocated
+(tracemalloc, which covers NumPy arrays) and its allocation peak.
+"""
+import collections
+import functools
+import json
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+_recorder = None
+_local = threading.local()
+
+
+class Recorder:
+    """Thread-safe collection of stage records; max_records keeps only the newest."""
+
+    def __init__(self, track_memory=False, max_records=None):
+        self.track_memory = track_memory
+        self.records = collections.deque(maxlen=max_records)
+        self._lock = threading.Lock()
+
+    def add(self, record):
+        with self._lock:
+            self.records.append(record)
+
+    def extend(self, records):
+        with self._lock:
+            self.records.extend(records)
+
+    def clear(self):
+        with self._lock:
+            self.records.clear()
+
+    def summary(self):
+        """Per-stage totals: {stage: {count, wall_s, cpu_s, alloc_bytes}}."""
+        with self._lock:
+            return summarize(self.records)
+
+    def to_json(self, path, **extra):
+        """Writes the summary and raw records, plus any extra keys, to a JSON file."""
+        with self._lock:
+            data = dict(extra, summary=summarize(self.records), records=list(self.records))
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2)
+
+
+def summarize(records):
+    summary = {}
+    for record in records:
+        entry = summary.setdefault(record['stage'], {'count': 0, 'wall_s': 0.0, 'cpu_s': 0.0, 'alloc_bytes': 0})
+        entry['count'] += 1
+        entry['wall_s'] += record['wall_s']
+        entry['cpu_s'] += record['cpu_s']
+        entry['alloc_bytes'] += record.get('alloc_bytes') or 0
+    return summary
+
+
+def enable(track_memory=False, max_records=None):
+    """Starts recording into a fresh Recorder and returns it."""
+    global _recorder
+    if track_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    _recorder = Recorder(track_memory, max_records)
+    return _recorder
+
+
+def disable():
+    """Stops recording; returns the Recorder that was active, if any."""
+    global _recorder
+    recorder, _recorder = _recorder, None
+    if recorder is not None and recorder.track_memory and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    return recorder
+
+
+def is_enabled():
+    return _recorder is not None
+
+
+@contextmanager
+def stage(name):
+    """Records the enclosed block as one stage."""
+    recorder = _recorder
+    if recorder is None:
+        yield
+        return
+
+    depth = getattr(_local, 'depth', 0)
+    _local.depth = depth + 1
+    memory = recorder.track_memory and tracemalloc.is_tracing()
+    if memory:
+        start_bytes = tracemalloc.get_traced_memory()[0]
+        if depth == 0:
+            tracemalloc.reset_peak()
+    start_wall = time.perf_counter()
+    start_cpu = time.thread_time()
+    try:
+        yield
+    finally:
+        record = {
+            'stage': name,
+            'wall_s': time.perf_counter() - start_wall,
+            'cpu_s': time.thread_time() - start_cpu,
+            'depth': depth,
+            'thread': threading.current_thread().name,
+        }
+        if memory:
+            current, peak = tracemalloc.get_traced_memory()
+            record['alloc_bytes'] = current - start_bytes
+            if depth == 0:
+                # The peak is global, so only the outermost stage can claim it
+                record['peak_bytes'] = peak - start_bytes
+        _local.depth = depth
+        recorder.add(record)
+        for captured in getattr(_local, 'captures', ()):
+            captured.append(record)
+
+
+def timed(name=None):
+    """Decorator form of stage(); the stage name defaults to the function name."""
+    def decorator(func):
+        stage_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _recorder is None:
+                return func(*args, **kwargs)
+            with stage(stage_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def capture():
+    """Collects the records made by the current thread inside the block into a list."""
+    captured = []
+    captures = getattr(_local, 'captures', None)
+    if captures is None:
+        captures = _local.captures = []
+    captures.append(captured)
+    try:
+        yield captured
+    finally:
+        captures.pop()  # Captures nest, so ours is always the last one
+
+
+def format_records(records, top_level_only=False):
+    """One-line summary such as 'enhance_colors 12.1 ms · to_grayscale 0.9 ms'."""
+    parts = []
+    for record in records:
+        if top_level_only and record.get('depth', 0):
+            continue
+        text = f"{record['stage']} {record['wall_s'] * 1000:.1f} ms"
+        if record.get('alloc_bytes'):
+            text += f" ({record['alloc_bytes'] / 2 ** 20:.1f} MiB)"
+        parts.append(text)
+    return ' · '.join(parts)
@@ -0,0 +1,33 @@
+"""
+Deferred module imports, to keep start-up light.
+
+    cv2 = lazy_import('cv2')     # Nothing is imported yet
+    cv2.imread(path)             # Imports cv2 now, then behaves like the module
+
+The first attribute access imports the real module through the normal
+import system (so it is thread-safe and registered in sys.modules) and
+copies its namespace into the stand-in, so later accesses cost the same as
+on the module itself.
+"""
+import importlib
+import sys
+import types
+
+
+class LazyModule(types.ModuleType):
+    """Stand-in for a module that is imported on first attribute access."""
+
+    def __getattr__(self, attr):
+        # Only called for names not yet in the stand-in's namespace
+        module = importlib.import_module(self.__name__)
+        self.__dict__.update(module.__dict__)
+        return getattr(module, attr)
+
+    def __repr__(self):
+        return f"<lazy module '{self.__name__}'>"
+
+
+def lazy_import(name):
+    """The module if it is already imported, otherwise a LazyModule for it."""
+    module = sys.modules.get(name)
+    return module if module is not None else LazyModule(name)
@@ -1,14 +1,13 @@
+import logging
 import os
 import sys
 from PyQt5.QtWidgets import QApplication, QSplashScreen
-from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtCore import Qt
 from PyQt5.QtGui import QPixmap
-from gui import LineDrawingApp  # Import your main application class
 
-if __name__ == '__main__':
-    app = QApplication(sys.argv)
 
-    # Splash Screen
+def show_splash():
+    """Shows the splash screen and paints it before anything else is loaded."""
     if getattr(sys, 'frozen', False):
         # Running as compiled executable
         base_path = sys._MEIPASS
@@ -16,15 +15,29 @@ if __name__ == '__main__':
         # Running as a script
         base_path = os.path.dirname(os.path.abspath(__file__))
 
-    splash_path = os.path.join(base_path, "splash.png")
-    splash_pix = QPixmap(splash_path)
+    splash_pix = QPixmap(os.path.join(base_path, "SPLASH.png"))
     splash = QSplashScreen(splash_pix, Qt.WindowStaysOnTopHint)
     splash.setMask(splash_pix.mask())
     splash.show()
-    app.processEvents()
+    QApplication.processEvents()
+    return splash
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s %(name)s: %(message)s')
+    app = QApplication(sys.argv)
+    splash = show_splash()
 
-    # Initialize and show main window
+    # Imported only now, so the splash is on screen while the GUI module loads;
+    # OpenCV, NumPy and the processing modules load later, on first use
+    from gui import LineDrawingApp
+
+    # Show the main window as soon as it exists and close the splash over it
     window = LineDrawingApp()
-    QTimer.singleShot(1000, splash.close)  # Close splash after 1 second
-    QTimer.singleShot(1000, window.show)
-    sys.exit(app.exec_())
\ No newline at end of file
+    window.show()
+    splash.finish(window)
+    return app.exec_()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
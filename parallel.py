@@ -0,0 +1,162 @@
+"""
+Multi-core execution inside a single image.
+
+OpenCV spreads some of its functions over cores itself (cv2.setNumThreads),
+but the pipeline is a chain of short passes plus NumPy glue, most of which
+run on one core. Here the per-pixel stages are split into horizontal bands
+run on a thread pool instead (OpenCV and NumPy release the GIL). Each band
+is padded by the reach of its stage (its halo) and only its own rows are
+kept, so the stitched result is identical to the one-piece computation;
+it is the scheme of tiling.py with full-width, in-memory bands.
+
+    parallel.configure(threads=8)
+    enhanced = enhance_banded(image, params)     # == apply_enhancements(image, params)
+    binary = process_banded(enhanced, params)    # == process_with_ai_model(enhanced, params)
+
+Stages that are not local (Canny's hysteresis, Otsu's histogram, thinning)
+run on the whole image and rely on OpenCV's own threads.
+
+Thread budget: configure() sets the band pool and OpenCV's thread count
+together. Processes of a pool share the machine, so each should get
+threads_per_worker(workers) threads to use every core once, not once per
+worker.
+"""
+import concurrent.futures
+import math
+import os
+import threading
+
+import cv2
+import numpy as np
+
+from processing import (
+    enhance_colors, blur_image, to_grayscale, threshold_image, detect_edges, thicken_lines, channel_histograms
+)
+from engines import get_engine
+from instrumentation import timed
+
+BANDS_PER_THREAD = 2    # Spare bands even out uneven band costs
+MIN_BAND_ROWS = 64      # Below this the pool overhead outweighs the work
+
+_threads = None
+_bands = None
+_pool = None
+_pool_threads = 0
+_pool_lock = threading.Lock()
+
+
+def configure(threads=None, bands=None):
+    """
+    Sets the threads used inside one image (default: $VECTORIZER_THREADS,
+    else all CPUs) and the bands an image is split into (default:
+    BANDS_PER_THREAD per thread). OpenCV's own thread count follows.
+    """
+    global _threads, _bands
+    _threads, _bands = threads, bands
+    cv2.setNumThreads(get_threads())
+
+
+def get_threads():
+    return _threads or int(os.environ.get('VECTORIZER_THREADS', 0)) or os.cpu_count() or 1
+
+
+def threads_per_worker(workers, cpus=None):
+    """Threads each of workers processes may use so that together they fill cpus (default: all) cores."""
+    return max(1, (cpus or os.cpu_count() or 1) // max(1, workers))
+
+
+def band_count(height, threads=None, bands=None):
+    """Number of bands for an image of height rows; 1 means run in one piece."""
+    threads = threads or get_threads()
+    if threads <= 1:
+        return 1
+    bands = bands or _bands or threads * BANDS_PER_THREAD
+    return max(1, min(bands, height // MIN_BAND_ROWS))
+
+
+def iter_bands(height, bands, halo=0):
+    """Yields (core, padded) row slices splitting height rows into bands; padded adds halo rows each side."""
+    rows = math.ceil(height / bands)
+    for y in range(0, height, rows):
+        y1 = min(y + rows, height)
+        yield slice(y, y1), slice(max(y - halo, 0), min(y1 + halo, height))
+
+
+def _executor(threads):
+    """Shared thread pool, recreated only when the thread count changes."""
+    global _pool, _pool_threads
+    with _pool_lock:
+        if _pool is None or _pool_threads != threads:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = concurrent.futures.ThreadPoolExecutor(max_workers=threads, thread_name_prefix='band')
+            _pool_threads = threads
+        return _pool
+
+
+def _run(func, items, threads):
+    if threads <= 1 or len(items) <= 1:
+        return [func(item) for item in items]
+    return list(_executor(threads).map(func, items))
+
+
+def map_bands(func, image, halo=0, threads=None, bands=None, shape=None, dtype=None):
+    """
+    Returns func(image) computed band by band on the thread pool. func gets
+    each band padded by halo rows and must not modify it; it may only look
+    at neighbours up to halo rows away. The result has the given shape and
+    dtype (default: those of image).
+    """
+    threads = threads or get_threads()
+    count = band_count(image.shape[0], threads, bands)
+    if count <= 1:
+        return func(image)
+
+    result = np.empty(image.shape if shape is None else shape, image.dtype if dtype is None else dtype)
+
+    def run_band(band):
+        core, padded = band
+        result[core] = func(image[padded])[core.start - padded.start:core.stop - padded.start]
+
+    _run(run_band, list(iter_bands(image.shape[0], count, halo)), min(threads, count))
+    return result
+
+
+@timed()
+def enhance_banded(image, params, threads=None, bands=None):
+    """apply_enhancements(image, params), in bands."""
+    threads = threads or get_threads()
+    histograms = None
+    if params['contrast'] != 50:
+        cores = [core for core, _ in iter_bands(image.shape[0], band_count(image.shape[0], threads, bands))]
+        histograms = sum(_run(lambda core: channel_histograms(image[core]), cores, threads))
+
+    def enhance(tile):
+        tile = enhance_colors(tile, params['brightness'], params['contrast'], params['sharpness'],
+                              histograms=histograms)
+        return blur_image(tile, params['blur'], tile)
+
+    # Sharpening reaches one pixel, the blur its radius
+    halo = (1 if params['sharpness'] != 50 else 0) + max(params['blur'], 0)
+    return map_bands(enhance, image, halo, threads, bands)
+
+
+@timed()
+def process_banded(enhanced, params, threads=None, bands=None):
+    """process_with_ai_model(enhanced, params), in bands where the engine allows."""
+    gray = map_bands(to_grayscale, enhanced, 0, threads, bands, shape=enhanced.shape[:2])
+    return extract_banded(gray, params, threads, bands)
+
+
+def extract_banded(gray, params, threads=None, bands=None):
+    """The extraction engine's output for a grayscale image, in bands where it allows."""
+    engine = get_engine(params['method'])
+    if engine.halo is not None:
+        return map_bands(lambda tile: engine.extract(tile, params), gray, engine.halo(params), threads, bands)
+    if params['method'] == 'Edge Detection':
+        # Canny's hysteresis spans the image; the dilation and threshold after it are local
+        edges = detect_edges(gray, params['edge_sensitivity'])
+        thickness = params['line_thickness']
+        return map_bands(lambda tile: threshold_image(thicken_lines(tile, thickness), params['threshold'], invert=True),
+                         edges, thickness, threads, bands)
+    return engine.extract(gray, params)
@@ -1,113 +1,464 @@
 import cv2
 import numpy as np
-from PIL import Image, ImageEnhance
+import functools
+import logging
 import os
-import xml.etree.ElementTree as ET
+import sys
+import shutil
+import subprocess
 import re
 
-def apply_enhancements(image, params):
+from instrumentation import timed
+from lazyimport import lazy_import
+
+ET = lazy_import('xml.etree.ElementTree')  # Only needed to read SVG masks
+engines = lazy_import('engines')  # Imports this module in turn
+
+logger = logging.getLogger(__name__)
+
+@timed()
+def apply_enhancements(image, params, out=None):
     """
     Applies enhancements such as brightness, contrast, sharpness, and blur.
+    out may be a preallocated array shaped like image to reuse across calls.
+    """
+    enhanced_image = enhance_colors(image, params['brightness'], params['contrast'], params['sharpness'], out)
+    # The blur can run in place on our own buffer
+    return blur_image(enhanced_image, params['blur'], enhanced_image)
+
+# PIL's ImageFilter.SMOOTH, which ImageEnhance.Sharpness blends against
+_SMOOTH_KERNEL = np.array([[1, 1, 1], [1, 5, 1], [1, 1, 1]], np.float32) / 13.0
+
+# ITU-R 601-2 luma weights for (B, G, R), as used by PIL's convert("L")
+_LUMA_WEIGHTS = np.array([7471, 38470, 19595], np.float64) / 65536.0
+
+@timed()
+def enhance_colors(image, brightness, contrast, sharpness, out=None, histograms=None):
+    """
+    Applies the brightness, contrast and sharpness enhancements (50 = unchanged).
+    Matches PIL's ImageEnhance (within rounding) without leaving OpenCV:
+    brightness and contrast are folded into one lookup table, sharpness is
+    a single 3x3 convolution. out may be a preallocated array of the same
+    shape and dtype to write the result into. histograms (see
+    channel_histograms) lets a tile of a larger image use the contrast
+    reference of the whole image.
+    """
+    if histograms is None and contrast != 50:
+        histograms = channel_histograms(image)
+    lut = _brightness_contrast_lut(histograms, brightness / 50.0, contrast / 50.0)
+    sharpness_factor = sharpness / 50.0
+
+    if sharpness_factor == 1.0:
+        if lut is None:
+            if out is None:
+                return image.copy()
+            np.copyto(out, image)
+            return out
+        return cv2.LUT(image, lut, dst=out)
+
+    source = image if lut is None else cv2.LUT(image, lut)
+    return _sharpen(source, sharpness_factor, out)
+
+def channel_histograms(image):
+    """
+    Returns the 256-bin histogram of each channel as a (channels, 256) array.
+    """
+    # Views of mapped files (see fileio.open_image) take calcHist's slow path; avoid them
+    if image.ndim == 3 and image.strides[2] < 0:
+        # Channel-reversed: RGB data read as BGR
+        return channel_histograms(image[..., ::-1])[::-1]
+    if image.ndim == 3 and image.strides[2] == 0:
+        # Gray broadcast to three channels: they all have the same histogram
+        return np.repeat(channel_histograms(image[..., 0]), image.shape[2], axis=0)
+    channels = image.shape[2] if image.ndim == 3 else 1
+    return np.stack([cv2.calcHist([image], [c], None, [256], [0, 256]).ravel() for c in range(channels)])
+
+def _brightness_contrast_lut(histograms, brightness_factor, contrast_factor):
+    """
+    Builds the 256-entry table for ImageEnhance.Brightness followed by
+    ImageEnhance.Contrast, or returns None when both are identities.
+    """
+    if brightness_factor == 1.0 and contrast_factor == 1.0:
+        return None
+
+    values = np.arange(256, dtype=np.float32)
+    # Blend with black, truncated like PIL's ImagingBlend
+    brightened = np.clip(np.trunc(values * np.float32(brightness_factor)), 0, 255)
+
+    if contrast_factor != 1.0:
+        # PIL blends with a flat gray at the mean luma of the brightened
+        # image; per-channel histograms give that mean without a full pass
+        channel_means = histograms @ brightened / histograms.sum(axis=1)
+        mean = channel_means[0] if len(channel_means) == 1 else channel_means[:3] @ _LUMA_WEIGHTS
+        mean = np.float32(int(mean + 0.5))
+        brightened = np.clip(np.trunc(mean + np.float32(contrast_factor) * (brightened - mean)), 0, 255)
+
+    return brightened.astype(np.uint8)
+
+def _sharpen(image, factor, out=None):
+    """
+    ImageEnhance.Sharpness as one convolution: blending the image with its
+    SMOOTH-filtered copy is the same as filtering with the blended kernel.
+    """
+    kernel = _SMOOTH_KERNEL * (1.0 - factor)
+    kernel[1, 1] += factor
+    result = cv2.filter2D(image, -1, kernel, dst=out, borderType=cv2.BORDER_REPLICATE)
+    # PIL leaves the one-pixel border untouched
+    result[0] = image[0]
+    result[-1] = image[-1]
+    result[:, 0] = image[:, 0]
+    result[:, -1] = image[:, -1]
+    return result
+
+@timed()
+def blur_image(image, blur_value, out=None):
+    """
+    Gaussian blur with a (2 * blur_value + 1) kernel; 0 leaves the image as is.
     """
-    pil_image = Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
-    enhancer = ImageEnhance.Brightness(pil_image)
-    pil_image = enhancer.enhance(params['brightness'] / 50.0)
-    enhancer = ImageEnhance.Contrast(pil_image)
-    pil_image = enhancer.enhance(params['contrast'] / 50.0)
-    enhancer = ImageEnhance.Sharpness(pil_image)
-    pil_image = enhancer.enhance(params['sharpness'] / 50.0)
-    enhanced_image = cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR)
-    blur_value = params['blur']
     if blur_value > 0:
-        enhanced_image = cv2.GaussianBlur(enhanced_image, (blur_value * 2 + 1, blur_value * 2 + 1), 0)
-    return enhanced_image
+        image = cv2.GaussianBlur(image, (blur_value * 2 + 1, blur_value * 2 + 1), 0, dst=out)
+    return image
 
+@timed()
 def process_with_ai_model(image, params):
     """
-    Processes the image using thresholding or edge detection.
-    """
-    gray_image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    if params['method'] == 'Threshold':
-        _, binary_image = cv2.threshold(gray_image, params['threshold'], 255, cv2.THRESH_BINARY)
-    else:  # Edge Detection
-        edge_sensitivity = params['edge_sensitivity']
-        edges = cv2.Canny(gray_image, edge_sensitivity, edge_sensitivity * 2)
-        thickness = params['line_thickness']
-        kernel = np.ones((thickness, thickness), np.uint8)
-        thick_edges = cv2.dilate(edges, kernel, iterations=1)
-        _, binary_image = cv2.threshold(thick_edges, params['threshold'], 255, cv2.THRESH_BINARY_INV)
+    Processes the image with the extraction engine named by params['method']
+    (thresholding, edge detection, ...; see engines.py).
+    """
+    gray_image = to_grayscale(image)
+    return engines.get_engine(params['method']).extract(gray_image, params)
+
+@timed()
+def to_grayscale(image):
+    """
+    Converts a BGR image to grayscale.
+    """
+    return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+@timed()
+def threshold_image(gray_image, threshold, invert=False):
+    """
+    Binarizes a grayscale image; with invert, pixels above threshold become black.
+    """
+    _, binary_image = cv2.threshold(gray_image, threshold, 255,
+                                    cv2.THRESH_BINARY_INV if invert else cv2.THRESH_BINARY)
     return binary_image
 
-def create_mask_from_svg(svg_path, width, height, scale=1.0, offset_x=0, offset_y=0):
+@timed()
+def detect_edges(gray_image, edge_sensitivity):
+    """
+    Canny edge detection with thresholds (edge_sensitivity, 2 * edge_sensitivity).
+    """
+    return cv2.Canny(gray_image, edge_sensitivity, edge_sensitivity * 2)
+
+@timed()
+def thicken_lines(edges, thickness):
+    """
+    Dilates the edge map with a square kernel of the given size.
+    """
+    kernel = np.ones((thickness, thickness), np.uint8)
+    return cv2.dilate(edges, kernel, iterations=1)
+
+def scale_params(params, scale):
+    """
+    Adapts the spatial parameters (blur radius, line thickness, ...) for running
+    the pipeline on a copy of the image resized by scale.
+    """
+    if scale == 1.0:
+        return params
+    scaled = dict(params)
+    scaled['blur'] = int(round(params['blur'] * scale))
+    for key, spec in engines.PARAMETERS.items():
+        if spec.get('spatial') and key in params:
+            scaled[key] = engines.scale_param(key, params[key], scale)
+    return scaled
+
+@timed()
+def create_mask_from_svg(svg_path, width, height, scale=1.0, offset_x=0, offset_y=0, tolerance=0.25):
     """
     Create a binary mask from an SVG file.
+    The SVG is fitted to width x height, multiplied by scale and centred
+    (plus offset_x/offset_y). Curves are flattened to within tolerance
+    pixels. Parsed files are cached until their modification time changes.
     """
     try:
-        # Create a blank mask
-        mask = np.zeros((height, width), dtype=np.uint8)
-        
-        # Parse SVG to extract path data
-        tree = ET.parse(svg_path)
-        root = tree.getroot()
-        
-        # Get SVG viewBox if it exists
-        viewbox = root.get('viewBox')
-        if viewbox:
-            vb_parts = [float(x) for x in viewbox.split()]
-            svg_width, svg_height = vb_parts[2], vb_parts[3]
-        else:
-            svg_width = float(root.get('width', '100').strip('px'))
-            svg_height = float(root.get('height', '100').strip('px'))
-        
-        # Scale factors to fit SVG to our mask dimensions
-        scale_x = (width * scale) / svg_width
-        scale_y = (height * scale) / svg_height
-        
-        # Center offset
-        center_x = width//2 + offset_x
-        center_y = height//2 + offset_y
-        
-        # Extract path elements and draw them on the mask
-        paths = root.findall('.//{http://www.w3.org/2000/svg}path')
-        for path in paths:
-            d = path.get('d', '')
-            if d:
-                points = parse_svg_path(d)
-                if points and len(points) > 1:
-                    transformed_points = []
-                    for x, y in points:
-                        tx = int(x * scale_x + center_x - (svg_width * scale_x)/2)
-                        ty = int(y * scale_y + center_y - (svg_height * scale_y)/2)
-                        transformed_points.append((tx, ty))
-                    
-                    pts = np.array([transformed_points], dtype=np.int32)
-                    cv2.fillPoly(mask, pts, 255)
-        
-        return mask
+        return render_svg_mask(svg_path, width, height, scale, offset_x, offset_y, tolerance)
     except Exception as e:
-        print(f"Error creating mask from SVG: {e}")
+        logger.error("Error creating mask from SVG: %s", e)
         return np.ones((height, width), dtype=np.uint8) * 255
 
+def render_svg_mask(svg_path, width, height, scale=1.0, offset_x=0, offset_y=0, tolerance=0.25):
+    """
+    Rasterizes an SVG file like create_mask_from_svg, but raises (OSError,
+    ValueError, ParseError) instead of returning a full mask on failure.
+    """
+    # Create a blank mask
+    mask = np.zeros((height, width), dtype=np.uint8)
+
+    svg = load_svg_shapes(svg_path)
+    min_x, min_y, svg_width, svg_height = svg['viewbox']
+
+    # Scale factors to fit SVG to our mask dimensions
+    scale_x = (width * scale) / svg_width
+    scale_y = (height * scale) / svg_height
+
+    # Center offset
+    center_x = width / 2 + offset_x
+    center_y = height / 2 + offset_y
+    factors = np.array([scale_x, scale_y])
+    shift = np.array([center_x - (svg_width * scale_x) / 2 - min_x * scale_x,
+                      center_y - (svg_height * scale_y) / 2 - min_y * scale_y])
+
+    # Flatten in SVG units, at a tolerance equivalent to the one in pixels
+    svg_tolerance = tolerance / max(abs(scale_x), abs(scale_y), 1e-12)
+    for commands, fill_rule in svg['paths']:
+        subpaths = flatten_svg_path(commands, svg_tolerance)
+        if subpaths:
+            fill_subpaths(mask, subpaths, fill_rule, factors, shift)
+
+    return mask
+
+_SVG_NS = '{http://www.w3.org/2000/svg}'
+
+def load_svg_shapes(svg_path):
+    """
+    Parses an SVG file into {'viewbox': (min_x, min_y, width, height),
+    'paths': [(commands, fill_rule), ...]}. Results are cached on the file's
+    path and modification time, so masking many images with the same
+    template reads the XML once.
+    """
+    stat = os.stat(svg_path)
+    return _load_svg_shapes(os.path.abspath(svg_path), stat.st_mtime_ns, stat.st_size)
+
+@functools.lru_cache(maxsize=32)
+def _load_svg_shapes(svg_path, mtime_ns, size):
+    root = ET.parse(svg_path).getroot()
+
+    # Get SVG viewBox if it exists
+    viewbox = root.get('viewBox')
+    if viewbox:
+        viewbox = tuple(float(x) for x in re.split(r'[\s,]+', viewbox.strip()))
+    else:
+        viewbox = (0.0, 0.0, float(root.get('width', '100').strip('px')),
+                   float(root.get('height', '100').strip('px')))
+
+    paths = []
+    for path in root.iter(_SVG_NS + 'path'):
+        d = path.get('d', '')
+        if d:
+            paths.append((tuple(parse_svg_path(d)), _fill_rule(path)))
+    return {'viewbox': viewbox, 'paths': paths}
+
+def _fill_rule(element):
+    """The element's fill-rule, from its attribute or style; SVG defaults to nonzero."""
+    match = re.search(r'fill-rule\s*:\s*(\w+)', element.get('style', ''))
+    return match.group(1) if match else element.get('fill-rule', 'nonzero')
+
+_PATH_COMMAND = re.compile(r'[\s,]*([MmZzLlHhVvCcSsQqTtAa])')
+_PATH_NUMBER = re.compile(r'[\s,]*([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)')
+_PATH_FLAG = re.compile(r'[\s,]*([01])')
+_PATH_ARG_COUNTS = {'M': 2, 'L': 2, 'H': 1, 'V': 1, 'C': 6, 'S': 4, 'Q': 4, 'T': 2, 'A': 7, 'Z': 0}
+
 def parse_svg_path(d):
     """
-    Parse SVG path data to extract points.
-    This is a simplified parser that works for basic paths.
+    Tokenizes SVG path data into a list of (command, args) pairs.
+    Implicit repeats are expanded (extra pairs after M/m become L/l) and
+    arc flags may be written without separators. Raises ValueError on
+    malformed data.
     """
-    # Extract all numeric values from the path data
-    numbers = re.findall(r'[-+]?[0-9]*\.?[0-9]+', d)
-    
-    # Convert to floats and pair them as (x,y) coordinates
+    commands = []
+    pos = 0
+    while True:
+        match = _PATH_COMMAND.match(d, pos)
+        if not match:
+            if d[pos:].strip(' \t\r\n,'):
+                raise ValueError(f"Unexpected path data at {pos}: {d[pos:pos + 20]!r}")
+            return commands
+        command = match.group(1)
+        pos = match.end()
+        count = _PATH_ARG_COUNTS[command.upper()]
+        if count == 0:
+            commands.append((command, ()))
+            continue
+
+        repeat = False
+        while True:
+            args = []
+            for i in range(count):
+                pattern = _PATH_FLAG if command in 'Aa' and i in (3, 4) else _PATH_NUMBER
+                match = pattern.match(d, pos)
+                if not match:
+                    break
+                args.append(float(match.group(1)))
+                pos = match.end()
+            if len(args) < count:
+                if args or not repeat:
+                    raise ValueError(f"Expected {count} arguments for '{command}' at {pos}")
+                break
+            commands.append((command, tuple(args)))
+            if command in 'Mm':
+                command = 'L' if command == 'M' else 'l'
+            repeat = True
+
+def flatten_svg_path(commands, tolerance=0.25):
+    """
+    Converts parsed path commands to polylines, one (N, 2) float array per
+    subpath. Curves and arcs are split finely enough that the polyline
+    stays within tolerance of the true curve.
+    """
+    subpaths = []
     points = []
-    for i in range(0, len(numbers) - 1, 2):
-        try:
-            x = float(numbers[i])
-            y = float(numbers[i+1])
-            points.append((x, y))
-        except (IndexError, ValueError):
-            pass
-    
+    current = np.zeros(2)
+    start = np.zeros(2)
+    last_control = None  # Reflected by S/T
+    last_command = ''
+
+    for command, args in commands:
+        upper = command.upper()
+        relative = command != upper and upper not in 'HVZ'
+        coords = np.array(args, dtype=np.float64)
+        if relative and upper != 'A':
+            coords = coords + np.tile(current, len(coords) // 2)
+
+        if upper == 'M':
+            if len(points) > 1:
+                subpaths.append(np.array(points))
+            current = start = coords
+            points = [current]
+        elif upper == 'Z':
+            if len(points) > 1:
+                subpaths.append(np.array(points))
+            current = start
+            points = [current]
+        elif upper == 'L':
+            current = coords
+            points.append(current)
+        elif upper in 'HV':
+            axis = 0 if upper == 'H' else 1
+            current = current.copy()
+            current[axis] = args[0] + (current[axis] if command.islower() else 0.0)
+            points.append(current)
+        elif upper in 'CS':
+            if upper == 'S':
+                reflected = 2 * current - last_control if last_command in 'CS' else current
+                coords = np.concatenate([reflected, coords])
+            p1, p2, p3 = coords[0:2], coords[2:4], coords[4:6]
+            points.extend(_flatten_cubic(current, p1, p2, p3, tolerance))
+            last_control, current = p2, p3
+        elif upper in 'QT':
+            if upper == 'T':
+                reflected = 2 * current - last_control if last_command in 'QT' else current
+                coords = np.concatenate([reflected, coords])
+            p1, p2 = coords[0:2], coords[2:4]
+            points.extend(_flatten_quadratic(current, p1, p2, tolerance))
+            last_control, current = p1, p2
+        elif upper == 'A':
+            end = coords[5:7] + (current if relative else 0.0)
+            points.extend(_flatten_arc(current, coords[0], coords[1], coords[2],
+                                       bool(coords[3]), bool(coords[4]), end, tolerance))
+            current = end
+        last_command = upper
+
+    if len(points) > 1:
+        subpaths.append(np.array(points))
+    return subpaths
+
+def _curve_params(deviation, tolerance):
+    """Parameter values splitting a curve into enough segments for tolerance."""
+    segments = max(1, int(np.ceil(np.sqrt(deviation / max(tolerance, 1e-9)))))
+    return np.linspace(0.0, 1.0, min(segments, 1000) + 1)[1:, None]
+
+def _flatten_cubic(p0, p1, p2, p3, tolerance):
+    # Uniform subdivision error is at most 3/4 * max second difference / n^2
+    deviation = 0.75 * max(np.linalg.norm(p0 - 2 * p1 + p2), np.linalg.norm(p1 - 2 * p2 + p3))
+    t = _curve_params(deviation, tolerance)
+    s = 1 - t
+    return s ** 3 * p0 + 3 * s * s * t * p1 + 3 * s * t * t * p2 + t ** 3 * p3
+
+def _flatten_quadratic(p0, p1, p2, tolerance):
+    deviation = 0.25 * np.linalg.norm(p0 - 2 * p1 + p2)
+    t = _curve_params(deviation, tolerance)
+    s = 1 - t
+    return s * s * p0 + 2 * s * t * p1 + t * t * p2
+
+def _flatten_arc(p0, rx, ry, angle, large_arc, sweep, p1, tolerance):
+    """Elliptical arc by endpoint parameterization (SVG 1.1 appendix F.6.5)."""
+    rx, ry = abs(rx), abs(ry)
+    if rx == 0 or ry == 0 or np.allclose(p0, p1):
+        return [p1]
+
+    phi = np.radians(angle)
+    cos_phi, sin_phi = np.cos(phi), np.sin(phi)
+    dx, dy = (p0 - p1) / 2
+    x1 = cos_phi * dx + sin_phi * dy
+    y1 = -sin_phi * dx + cos_phi * dy
+
+    # Scale up radii that are too small to span the endpoints
+    radii_check = x1 ** 2 / rx ** 2 + y1 ** 2 / ry ** 2
+    if radii_check > 1:
+        rx, ry = rx * np.sqrt(radii_check), ry * np.sqrt(radii_check)
+
+    numerator = rx ** 2 * ry ** 2 - rx ** 2 * y1 ** 2 - ry ** 2 * x1 ** 2
+    factor = np.sqrt(max(numerator, 0.0) / (rx ** 2 * y1 ** 2 + ry ** 2 * x1 ** 2))
+    if large_arc == sweep:
+        factor = -factor
+    cx1, cy1 = factor * rx * y1 / ry, -factor * ry * x1 / rx
+    center = np.array([cos_phi * cx1 - sin_phi * cy1, sin_phi * cx1 + cos_phi * cy1]) + (p0 + p1) / 2
+
+    theta1 = np.arctan2((y1 - cy1) / ry, (x1 - cx1) / rx)
+    delta = np.arctan2((-y1 - cy1) / ry, (-x1 - cx1) / rx) - theta1
+    if sweep and delta < 0:
+        delta += 2 * np.pi
+    elif not sweep and delta > 0:
+        delta -= 2 * np.pi
+
+    # Largest angular step whose chord stays within tolerance of the arc
+    radius = max(rx, ry)
+    step = 2 * np.arccos(max(1 - tolerance / radius, -1.0)) if tolerance < radius else np.pi / 2
+    segments = min(max(1, int(np.ceil(abs(delta) / step))), 1000)
+    theta = theta1 + delta * np.linspace(0.0, 1.0, segments + 1)[1:]
+    x, y = rx * np.cos(theta), ry * np.sin(theta)
+    points = np.column_stack([cos_phi * x - sin_phi * y, sin_phi * x + cos_phi * y]) + center
+    points[-1] = p1
     return points
 
+# Sub-pixel precision for cv2.fillPoly, in bits
+_FILL_SHIFT = 4
+
+def fill_subpaths(mask, subpaths, fill_rule, factors=(1.0, 1.0), shift=(0.0, 0.0)):
+    """
+    Fills polylines into mask (uint8, 255 inside) after mapping every point
+    to p * factors + shift in one vectorized step. fill_rule is 'evenodd'
+    or 'nonzero'; for nonzero, subpaths wound against the outline cut holes
+    (exact for subpaths that do not self-intersect).
+    """
+    subpaths = [p for p in subpaths if len(p) >= 3]
+    if not subpaths:
+        return mask
+    points = np.concatenate(subpaths) * np.asarray(factors) + np.asarray(shift)
+    fixed = np.round(points * (1 << _FILL_SHIFT)).astype(np.int32)
+    polygons = np.split(fixed, np.cumsum([len(p) for p in subpaths])[:-1])
+
+    if fill_rule == 'evenodd' or len(polygons) == 1:
+        cv2.fillPoly(mask, polygons, 255, cv2.LINE_8, _FILL_SHIFT)
+        return mask
+
+    # Nonzero: accumulate the signed winding of each subpath within its bounding box
+    height, width = mask.shape[:2]
+    winding = np.zeros((height, width), np.int16)
+    for polygon in polygons:
+        x0, y0 = np.maximum(polygon.min(axis=0) >> _FILL_SHIFT, 0)
+        x1, y1 = np.minimum((polygon.max(axis=0) >> _FILL_SHIFT) + 2, (width, height))
+        if x0 >= x1 or y0 >= y1:
+            continue
+        region = np.zeros((y1 - y0, x1 - x0), np.uint8)
+        cv2.fillPoly(region, [polygon - (np.array([x0, y0]) << _FILL_SHIFT)], 1, cv2.LINE_8, _FILL_SHIFT)
+        direction = 1 if cv2.contourArea(polygon.astype(np.float32), oriented=True) >= 0 else -1
+        winding[y0:y1, x0:x1] += direction * region.view(np.int8).astype(np.int16)
+    mask[winding != 0] = 255
+    return mask
+
+@timed()
 def crop_with_mask(image, mask):
     """
     Crop image using a binary mask.
@@ -119,4 +470,120 @@ def crop_with_mask(image, mask):
     
     # Apply mask
     result = cv2.bitwise_and(image, image, mask=mask)
-    return result
\ No newline at end of file
+    return result
+
+def trace_contours(binary_image, tolerance=0.5, min_area=2.0):
+    """
+    Extracts the outlines of the black regions of a binary image.
+    Outlines are simplified with Douglas-Peucker (tolerance in pixels) and
+    returned as float arrays of (x, y) points in pixel-edge coordinates.
+    Outlines enclosing less than min_area pixels are dropped as specks.
+    """
+    # findContours walks pixel centres, which would collapse 1 px lines to
+    # zero width. Tracing a 2x copy grown by one sub-pixel to the right and
+    # bottom puts those centres exactly on the original pixel edges.
+    ink = (binary_image == 0).view(np.uint8)
+    ink = cv2.resize(ink, (ink.shape[1] * 2, ink.shape[0] * 2), interpolation=cv2.INTER_NEAREST)
+    ink = cv2.copyMakeBorder(ink, 0, 1, 0, 1, cv2.BORDER_CONSTANT, value=0)
+    ink = cv2.dilate(ink, np.ones((2, 2), np.uint8))
+    contours, _ = cv2.findContours(ink, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+
+    polygons = []
+    for contour in contours:
+        if cv2.contourArea(contour) < min_area * 4:
+            continue
+        if tolerance > 0:
+            contour = cv2.approxPolyDP(contour, tolerance * 2, True)
+        if len(contour) < 3:
+            continue
+        polygons.append(contour.reshape(-1, 2) / 2.0)
+    return polygons
+
+def _format_coords(values):
+    """Formats coordinates with at most two decimals and no trailing zeros."""
+    return ' '.join(('%.2f' % v).rstrip('0').rstrip('.') for v in values)
+
+def polygon_to_path_data(points, bezier=True, corner_angle=60.0):
+    """
+    Converts a closed polygon to SVG path data.
+    With bezier enabled the polygon is smoothed into cubic Bezier segments
+    (Catmull-Rom tangents); vertices turning by more than corner_angle
+    degrees are kept as sharp corners.
+    """
+    if not bezier:
+        return 'M' + _format_coords(points[0]) + 'L' + _format_coords(points[1:].ravel()) + 'Z'
+
+    prev_pts = np.roll(points, 1, axis=0)
+    next_pts = np.roll(points, -1, axis=0)
+    tangents = (next_pts - prev_pts) / 6.0
+
+    # Zero the tangent at sharp corners so the curve passes through them
+    d_in = points - prev_pts
+    d_out = next_pts - points
+    norms = np.linalg.norm(d_in, axis=1) * np.linalg.norm(d_out, axis=1)
+    cos_turn = np.einsum('ij,ij->i', d_in, d_out) / np.maximum(norms, 1e-12)
+    tangents[cos_turn < np.cos(np.radians(corner_angle))] = 0
+
+    control1 = points + tangents
+    control2 = next_pts - np.roll(tangents, -1, axis=0)
+    segments = np.hstack([control1, control2, next_pts])
+    return 'M' + _format_coords(points[0]) + 'C' + _format_coords(segments.ravel()) + 'Z'
+
+@timed()
+def vectorize(binary_image, tolerance=0.5, bezier=True, min_area=2.0, corner_angle=60.0):
+    """
+    Converts a binary image (black lines on white) to an SVG document string
+    in memory. See trace_contours and polygon_to_path_data for the knobs.
+    """
+    height, width = binary_image.shape[:2]
+    polygons = trace_contours(binary_image, tolerance, min_area)
+    d = ''.join(polygon_to_path_data(p, bezier, corner_angle) for p in polygons)
+    return svg_document(d, width, height)
+
+def svg_document(path_data, width, height):
+    """Wraps path data in a single-path SVG document of the given size."""
+    return (f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+            f'viewBox="0 0 {width} {height}">\n'
+            f'<path fill="#000000" fill-rule="evenodd" d="{path_data}"/>\n'
+            '</svg>\n')
+
+def save_svg(svg, file_name):
+    """Writes an SVG document string to a file."""
+    with open(file_name, 'w', encoding='utf-8') as f:
+        f.write(svg)
+
+def find_potrace():
+    """
+    Locate the Potrace executable.
+    Looks next to the application first, then in the /potrace subfolder,
+    then falls back to a `potrace` binary on the PATH.
+    """
+    if getattr(sys, 'frozen', False):
+        # Running as compiled executable
+        base_path = sys._MEIPASS
+    else:
+        # Running as a script
+        base_path = os.path.dirname(os.path.abspath(__file__))
+
+    for candidate in (os.path.join(base_path, "potrace.exe"),
+                      os.path.join(base_path, "potrace", "potrace.exe")):
+        if os.path.exists(candidate):
+            return candidate
+
+    # Not bundled; use a system-wide install if there is one
+    return shutil.which("potrace") or os.path.join(base_path, "potrace.exe")
+
+@timed()
+def trace_with_potrace(image, file_name, timeout=60):
+    """
+    Converts a binary image to SVG using Potrace.
+    The bitmap is piped to Potrace's standard input as BMP, so no
+    intermediate file is written.
+    Raises subprocess.CalledProcessError, FileNotFoundError or
+    subprocess.TimeoutExpired on failure. Returns the completed process.
+    """
+    ok, bitmap = cv2.imencode(".bmp", image)
+    if not ok:
+        raise ValueError("Could not encode the image as BMP")
+    command = [find_potrace(), "-s", "-o", file_name, "-"]
+    return subprocess.run(command, input=bitmap.tobytes(), capture_output=True, check=True, timeout=timeout)
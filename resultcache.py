@@ -0,0 +1,222 @@
+"""
+Persistent, content-addressed cache of pipeline results.
+
+Entries are keyed on a hash of the source image file plus the parameters
+that produced them, so re-running the same image with the same preset
+skips the work, whichever file name or process asks for it:
+
+    cache = ResultCache()
+    key = cache.key(file_digest(path), params, 'svg')
+    if not cache.fetch(key, '.svg', output_path):
+        ...  # convert and write output_path
+        cache.store(key, '.svg', output_path)
+
+Two kinds of entries are kept: binary rasters (the output of
+process_with_ai_model, as PNG) and finished output files. The cache is a
+plain directory shared by any number of processes. Every entry is written
+to a temporary file and renamed into place, so readers see complete files
+or nothing. A hit refreshes the entry's modification time. Once the
+directory grows past max_bytes, the least recently used entries are
+deleted until it is back under the limit.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+CACHE_VERSION = 1                       # Bump when pipeline output changes; orphans every entry
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+EVICT_TO = 0.9                          # Evict down to this fraction of max_bytes, so not every put rescans
+STALE_PARTIAL_SECONDS = 3600            # Temporary files older than this were left by a crashed writer
+
+logger = logging.getLogger(__name__)
+
+
+def default_cache_dir():
+    """$VECTORIZER_CACHE_DIR, else 'vectorizer' under $XDG_CACHE_HOME or ~/.cache."""
+    directory = os.environ.get('VECTORIZER_CACHE_DIR')
+    if directory:
+        return directory
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'vectorizer')
+
+
+def bytes_digest(data):
+    """SHA-256 hex digest of in-memory file contents; equal to file_digest of the file."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def file_digest(path, chunk_size=1024 * 1024):
+    """SHA-256 hex digest of a file's bytes."""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class ResultCache:
+    """On-disk LRU cache of rasters and output files; see the module docstring."""
+
+    def __init__(self, directory=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory or default_cache_dir()
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._nbytes = None  # Estimated directory size, from the last scan plus our own writes
+
+    def key(self, source_digest, params, kind):
+        """Entry key for a source file digest, a parameter dict and the kind of result."""
+        blob = json.dumps([CACHE_VERSION, source_digest, kind, params], sort_keys=True, default=str)
+        return hashlib.sha256(blob.encode('utf-8')).hexdigest()
+
+    def _path(self, key, extension):
+        return os.path.join(self.directory, key[:2], key + extension)
+
+    def _touch(self, path):
+        try:
+            os.utime(path)
+        except OSError:
+            pass  # Evicted by another process in the meantime; the caller already has the data
+
+    def fetch(self, key, extension, destination):
+        """
+        Copies the entry to destination (atomically) and returns True, or
+        returns False on a miss.
+        """
+        path = self._path(key, extension)
+        try:
+            source = open(path, 'rb')
+        except FileNotFoundError:
+            self.misses += 1
+            return False
+        # The open handle keeps the data readable even if another process evicts the entry now
+        with source:
+            fd, partial_path = tempfile.mkstemp(prefix='.part', suffix=extension,
+                                                dir=os.path.dirname(destination) or '.')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    shutil.copyfileobj(source, f)
+                os.replace(partial_path, destination)
+            finally:
+                if os.path.exists(partial_path):
+                    os.remove(partial_path)
+        self._touch(path)
+        self.hits += 1
+        return True
+
+    def store(self, key, extension, source_path):
+        """Copies a finished file into the cache under key."""
+        self._put(key, extension, lambda partial_path: shutil.copyfile(source_path, partial_path))
+
+    def get_array(self, key):
+        """The cached raster for key, or None."""
+        path = self._path(key, '.png')
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_UNCHANGED)
+        if image is None:
+            logger.warning("Ignoring unreadable cache entry %s", path)
+            self.misses += 1
+            return None
+        self._touch(path)
+        self.hits += 1
+        return image
+
+    def put_array(self, key, image):
+        """Stores a raster (lossless PNG, fast compression)."""
+        def write(partial_path):
+            if not cv2.imwrite(partial_path, image, [cv2.IMWRITE_PNG_COMPRESSION, 1]):
+                raise IOError(f"Could not write cache entry {partial_path}")
+        self._put(key, '.png', write)
+
+    def _put(self, key, extension, write):
+        path = self._path(key, extension)
+        directory = os.path.dirname(path)
+        try:
+            os.makedirs(directory, exist_ok=True)
+            # Keep the extension last so cv2.imwrite picks the codec
+            fd, partial_path = tempfile.mkstemp(prefix='.part', suffix=extension, dir=directory)
+            os.close(fd)
+            try:
+                write(partial_path)
+                size = os.path.getsize(partial_path)
+                os.replace(partial_path, path)
+            finally:
+                if os.path.exists(partial_path):
+                    os.remove(partial_path)
+        except OSError as e:
+            # A cache that cannot be written must never fail the conversion
+            logger.warning("Could not store cache entry %s: %s", path, e)
+            return
+        if self._nbytes is None:
+            self._nbytes = self._scan_size()
+        else:
+            self._nbytes += size
+        if self._nbytes > self.max_bytes:
+            self.evict()
+
+    def _entries(self):
+        """(mtime, size, path) of every entry; removes temporary files left by crashed writers."""
+        entries = []
+        now = time.time()
+        for dirpath, _, names in os.walk(self.directory):
+            for name in names:
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                    if name.startswith('.part'):
+                        if now - st.st_mtime > STALE_PARTIAL_SECONDS:
+                            os.remove(path)
+                        continue
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def _scan_size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self, max_bytes=None):
+        """
+        Deletes least recently used entries until the cache holds at most
+        EVICT_TO of max_bytes. Safe to run in several processes at once.
+        Returns the number of entries removed.
+        """
+        limit = (self.max_bytes if max_bytes is None else max_bytes) * EVICT_TO
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in entries:
+            if total <= limit:
+                break
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                pass  # Another process evicted it first
+            except OSError as e:
+                logger.debug("Could not evict %s: %s", path, e)
+                continue  # E.g. open in another process on Windows; still counts
+            total -= size
+        self._nbytes = total
+        logger.debug("Evicted %d cache entries from %s, %d bytes left", removed, self.directory, total)
+        return removed
+
+    def clear(self):
+        """Deletes every entry."""
+        self.evict(0)
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'directory': self.directory,
+                'bytes': self._scan_size(), 'max_bytes': self.max_bytes}
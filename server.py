@@ -0,0 +1,396 @@
+"""
+Local HTTP vectorization service.
+
+Exposes the apply_enhancements -> process_with_ai_model -> vectorize
+pipeline over HTTP, backed by a pre-warmed process pool:
+
+    python server.py --port 8080 --workers 4 --queue 64
+
+    POST /vectorize?format=svg&preset=edges&threshold=140   body: image bytes
+        -> 200 image/svg+xml or image/png
+        -> 400 bad image/parameters, 413 body too large,
+           429 queue full (retry later), 500 processing error
+    GET /metrics  -> JSON counters, queue depth, latency percentiles, throughput
+    GET /health   -> 200 once the pool is warm
+
+Requests wait in a bounded queue. A dispatcher takes one worker slot at a
+time and groups up to --batch-size queued requests (waiting at most
+--batch-window-ms for more) into one pool task, which amortizes the
+inter-process overhead for small images. When the queue is full new
+requests are refused immediately with 429 instead of piling up.
+
+Only the standard library is used for the HTTP side.
+"""
+import argparse
+import asyncio
+import collections
+import concurrent.futures
+import json
+import logging
+import os
+import sys
+import time
+from http import HTTPStatus
+from urllib.parse import urlsplit, parse_qsl
+
+import cv2
+import numpy as np
+
+from batch import DEFAULT_PARAMS, PRESETS, load_preset
+from processing import apply_enhancements, process_with_ai_model
+from svgwriter import SIMPLIFY_METHODS, trace_polygons, compact_svg
+from engines import check_params
+
+logger = logging.getLogger(__name__)
+
+OUTPUT_TYPES = {'svg': 'image/svg+xml', 'png': 'image/png'}
+MAX_BODY_BYTES = 64 * 1024 * 1024
+LATENCY_WINDOW = 1000        # Requests kept for latency percentiles
+THROUGHPUT_WINDOW_S = 60.0   # Seconds of completions used for the rate
+
+
+class RequestError(Exception):
+    """A client error, reported with the given HTTP status."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def parse_params(query):
+    """
+    Builds the parameter dict from query arguments: an optional preset
+    plus individual overrides, coerced to the type of their default.
+    """
+    args = dict(parse_qsl(query))
+    output_format = args.pop('format', 'svg').lower()
+    if output_format not in OUTPUT_TYPES:
+        raise RequestError(HTTPStatus.BAD_REQUEST, f"format must be one of {', '.join(OUTPUT_TYPES)}")
+    preset = args.pop('preset', 'default')
+    # Only built-in presets: a file path would let clients read server files
+    if preset not in PRESETS:
+        raise RequestError(HTTPStatus.BAD_REQUEST, f"Unknown preset '{preset}' (built-in: {', '.join(PRESETS)})")
+    params = load_preset(preset)
+
+    for key, value in args.items():
+        if key not in DEFAULT_PARAMS or key == 'tracer':
+            raise RequestError(HTTPStatus.BAD_REQUEST, f"Unknown parameter '{key}'")
+        default = DEFAULT_PARAMS[key]
+        try:
+            if isinstance(default, bool):
+                params[key] = value.lower() in ('1', 'true', 'yes', 'on')
+            else:
+                params[key] = type(default)(value)
+        except ValueError:
+            raise RequestError(HTTPStatus.BAD_REQUEST, f"Invalid value for '{key}': {value!r}")
+    if params['simplify'] not in SIMPLIFY_METHODS:
+        raise RequestError(HTTPStatus.BAD_REQUEST, f"simplify must be one of {', '.join(SIMPLIFY_METHODS)}")
+    try:
+        check_params(params)
+    except ValueError as e:
+        raise RequestError(HTTPStatus.BAD_REQUEST, str(e))
+    return params, output_format
+
+
+# --- Worker process side -------------------------------------------------
+
+def _warm_up():
+    """Runs once per worker so imports and OpenCV initialisation happen before traffic."""
+    cv2.setNumThreads(1)
+    image = np.full((64, 64, 3), 255, np.uint8)
+    cv2.circle(image, (32, 32), 16, (0, 0, 0), 2)
+    convert_bytes(cv2.imencode('.png', image)[1].tobytes(), DEFAULT_PARAMS, 'svg')
+    return os.getpid()
+
+
+def convert_bytes(data, params, output_format):
+    """Decodes an image, runs the pipeline and returns the encoded output bytes."""
+    image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError("Could not decode image data.")
+    binary_image = process_with_ai_model(apply_enhancements(image, params), params)
+    if output_format == 'svg':
+        polygons, _ = trace_polygons(binary_image, params['tolerance'], params['simplify'])
+        height, width = binary_image.shape[:2]
+        return compact_svg(polygons, width, height, params['precision'], params['bezier']).encode('utf-8')
+    ok, encoded = cv2.imencode('.png', binary_image)
+    if not ok:
+        raise ValueError("Could not encode PNG.")
+    return encoded.tobytes()
+
+
+def _convert_batch(jobs):
+    """Pool entry point: converts a batch, returning ('ok', bytes) or ('error', message) per job."""
+    results = []
+    for data, params, output_format in jobs:
+        try:
+            results.append(('ok', convert_bytes(data, params, output_format)))
+        except ValueError as e:
+            results.append(('bad', str(e)))
+        except Exception as e:
+            results.append(('error', f"{type(e).__name__}: {e}"))
+    return results
+
+
+# --- Service -------------------------------------------------------------
+
+class Metrics:
+    def __init__(self):
+        self.started = time.monotonic()
+        self.counts = collections.Counter()
+        self.latencies = collections.deque(maxlen=LATENCY_WINDOW)
+        self.completions = collections.deque()
+        self.batch_sizes = collections.Counter()
+
+    def record(self, outcome, latency=None):
+        self.counts[outcome] += 1
+        if latency is not None:
+            now = time.monotonic()
+            self.latencies.append(latency)
+            self.completions.append(now)
+            while self.completions and self.completions[0] < now - THROUGHPUT_WINDOW_S:
+                self.completions.popleft()
+
+    def snapshot(self, service):
+        latencies = np.array(self.latencies) * 1000 if self.latencies else np.zeros(1)
+        window = min(THROUGHPUT_WINDOW_S, time.monotonic() - self.started) or 1.0
+        return {
+            'uptime_s': round(time.monotonic() - self.started, 1),
+            'requests': dict(self.counts),
+            'queued': service.queue.qsize(),
+            'queue_limit': service.queue.maxsize,
+            'in_flight_batches': service.active_batches,
+            'workers': service.workers,
+            'latency_ms': {
+                'p50': round(float(np.percentile(latencies, 50)), 2),
+                'p95': round(float(np.percentile(latencies, 95)), 2),
+                'p99': round(float(np.percentile(latencies, 99)), 2),
+                'max': round(float(latencies.max()), 2),
+            },
+            'throughput_rps': round(len(self.completions) / window, 2),
+            'batch_sizes': {str(k): v for k, v in sorted(self.batch_sizes.items())},
+        }
+
+
+class VectorizeService:
+    """Bounded queue in front of a warm process pool, with micro-batching."""
+
+    def __init__(self, workers=None, max_queue=64, batch_size=4, batch_window=0.005):
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = max(1, batch_size)
+        self.batch_window = batch_window
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.slots = asyncio.Semaphore(self.workers)
+        self.active_batches = 0
+        self.metrics = Metrics()
+        self.pool = None
+        self.ready = False
+        self._dispatcher = None
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        self.pool = concurrent.futures.ProcessPoolExecutor(max_workers=self.workers)
+        # Warm every worker; the tasks block briefly so each lands on its own process
+        pids = await asyncio.gather(*(loop.run_in_executor(self.pool, _warm_up) for _ in range(self.workers)))
+        logger.info("Warmed %d worker process(es): %s", len(set(pids)), sorted(set(pids)))
+        self._dispatcher = asyncio.create_task(self._dispatch())
+        self.ready = True
+
+    async def stop(self):
+        self.ready = False
+        if self._dispatcher:
+            self._dispatcher.cancel()
+        if self.pool:
+            self.pool.shutdown(wait=True, cancel_futures=True)
+
+    async def submit(self, data, params, output_format):
+        """Queues one conversion; raises asyncio.QueueFull when at capacity."""
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait(((data, params, output_format), future))
+        return await future
+
+    async def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # Take a worker slot first so requests wait in the bounded queue, not here
+            await self.slots.acquire()
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.batch_window
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                    continue
+                except asyncio.QueueEmpty:
+                    pass
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            asyncio.create_task(self._run_batch(batch))
+
+    async def _run_batch(self, batch):
+        loop = asyncio.get_running_loop()
+        self.metrics.batch_sizes[len(batch)] += 1
+        self.active_batches += 1
+        try:
+            results = await loop.run_in_executor(self.pool, _convert_batch, [job for job, _ in batch])
+        except Exception as e:
+            results = [('error', f"{type(e).__name__}: {e}")] * len(batch)
+        finally:
+            self.active_batches -= 1
+            self.slots.release()
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+
+# --- HTTP ----------------------------------------------------------------
+
+async def _read_request(reader):
+    """Returns (method, target, headers, body) or None when the client closed."""
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+    try:
+        method, target, _ = request_line.decode('latin-1').split(None, 2)
+    except ValueError:
+        raise RequestError(HTTPStatus.BAD_REQUEST, "Malformed request line")
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+        if len(headers) > 100:
+            raise RequestError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, "Too many headers")
+
+    body = b''
+    if method == 'POST':
+        if 'content-length' not in headers:
+            raise RequestError(HTTPStatus.LENGTH_REQUIRED, "Content-Length required")
+        try:
+            length = int(headers['content-length'])
+        except ValueError:
+            length = -1
+        if length < 0:
+            raise RequestError(HTTPStatus.BAD_REQUEST, "Malformed Content-Length")
+        if length > MAX_BODY_BYTES:
+            raise RequestError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Image too large")
+        body = await reader.readexactly(length)
+    return method, target, headers, body
+
+
+def _response(status, body=b'', content_type='text/plain; charset=utf-8', extra_headers=()):
+    status = HTTPStatus(status)
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    head = [f"HTTP/1.1 {status.value} {status.phrase}",
+            f"Content-Type: {content_type}",
+            f"Content-Length: {len(body)}"]
+    head.extend(extra_headers)
+    return ('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + body
+
+
+def _json_response(status, data):
+    return _response(status, json.dumps(data, indent=2), 'application/json')
+
+
+async def handle_request(service, method, target, body):
+    """Routes one request and returns the raw response bytes."""
+    url = urlsplit(target)
+    if url.path == '/health' and method == 'GET':
+        return _json_response(HTTPStatus.OK if service.ready else HTTPStatus.SERVICE_UNAVAILABLE,
+                              {'ready': service.ready})
+    if url.path == '/metrics' and method == 'GET':
+        return _json_response(HTTPStatus.OK, service.metrics.snapshot(service))
+    if url.path != '/vectorize':
+        return _response(HTTPStatus.NOT_FOUND, "Not found")
+    if method != 'POST':
+        return _response(HTTPStatus.METHOD_NOT_ALLOWED, "Use POST", extra_headers=['Allow: POST'])
+
+    start = time.monotonic()
+    params, output_format = parse_params(url.query)
+    if not body:
+        raise RequestError(HTTPStatus.BAD_REQUEST, "Empty body; send the image bytes")
+    try:
+        outcome, payload = await service.submit(body, params, output_format)
+    except asyncio.QueueFull:
+        service.metrics.record('rejected')
+        return _response(HTTPStatus.TOO_MANY_REQUESTS, "Queue full, retry later", extra_headers=['Retry-After: 1'])
+
+    if outcome == 'ok':
+        service.metrics.record('ok', time.monotonic() - start)
+        return _response(HTTPStatus.OK, payload, OUTPUT_TYPES[output_format])
+    service.metrics.record(outcome)
+    status = HTTPStatus.BAD_REQUEST if outcome == 'bad' else HTTPStatus.INTERNAL_SERVER_ERROR
+    return _response(status, payload)
+
+
+async def serve_connection(service, reader, writer):
+    """Handles HTTP/1.1 requests on one connection until the client closes it."""
+    try:
+        while True:
+            try:
+                request = await _read_request(reader)
+                if request is None:
+                    break
+                method, target, headers, body = request
+                response = await handle_request(service, method, target, body)
+                keep_alive = headers.get('connection', '').lower() != 'close'
+            except RequestError as e:
+                service.metrics.record('bad')
+                response, keep_alive = _response(e.status, str(e)), False
+            writer.write(response)
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    except Exception:
+        logger.exception("Unhandled error serving connection")
+    finally:
+        writer.close()
+
+
+async def run_server(host, port, workers, max_queue, batch_size, batch_window):
+    service = VectorizeService(workers, max_queue, batch_size, batch_window)
+    await service.start()
+    server = await asyncio.start_server(lambda r, w: serve_connection(service, r, w), host, port)
+    logger.info("Serving on http://%s:%d (workers=%d, queue=%d, batch=%d)",
+                host, port, service.workers, max_queue, service.batch_size)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local HTTP vectorization service.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('-j', '--workers', type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument('--queue', type=int, default=64, help="requests allowed to wait before answering 429")
+    parser.add_argument('--batch-size', type=int, default=4, help="max requests handed to a worker at once")
+    parser.add_argument('--batch-window-ms', type=float, default=5.0,
+                        help="how long to wait for more requests to fill a batch")
+    parser.add_argument('-v', '--verbose', action='store_true', help="debug logging")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO,
+                        format='%(levelname)s %(name)s: %(message)s')
+
+    try:
+        asyncio.run(run_server(args.host, args.port, args.workers, args.queue,
+                               args.batch_size, args.batch_window_ms / 1000))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,367 @@
+"""
+Compact SVG output for traced line art.
+
+vectorize() writes one path in absolute coordinates with two decimals and
+a full cubic segment per node, which gets large for busy drawings. This
+module writes the same kind of single, merged path more compactly:
+
+- outlines are simplified with Ramer-Douglas-Peucker or Visvalingam-Whyatt
+  (tolerance in pixels);
+- coordinates are quantized to `precision` decimals, and all arithmetic
+  happens on integer multiples of that quantum so relative offsets are exact;
+- commands are relative (m, l, h, v, c, s) with implicit repetition; the
+  Catmull-Rom tangents mirror at every node, so all Bezier segments after
+  the first in a subpath are written as shorthand 's' curves, and straight
+  runs between corners as lines;
+- numbers are written without leading zeros or redundant separators;
+- the document is streamed to the file subpath by subpath, gzip-compressed
+  for .svgz names, and only appears under its final name once complete.
+
+    polygons, traced = trace_polygons(binary_image, tolerance=0.5, method='visvalingam')
+    report = write_svg('out.svgz', polygons, width, height, precision=1, nodes_before=traced)
+    print(format_report(report))
+"""
+import gzip
+import heapq
+import os
+
+import cv2
+import numpy as np
+
+from processing import trace_contours, polygon_to_path_data, svg_document
+from instrumentation import timed
+from lazyimport import lazy_import
+
+ET = lazy_import('xml.etree.ElementTree')  # Only needed by merge_svg_paths
+
+SIMPLIFY_METHODS = ('rdp', 'visvalingam', 'none')
+DEFAULT_PRECISION = 1   # Decimals kept in coordinates; 1 = 0.1 px
+SVG_NS = 'http://www.w3.org/2000/svg'
+
+
+def simplify_polygon(points, tolerance, method='rdp'):
+    """
+    Simplifies a closed polygon ((N, 2) float array). For 'rdp' tolerance is
+    the maximum distance in pixels; for 'visvalingam' points are removed
+    while the triangle they form with their neighbours is smaller than
+    tolerance squared (in square pixels).
+    """
+    if method == 'none' or tolerance <= 0 or len(points) <= 3:
+        return points
+    if method == 'rdp':
+        simplified = cv2.approxPolyDP(points.astype(np.float32).reshape(-1, 1, 2), tolerance, True)
+        return simplified.reshape(-1, 2).astype(np.float64)
+    if method == 'visvalingam':
+        return _visvalingam(points, tolerance * tolerance)
+    raise ValueError(f"Unknown simplification method '{method}' (choose from: {', '.join(SIMPLIFY_METHODS)})")
+
+
+def _triangle_areas(points):
+    prev_pts = np.roll(points, 1, axis=0)
+    next_pts = np.roll(points, -1, axis=0)
+    return 0.5 * np.abs(np.cross(points - prev_pts, next_pts - prev_pts))
+
+
+def _visvalingam(points, min_area):
+    """Visvalingam-Whyatt on a closed polygon, keeping at least three points."""
+    n = len(points)
+    areas = _triangle_areas(points).tolist()
+    pts = points.tolist()
+    prev_index = [(i - 1) % n for i in range(n)]
+    next_index = [(i + 1) % n for i in range(n)]
+    removed = [False] * n
+    heap = [(area, i) for i, area in enumerate(areas) if area < min_area]
+    heapq.heapify(heap)
+    remaining = n
+
+    while heap and remaining > 3:
+        area, i = heapq.heappop(heap)
+        if removed[i] or area != areas[i]:
+            continue  # Stale entry; the point's area changed after it was queued
+        removed[i] = True
+        remaining -= 1
+        p, q = prev_index[i], next_index[i]
+        next_index[p], prev_index[q] = q, p
+        for j in (p, q):
+            (ax, ay), (bx, by), (cx, cy) = pts[prev_index[j]], pts[j], pts[next_index[j]]
+            # Never below the removed point's area, so removal order stays monotonic
+            new_area = max(0.5 * abs((bx - ax) * (cy - ay) - (cx - ax) * (by - ay)), area)
+            areas[j] = new_area
+            if new_area < min_area:
+                heapq.heappush(heap, (new_area, j))
+    return points[~np.array(removed)]
+
+
+@timed()
+def trace_polygons(binary_image, tolerance=0.5, method='rdp', min_area=2.0):
+    """
+    Traces the black regions of a binary image and simplifies the outlines.
+    Returns (polygons, number of traced points before simplification).
+    """
+    polygons = trace_contours(binary_image, 0, min_area)
+    traced = sum(len(p) for p in polygons)
+    simplified = []
+    for points in polygons:
+        points = simplify_polygon(points, tolerance, method)
+        if len(points) >= 3:
+            simplified.append(points)
+    return simplified, traced
+
+
+class PathEncoder:
+    """
+    Encodes polygons as compact relative path data. Coordinates are integers
+    in units of 10 ** -precision pixels.
+    """
+
+    def __init__(self, precision=DEFAULT_PRECISION, bezier=True, corner_angle=60.0):
+        self.precision = precision
+        self.scale = 10 ** precision
+        self.bezier = bezier
+        self.cos_corner = np.cos(np.radians(corner_angle))
+        self.nodes = 0
+        self._numbers = {}
+        self._start = (0, 0)   # Current point after 'z' is the subpath's start
+
+    def _number(self, value):
+        text = self._numbers.get(value)
+        if text is None:
+            if self.precision <= 0:
+                text = str(value * 10 ** -self.precision)
+            else:
+                whole, fraction = divmod(abs(value), self.scale)
+                text = str(whole) if whole else ''
+                if fraction:
+                    text += '.' + str(fraction).rjust(self.precision, '0').rstrip('0')
+                text = text or '0'
+                if value < 0:
+                    text = '-' + text
+            self._numbers[value] = text
+        return text
+
+    def _quantize(self, points):
+        if self.precision >= 0:
+            quantized = np.rint(points * self.scale).astype(np.int64)
+        else:
+            quantized = np.rint(points / 10 ** -self.precision).astype(np.int64)
+        # Drop points that collapsed onto their predecessor
+        keep = np.any(quantized != np.roll(quantized, 1, axis=0), axis=1)
+        return quantized[keep]
+
+    def _tangents(self, points):
+        """Catmull-Rom tangents, zeroed at corners as in polygon_to_path_data."""
+        prev_pts = np.roll(points, 1, axis=0)
+        next_pts = np.roll(points, -1, axis=0)
+        d_in = (points - prev_pts).astype(np.float64)
+        d_out = (next_pts - points).astype(np.float64)
+        norms = np.linalg.norm(d_in, axis=1) * np.linalg.norm(d_out, axis=1)
+        cos_turn = np.einsum('ij,ij->i', d_in, d_out) / np.maximum(norms, 1e-12)
+        tangents = np.rint((next_pts - prev_pts) / 6.0).astype(np.int64)
+        tangents[cos_turn < self.cos_corner] = 0
+        return tangents
+
+    def encode(self, points):
+        """Path data for one closed polygon, or '' if it degenerates when quantized."""
+        points = self._quantize(points)
+        if len(points) < 3:
+            return ''
+        self.nodes += len(points)
+
+        parts = []
+        state = {'command': None, 'number': False, 'dot': False}
+
+        def emit(command, *values):
+            if command != state['command'] or command in 'mz':
+                parts.append(command)
+                state['number'] = False
+            # After 'm', further coordinate pairs are implicit relative linetos
+            state['command'] = 'l' if command == 'm' else command
+            for value in values:
+                text = self._number(value)
+                if state['number'] and not (text[0] == '-' or (text[0] == '.' and state['dot'])):
+                    parts.append(' ')
+                parts.append(text)
+                state['number'] = True
+                state['dot'] = '.' in text
+
+        start = points[0]
+        emit('m', int(start[0] - self._start[0]), int(start[1] - self._start[1]))
+        self._start = (start[0], start[1])
+        deltas = np.roll(points, -1, axis=0) - points
+
+        if not self.bezier:
+            for dx, dy in deltas[:-1].tolist():  # The closing segment is implied by 'z'
+                self._line(emit, dx, dy)
+        else:
+            tangents = self._tangents(points)
+            next_tangents = np.roll(tangents, -1, axis=0)
+            previous_curve = False
+            for (dx, dy), (tx, ty), (nx, ny) in zip(deltas.tolist(), tangents.tolist(), next_tangents.tolist()):
+                if tx == ty == nx == ny == 0:
+                    self._line(emit, dx, dy)
+                    previous_curve = False
+                elif previous_curve or tx == ty == 0:
+                    # The first control point is the reflection of the previous one
+                    emit('s', dx - nx, dy - ny, dx, dy)
+                    previous_curve = True
+                else:
+                    emit('c', tx, ty, dx - nx, dy - ny, dx, dy)
+                    previous_curve = True
+        emit('z')
+        return ''.join(parts)
+
+    @staticmethod
+    def _line(emit, dx, dy):
+        if dy == 0:
+            emit('h', dx)
+        elif dx == 0:
+            emit('v', dy)
+        else:
+            emit('l', dx, dy)
+
+
+def _open_output(file_name, compress):
+    if compress:
+        return gzip.open(file_name, 'wt', encoding='utf-8', compresslevel=9)
+    return open(file_name, 'w', encoding='utf-8')
+
+
+def _svg_chunks(polygons, width, height, encoder):
+    yield (f'<svg xmlns="{SVG_NS}" width="{width}" height="{height}" viewBox="0 0 {width} {height}">'
+           '<path fill-rule="evenodd" d="')
+    for points in polygons:
+        yield encoder.encode(points)
+    yield '"/></svg>\n'
+
+
+def compact_svg(polygons, width, height, precision=DEFAULT_PRECISION, bezier=True, corner_angle=60.0):
+    """The document write_svg would write, as a string, for callers that need it in memory."""
+    return ''.join(_svg_chunks(polygons, width, height, PathEncoder(precision, bezier, corner_angle)))
+
+
+@timed()
+def write_svg(file_name, polygons, width, height, precision=DEFAULT_PRECISION, bezier=True,
+              corner_angle=60.0, compress=None, nodes_before=None, compare=False):
+    """
+    Streams polygons (e.g. from trace_polygons) to file_name as a compact
+    single-path SVG; gzip-compressed if compress, which defaults to whether
+    the name ends in .svgz. Returns a report dict: 'nodes_before'
+    (nodes_before, or the polygons' point count), 'nodes_after', 'bytes_after'
+    (on disk) and, with compare, 'bytes_before': the size of the same
+    polygons as written by vectorize().
+    """
+    encoder = PathEncoder(precision, bezier, corner_angle)
+    _write_chunks(file_name, _svg_chunks(polygons, width, height, encoder), compress)
+    report = {
+        'nodes_before': nodes_before if nodes_before is not None else sum(len(p) for p in polygons),
+        'nodes_after': encoder.nodes,
+        'bytes_after': os.path.getsize(file_name),
+    }
+    if compare:
+        path_bytes = sum(len(polygon_to_path_data(p, bezier, corner_angle)) for p in polygons)
+        report['bytes_before'] = len(svg_document('', width, height).encode('utf-8')) + path_bytes
+    return report
+
+
+def write_path_data(file_name, path_data, width, height, compress=None):
+    """
+    Writes the document svg_document would make of path_data (e.g. joined
+    polygon_to_path_data strings) to file_name the way write_svg does:
+    streamed, gzip-compressed for .svgz, and renamed into place once complete.
+    """
+    head, tail = svg_document('', width, height).split('d=""')
+    _write_chunks(file_name, (head, 'd="', path_data, '"', tail), compress)
+
+
+def _write_chunks(file_name, chunks, compress=None):
+    """Streams text chunks to a partial file that replaces file_name once complete."""
+    if compress is None:
+        compress = file_name.lower().endswith('.svgz')
+    partial_path = f"{file_name}.part{os.getpid()}"
+    try:
+        with _open_output(partial_path, compress) as f:
+            for chunk in chunks:
+                f.write(chunk)
+        os.replace(partial_path, file_name)
+    finally:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+
+
+def save_compact_svg(binary_image, file_name, tolerance=0.5, method='rdp', precision=DEFAULT_PRECISION,
+                     bezier=True, compress=None, compare=False):
+    """Traces binary_image and writes it with write_svg; returns the report."""
+    height, width = binary_image.shape[:2]
+    polygons, traced = trace_polygons(binary_image, tolerance, method)
+    return write_svg(file_name, polygons, width, height, precision, bezier, compress=compress,
+                     nodes_before=traced, compare=compare)
+
+
+def merge_svg_paths(file_name, output_name=None, compress=None):
+    """
+    Rewrites an SVG made of many <path> elements that share one fill (such
+    as Potrace output) as a single path per group, keeping each group's
+    transform. Path data is copied unchanged, so the result renders the
+    same as long as every path's fill rule and style are the defaults.
+    Returns a report dict with 'paths_before', 'paths_after',
+    'bytes_before' and 'bytes_after'.
+    """
+    output_name = output_name or file_name
+    if compress is None:
+        compress = output_name.lower().endswith('.svgz')
+    bytes_before = os.path.getsize(file_name)
+    opener = gzip.open if file_name.lower().endswith('.svgz') else open
+    with opener(file_name, 'rb') as f:
+        root = ET.parse(f).getroot()
+
+    def local(tag):
+        return tag.rsplit('}', 1)[-1]
+
+    # Group the path data by the transform of the element that holds it
+    groups = {}
+    paths_before = 0
+    for parent in root.iter():
+        for child in parent:
+            if local(child.tag) == 'path' and child.get('d'):
+                paths_before += 1
+                transform = parent.get('transform') if parent is not root else None
+                groups.setdefault(transform, []).append(child.get('d').strip())
+
+    attrs = ''.join(f' {name}="{root.get(name)}"' for name in ('width', 'height', 'viewBox') if root.get(name))
+    partial_path = f"{output_name}.part{os.getpid()}"
+    try:
+        with _open_output(partial_path, compress) as f:
+            f.write(f'<svg xmlns="{SVG_NS}"{attrs}>')
+            for transform, data in groups.items():
+                if transform:
+                    f.write(f'<g transform="{transform}">')
+                f.write('<path d="')
+                for d in data:
+                    # A leading 'm' is absolute on its own; once appended it would be
+                    # relative to the previous subpath, so anchor it at the origin
+                    f.write('M0 0' + d if d[0] == 'm' else d)
+                f.write('"/>')
+                if transform:
+                    f.write('</g>')
+            f.write('</svg>\n')
+        os.replace(partial_path, output_name)
+    finally:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+    return {'paths_before': paths_before, 'paths_after': len(groups),
+            'bytes_before': bytes_before, 'bytes_after': os.path.getsize(output_name)}
+
+
+def format_report(report):
+    """One-line before/after summary of a write_svg or merge_svg_paths report."""
+    parts = []
+    if 'nodes_after' in report:
+        parts.append(f"{report['nodes_before']} -> {report['nodes_after']} nodes")
+    if 'paths_after' in report:
+        parts.append(f"{report['paths_before']} -> {report['paths_after']} paths")
+    if 'bytes_before' in report:
+        ratio = report['bytes_after'] / report['bytes_before'] if report['bytes_before'] else 0.0
+        parts.append(f"{report['bytes_before']:,} -> {report['bytes_after']:,} bytes ({ratio:.0%})")
+    else:
+        parts.append(f"{report['bytes_after']:,} bytes")
+    return ', '.join(parts)
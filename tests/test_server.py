@@ -0,0 +1,38 @@
+"""Query parameter validation of the HTTP service (server.parse_params)."""
+from http import HTTPStatus
+
+import pytest
+
+from server import RequestError, parse_params
+
+
+@pytest.mark.parametrize('query', [
+    'blur=100000',          # A kernel this size keeps a worker busy for minutes
+    'blur=-1',
+    'blur=2.5',
+    'precision=100',        # Overflows the quantized coordinates into an empty path
+    'precision=-1',
+    'tolerance=-0.5',
+    'tolerance=nan',
+    'brightness=101',
+    'contrast=-1',
+    'sharpness=1000',
+    'threshold=256',
+    'block_size=32',
+    'format=gif',
+    'preset=/etc/passwd',
+    'simplify=spline',
+    'tracer=potrace',
+    'unknown=1',
+])
+def test_rejects_out_of_range(query):
+    with pytest.raises(RequestError) as raised:
+        parse_params(query)
+    assert raised.value.status == HTTPStatus.BAD_REQUEST
+
+
+def test_accepts_limits():
+    params, output_format = parse_params('format=png&blur=50&precision=6&tolerance=0&brightness=0&contrast=100')
+    assert output_format == 'png'
+    assert (params['blur'], params['precision'], params['tolerance']) == (50, 6, 0.0)
+    assert (params['brightness'], params['contrast']) == (0, 100)
@@ -0,0 +1,188 @@
+"""
+Tiled, memory-bounded execution of apply_enhancements -> process_with_ai_model
+for images too large to process in one piece.
+
+The source is read in overlapping tiles. The overlap (halo) covers the
+reach of every neighbourhood operation, so each tile's core comes out
+exactly as it would from the untiled path. Stages that are not local are
+handled separately:
+
+* the contrast enhancement blends against the mean of the whole image, so
+  channel histograms are summed over all tiles first;
+* Canny's hysteresis follows edges across the whole image, so tiles only
+  produce the weak and strong edge candidates, and the hysteresis is
+  finished by flood-filling tile by tile until nothing changes.
+
+Other extraction engines (see engines.py) run on tiles padded by their
+declared halo; engines without one depend on the whole image and are not
+supported here.
+
+Peak memory is proportional to the tile size as long as the source is a
+memory-mapped array, e.g. np.load(path, mmap_mode='r').
+"""
+import concurrent.futures
+import os
+import tempfile
+
+import cv2
+import numpy as np
+
+from processing import (
+    enhance_colors, blur_image, to_grayscale, threshold_image, thicken_lines, channel_histograms
+)
+from engines import get_engine
+
+DEFAULT_TILE_SIZE = 2048
+
+# Sobel aperture plus non-maximum suppression, with one pixel to spare
+CANNY_HALO = 3
+
+
+def iter_tiles(height, width, tile_size, halo=0):
+    """
+    Yields (core, padded) slice pairs covering a height x width image.
+    core is the tile's own region; padded extends it by halo pixels on
+    each side, clipped to the image.
+    """
+    for y in range(0, height, tile_size):
+        for x in range(0, width, tile_size):
+            y1, x1 = min(y + tile_size, height), min(x + tile_size, width)
+            core = (slice(y, y1), slice(x, x1))
+            padded = (slice(max(y - halo, 0), min(y1 + halo, height)),
+                      slice(max(x - halo, 0), min(x1 + halo, width)))
+            yield core, padded
+
+
+def supports_tiling(method):
+    """Whether process_tiled can run the named extraction engine."""
+    return method == 'Edge Detection' or get_engine(method).halo is not None
+
+
+def _inner(core, padded):
+    """Position of core within the array cut out by padded."""
+    return tuple(slice(c.start - p.start, c.stop - p.start) for c, p in zip(core, padded))
+
+
+def _map(func, items, workers):
+    """Runs func over items, on a thread pool when workers > 1 (OpenCV releases the GIL)."""
+    if workers <= 1:
+        return [func(item) for item in items]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(func, items))
+
+
+def _open_output(output, shape):
+    """Array to stitch the result into: a path becomes a .npy memmap."""
+    if output is None:
+        return np.empty(shape, np.uint8)
+    if isinstance(output, (str, os.PathLike)):
+        return np.lib.format.open_memmap(output, mode='w+', dtype=np.uint8, shape=shape)
+    return output
+
+
+def process_tiled(image, params, output=None, tile_size=DEFAULT_TILE_SIZE, workers=1, temp_dir=None):
+    """
+    Same result as process_with_ai_model(apply_enhancements(image, params), params)
+    computed in tiles of tile_size x tile_size.
+
+    output may be None (returns an in-memory array), a path (the result is
+    written to a memory-mapped .npy file) or a preallocated uint8 array.
+    Edge Detection keeps two temporary memory-mapped masks in temp_dir.
+    workers > 1 processes tiles on a thread pool. Raises ValueError for
+    engines that need the whole image (see supports_tiling).
+    """
+    if not supports_tiling(params['method']):
+        raise ValueError(f"{params['method']} depends on the whole image and cannot be processed in tiles")
+    height, width = image.shape[:2]
+    result = _open_output(output, (height, width))
+
+    histograms = None
+    if params['contrast'] != 50:
+        tiles = list(iter_tiles(height, width, tile_size))
+        histograms = sum(_map(lambda tile: channel_histograms(image[tile[0]]), tiles, workers))
+
+    # Neighbourhood reach of the enhancement stages
+    enhance_halo = (1 if params['sharpness'] != 50 else 0) + max(params['blur'], 0)
+
+    def enhanced_gray(padded):
+        tile = enhance_colors(image[padded], params['brightness'], params['contrast'],
+                              params['sharpness'], histograms=histograms)
+        return to_grayscale(blur_image(tile, params['blur'], tile))
+
+    if params['method'] == 'Threshold':
+        def threshold_tile(tile):
+            core, padded = tile
+            gray = enhanced_gray(padded)
+            result[core] = threshold_image(gray[_inner(core, padded)], params['threshold'])
+
+        _map(threshold_tile, list(iter_tiles(height, width, tile_size, enhance_halo)), workers)
+        return result
+
+    if params['method'] != 'Edge Detection':
+        engine = get_engine(params['method'])
+
+        def engine_tile(tile):
+            core, padded = tile
+            gray = enhanced_gray(padded)
+            result[core] = engine.extract(gray, params)[_inner(core, padded)]
+
+        halo = enhance_halo + engine.halo(params)
+        _map(engine_tile, list(iter_tiles(height, width, tile_size, halo)), workers)
+        return result
+
+    # Edge Detection: candidates per tile, then global hysteresis, then dilation
+    low = params['edge_sensitivity']
+    high = low * 2
+    with tempfile.TemporaryDirectory(dir=temp_dir) as scratch:
+        weak = np.lib.format.open_memmap(os.path.join(scratch, 'weak.npy'), mode='w+',
+                                         dtype=np.uint8, shape=(height, width))
+        edges = np.lib.format.open_memmap(os.path.join(scratch, 'edges.npy'), mode='w+',
+                                          dtype=np.uint8, shape=(height, width))
+
+        def candidate_tile(tile):
+            core, padded = tile
+            gray = enhanced_gray(padded)
+            inner = _inner(core, padded)
+            # Canny with equal thresholds skips hysteresis: all pixels above
+            # low are weak candidates, all above high are strong seeds
+            weak[core] = cv2.Canny(gray, low, low)[inner]
+            edges[core] = cv2.Canny(gray, high, high)[inner]
+
+        _map(candidate_tile, list(iter_tiles(height, width, tile_size, enhance_halo + CANNY_HALO)), workers)
+
+        hysteresis_tiles = list(iter_tiles(height, width, tile_size, 1))
+        while any(_map(lambda tile: _grow_edges(weak, edges, *tile), hysteresis_tiles, workers)):
+            pass
+
+        thickness = params['line_thickness']
+
+        def dilate_tile(tile):
+            core, padded = tile
+            thick_edges = thicken_lines(np.asarray(edges[padded]), thickness)
+            result[core] = threshold_image(thick_edges[_inner(core, padded)], params['threshold'], invert=True)
+
+        _map(dilate_tile, list(iter_tiles(height, width, tile_size, thickness)), workers)
+        del weak, edges  # Release the memmaps before the directory is removed
+
+    return result
+
+
+def _grow_edges(weak, edges, core, padded):
+    """
+    One hysteresis step on a tile: marks every weak component (8-connected)
+    that touches an edge pixel, including edges in the one-pixel halo that
+    neighbouring tiles have found. Returns True if the tile changed.
+    """
+    weak_tile = np.asarray(weak[padded])
+    seeds = np.asarray(edges[padded])
+    count, labels = cv2.connectedComponents(weak_tile, connectivity=8)
+    connected = np.zeros(count, bool)
+    connected[np.unique(labels[seeds > 0])] = True
+    connected[0] = False  # Background
+
+    inner = _inner(core, padded)
+    grown = np.where(connected[labels[inner]], 255, 0).astype(np.uint8)
+    if np.array_equal(grown, edges[core]):
+        return False
+    edges[core] = grown
+    return True
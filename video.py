@@ -0,0 +1,454 @@
+"""
+Streaming vectorization of videos and image sequences.
+
+Turns every frame of a video file (anything cv2.VideoCapture opens), a
+camera, or a directory/glob of images into line art, written as one PNG
+or SVG per frame and/or a single looping SVG animation:
+
+    python video.py clip.mp4 -o frames/ --format svg --preset edges
+    python video.py 'shots/*.png' --animate shots.svg --fps 12
+
+Frames stream through three stages connected by bounded queues, so
+decoding, raster processing and vectorization of consecutive frames
+overlap (OpenCV releases the GIL) while memory stays bounded:
+
+    decode thread -> process thread(s) -> vectorize (calling thread) -> write thread
+
+By default each frame is traced whole, giving the same paths as tracing
+it on its own; a frame identical to the previous one reuses its path data.
+With --tile-size, vectorization works on a grid of tiles and only
+re-traces tiles whose binary image changed, which is faster for mostly
+static footage but not identical: tiles are traced independently, so a
+shape crossing a tile border is split into abutting pieces there, and
+slivers smaller than the minimum contour area at a border are dropped.
+"""
+import argparse
+import functools
+import itertools
+import json
+import logging
+import os
+import queue
+import sys
+import tempfile
+import threading
+import time
+
+import cv2
+
+from batch import PRESETS, collect_inputs, load_preset
+from fileio import AsyncWriter, open_image
+from processing import apply_enhancements, process_with_ai_model, trace_contours, polygon_to_path_data
+from svgwriter import write_path_data
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TILE_SIZE = 0       # Whole frames; tiles trade exactness for reuse, see above
+DEFAULT_QUEUE_SIZE = 4     # Frames buffered between two stages
+DEFAULT_FPS = 12.0         # Animation rate when the source does not report one
+OUTPUT_FORMATS = ('svg', 'png')
+STAGES = ('decode', 'process', 'vectorize', 'write')
+
+_DONE = object()  # End-of-stream marker passed down the queues
+
+
+def _is_sequence(source):
+    return os.path.isdir(source) or any(c in source for c in '*?[')
+
+
+def iter_frames(source, step=1, max_frames=None):
+    """
+    Yields (index, BGR frame) from a video file or URL, a camera index
+    ('0'), an image directory or a glob pattern. index counts source
+    frames, so with step > 1 it skips.
+    """
+    count = 0
+    if _is_sequence(source):
+        _, paths = collect_inputs(source)
+        for index, path in enumerate(paths):
+            if index % step:
+                continue
+            try:
+                frame = open_image(path)
+            except ValueError:
+                raise ValueError(f"Could not read image file {path}") from None
+            yield index, frame
+            count += 1
+            if max_frames and count >= max_frames:
+                return
+        return
+
+    capture = cv2.VideoCapture(int(source) if source.isdigit() else source)
+    if not capture.isOpened():
+        raise ValueError(f"Could not open video {source}")
+    try:
+        index = 0
+        while True:
+            # grab() without retrieve() skips the decode of unwanted frames
+            if not capture.grab():
+                return
+            if index % step == 0:
+                ok, frame = capture.retrieve()
+                if not ok:
+                    return
+                yield index, frame
+                count += 1
+                if max_frames and count >= max_frames:
+                    return
+            index += 1
+    finally:
+        capture.release()
+
+
+def probe_fps(source):
+    """Frame rate reported by a video source, or None (image sequences, unknown)."""
+    if _is_sequence(source):
+        return None
+    capture = cv2.VideoCapture(int(source) if source.isdigit() else source)
+    try:
+        fps = capture.get(cv2.CAP_PROP_FPS) if capture.isOpened() else 0
+    finally:
+        capture.release()
+    return fps if 0 < fps < 1000 else None
+
+
+class TileVectorizer:
+    """
+    Vectorizes a stream of same-sized binary frames, re-tracing only the
+    tiles that differ from the previous frame. tile_size 0 treats the whole
+    frame as one tile. Frames must not be modified after being passed in.
+    """
+
+    def __init__(self, tile_size=DEFAULT_TILE_SIZE, tolerance=0.5, bezier=True):
+        self.tile_size = tile_size
+        self.tolerance = tolerance
+        self.bezier = bezier
+        self.tiles_traced = 0
+        self.tiles_reused = 0
+        self._previous = None
+        self._paths = {}
+
+    def _tiles(self, height, width):
+        size_y = self.tile_size or height
+        size_x = self.tile_size or width
+        for y in range(0, height, size_y):
+            for x in range(0, width, size_x):
+                yield y, x, min(y + size_y, height), min(x + size_x, width)
+
+    def path_data(self, binary_image):
+        """SVG path data for binary_image (black ink on white)."""
+        previous = self._previous
+        if previous is not None and previous.shape != binary_image.shape:
+            previous = None
+        changed = cv2.absdiff(binary_image, previous) if previous is not None else None
+
+        parts = []
+        paths = {}
+        for y0, x0, y1, x1 in self._tiles(*binary_image.shape[:2]):
+            key = (y0, x0)
+            if changed is not None and key in self._paths and not cv2.countNonZero(changed[y0:y1, x0:x1]):
+                paths[key] = self._paths[key]
+                self.tiles_reused += 1
+            else:
+                polygons = trace_contours(binary_image[y0:y1, x0:x1], self.tolerance)
+                paths[key] = ''.join(polygon_to_path_data(p + (x0, y0), self.bezier) for p in polygons)
+                self.tiles_traced += 1
+            parts.append(paths[key])
+
+        self._previous, self._paths = binary_image, paths
+        return ''.join(parts)
+
+
+class AnimationWriter:
+    """
+    Builds a looping SVG animation frame by frame. Each frame's path data is
+    spilled to a temporary file as it arrives, since the frame timing in the
+    document depends on the final frame count; close() then assembles the
+    document (one path per frame, shown in turn by a discrete SMIL animation).
+    """
+
+    def __init__(self, path, width, height, fps=DEFAULT_FPS):
+        self.path = path
+        self.width, self.height, self.fps = width, height, fps
+        self.frames = 0
+        self._spill = tempfile.TemporaryFile('w+', encoding='utf-8')
+
+    def add(self, path_data):
+        self._spill.write(path_data + '\n')
+        self.frames += 1
+
+    def discard(self):
+        self._spill.close()
+
+    def close(self):
+        n = self.frames
+        partial_path = self.path + '.part'
+        try:
+            with open(partial_path, 'w', encoding='utf-8') as f:
+                f.write(f'<svg xmlns="http://www.w3.org/2000/svg" width="{self.width}" height="{self.height}" '
+                        f'viewBox="0 0 {self.width} {self.height}">\n')
+                self._spill.seek(0)
+                for i, line in enumerate(self._spill):
+                    times, values = ['0'], ['none' if i else 'inline']
+                    if i:
+                        times.append(f'{i / n:.6f}')
+                        values.append('inline')
+                    if i + 1 < n:
+                        times.append(f'{(i + 1) / n:.6f}')
+                        values.append('none')
+                    f.write(f'<path fill="#000000" fill-rule="evenodd" display="{values[0]}" d="{line.rstrip()}">'
+                            f'<animate attributeName="display" calcMode="discrete" dur="{n / self.fps:.6g}s" '
+                            f'repeatCount="indefinite" keyTimes="{";".join(times)}" values="{";".join(values)}"/>'
+                            '</path>\n')
+                f.write('</svg>\n')
+            os.replace(partial_path, self.path)
+        finally:
+            self._spill.close()
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+
+
+def _put(q, item, stop):
+    """Blocking put that gives up once stop is set, so a failed stage can't deadlock the others."""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def _get(q, stop):
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            pass
+    return _DONE
+
+
+def vectorize_stream(frames, params, output_dir=None, output_format='svg', animation_path=None,
+                     fps=DEFAULT_FPS, tile_size=DEFAULT_TILE_SIZE, queue_size=DEFAULT_QUEUE_SIZE,
+                     process_threads=1, progress=None):
+    """
+    Runs frames, an iterable of (index, BGR frame) such as iter_frames(),
+    through the pipeline. Writes frame_<index>.<output_format> files to
+    output_dir, atomically and on a fileio.AsyncWriter that keeps at most
+    queue_size frames pending, and/or an SVG animation to animation_path.
+    A frame file that fails to write raises IOError at the end. progress, if
+    given, is called with (frames done, summary so far) after each frame.
+    Returns a summary dict with the frame count, elapsed time, sustained
+    fps, busy seconds per stage and tile reuse counts.
+    """
+    if output_dir is None and animation_path is None:
+        raise ValueError("Nothing to write: give an output directory and/or an animation path.")
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    stop = threading.Event()
+    errors = []
+    busy = dict.fromkeys(STAGES, 0.0)
+    busy_lock = threading.Lock()
+    decoded = queue.Queue(maxsize=queue_size)
+    processed = queue.Queue(maxsize=queue_size)
+
+    def add_busy(stage, seconds):
+        with busy_lock:
+            busy[stage] += seconds
+
+    def decode():
+        try:
+            iterator = iter(frames)
+            # Sequence numbers let the consumer restore order after several process threads
+            for sequence in itertools.count():
+                start = time.perf_counter()
+                item = next(iterator, _DONE)
+                add_busy('decode', time.perf_counter() - start)
+                if item is _DONE or not _put(decoded, (sequence,) + tuple(item), stop):
+                    break
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            for _ in range(process_threads):
+                _put(decoded, _DONE, stop)
+
+    def process():
+        try:
+            while True:
+                item = _get(decoded, stop)
+                if item is _DONE:
+                    break
+                sequence, index, frame = item
+                start = time.perf_counter()
+                binary_image = process_with_ai_model(apply_enhancements(frame, params), params)
+                add_busy('process', time.perf_counter() - start)
+                if not _put(processed, (sequence, index, binary_image), stop):
+                    break
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            _put(processed, _DONE, stop)
+
+    threads = [threading.Thread(target=decode, name='video-decode', daemon=True)]
+    threads += [threading.Thread(target=process, name=f'video-process-{i}', daemon=True)
+                for i in range(process_threads)]
+    for thread in threads:
+        thread.start()
+
+    writer = AsyncWriter(queue_size) if output_dir else None
+    vectorizer = TileVectorizer(tile_size, params['tolerance'], params['bezier'])
+    need_paths = animation_path is not None or output_format == 'svg'
+    animation = None
+    done = 0
+    finished_threads = 0
+    reorder = {}
+    next_sequence = 0
+    start_time = time.perf_counter()
+    try:
+        while finished_threads < process_threads:
+            item = _get(processed, stop)
+            if item is _DONE:
+                if stop.is_set():
+                    break  # A stage failed
+                finished_threads += 1
+                continue
+            sequence, index, binary_image = item
+            reorder[sequence] = (index, binary_image)
+            while next_sequence in reorder:
+                index, binary_image = reorder.pop(next_sequence)
+                next_sequence += 1
+                height, width = binary_image.shape[:2]
+                path_data = None
+                if need_paths:
+                    stage_start = time.perf_counter()
+                    path_data = vectorizer.path_data(binary_image)
+                    add_busy('vectorize', time.perf_counter() - stage_start)
+
+                if writer is not None:
+                    # Blocks only while queue_size frames are waiting; the writer's own time is added at the end
+                    path = os.path.join(output_dir, f'frame_{index:06d}.{output_format}')
+                    if output_format == 'svg':
+                        writer.submit(path, write=functools.partial(write_path_data, path_data=path_data,
+                                                                    width=width, height=height))
+                    else:
+                        writer.write_image(path, binary_image)
+                stage_start = time.perf_counter()
+                if animation_path is not None:
+                    if animation is None:
+                        animation = AnimationWriter(animation_path, width, height, fps)
+                    animation.add(path_data)
+                add_busy('write', time.perf_counter() - stage_start)
+
+                done += 1
+                logger.debug("frame %d: %d tiles traced so far, %d reused", index,
+                             vectorizer.tiles_traced, vectorizer.tiles_reused)
+                if progress is not None:
+                    progress(done, _summary(done, start_time, busy, vectorizer))
+    except BaseException as e:
+        errors.append(e)
+        stop.set()
+    finally:
+        for thread in threads:
+            thread.join()
+        if writer is not None:
+            writer.close()
+            add_busy('write', writer.seconds)
+            if writer.errors and not errors:
+                path, error = writer.errors[0]
+                errors.append(IOError(f"Could not write {path}: {error}"))
+        if animation is not None:
+            if errors:
+                animation.discard()
+            else:
+                animation.close()
+
+    if errors:
+        raise errors[0]
+    return _summary(done, start_time, busy, vectorizer)
+
+
+def _summary(done, start_time, busy, vectorizer):
+    elapsed = time.perf_counter() - start_time
+    return {
+        'frames': done,
+        'elapsed': elapsed,
+        'fps': done / elapsed if elapsed > 0 else 0.0,
+        # Time each stage spent working; the slowest one bounds the sustained fps
+        'stage_seconds': dict(busy),
+        'tiles_traced': vectorizer.tiles_traced,
+        'tiles_reused': vectorizer.tiles_reused,
+    }
+
+
+def format_summary(summary):
+    """Human-readable fps summary."""
+    lines = [f"Vectorized {summary['frames']} frames in {summary['elapsed']:.2f} s, "
+             f"{summary['fps']:.2f} fps sustained"]
+    if summary['frames']:
+        for stage, seconds in summary['stage_seconds'].items():
+            lines.append(f"  {stage:<9} {seconds:9.2f} s busy  {1000 * seconds / summary['frames']:9.1f} ms/frame")
+    tiles = summary['tiles_traced'] + summary['tiles_reused']
+    if tiles:
+        lines.append(f"  tiles: {summary['tiles_reused']} of {tiles} reused "
+                     f"({100.0 * summary['tiles_reused'] / tiles:.0f}%)")
+    return '\n'.join(lines)
+
+
+def _print_progress(done, summary):
+    print(f"\r{done} frames, {summary['fps']:.1f} fps", end='', flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Vectorize a video or image sequence frame by frame.")
+    parser.add_argument('input', help="video file, camera index, image directory or glob pattern (quote it)")
+    parser.add_argument('-o', '--output', default=None, help="directory for per-frame output files")
+    parser.add_argument('-f', '--format', choices=OUTPUT_FORMATS, default='svg', help="per-frame output format")
+    parser.add_argument('--animate', metavar='SVG', default=None, help="also write a looping SVG animation")
+    parser.add_argument('-p', '--preset', default='default',
+                        help=f"built-in preset ({', '.join(PRESETS)}) or path to a JSON parameter file")
+    parser.add_argument('--fps', type=float, default=None,
+                        help=f"animation frame rate (default: the source's, else {DEFAULT_FPS:g})")
+    parser.add_argument('--step', type=int, default=1, help="use every n-th frame")
+    parser.add_argument('--max-frames', type=int, default=None, help="stop after this many frames")
+    parser.add_argument('--tile-size', type=int, default=DEFAULT_TILE_SIZE,
+                        help="trace in tiles of this size, re-tracing only changed ones; faster on static "
+                             "footage, but shapes are split at tile borders (default: 0, whole frames)")
+    parser.add_argument('--queue-size', type=int, default=DEFAULT_QUEUE_SIZE, help="frames buffered between stages")
+    parser.add_argument('-j', '--threads', type=int, default=1, help="raster processing threads")
+    parser.add_argument('--stats', metavar='JSON', default=None, help="write the summary to this JSON file")
+    parser.add_argument('-v', '--verbose', action='store_true', help="debug logging")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.WARNING,
+                        format='%(levelname)s %(name)s: %(message)s')
+    if not args.output and not args.animate:
+        parser.error("give -o/--output and/or --animate")
+    try:
+        params = load_preset(args.preset)
+    except (ValueError, OSError) as e:
+        parser.error(str(e))
+
+    fps = args.fps or probe_fps(args.input) or DEFAULT_FPS
+
+    progress = _print_progress if sys.stdout.isatty() else None
+
+    try:
+        summary = vectorize_stream(iter_frames(args.input, args.step, args.max_frames), params, args.output,
+                                   args.format, args.animate, fps / args.step, args.tile_size,
+                                   args.queue_size, args.threads, progress)
+    except (ValueError, IOError) as e:
+        print(f"Error: {e}")
+        return 1
+    if progress is not None:
+        print()
+    print(format_summary(summary))
+    if args.stats:
+        with open(args.stats, 'w', encoding='utf-8') as f:
+            json.dump(dict(summary, params=params), f, indent=2)
+    return 0 if summary['frames'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())